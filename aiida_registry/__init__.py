@@ -7,7 +7,15 @@
 * info on development status
 """
 
+import atexit
+import collections
+import contextlib
+import contextvars
+import json
 import os
+import threading
+import time
+from typing import Optional
 
 __version__ = "0.3.0"
 
@@ -17,6 +25,22 @@ PLUGINS_FILE_ABS = os.path.join(pwd, os.pardir, "plugins.yaml")
 PLUGINS_METADATA = "plugins_metadata.json"
 PLUGINS_METADATA_KEYS = ["author", "author_email", "version", "description"]
 PLUGINS_TEST_RESULTS = "test_results.json"
+# Real-world build files of plugins, named ``<plugin>-<build file>`` (see `benchmark`)
+BUILD_FILES_DIR = os.path.join(pwd, os.pardir, "benchmarks", "build_files")
+# Scores of the build-file parsers of a reference run
+PARSERS_BASELINE = os.path.join(pwd, os.pardir, "benchmarks", "parsers_baseline.json")
+# Fraction of the baseline score below which a parser has regressed (scores vary by
+# about 25% between runs on the same machine, and more between machines)
+PARSERS_TOLERANCE = 0.5
+
+# Limits of fetching
+# (defined here so that the CLI can show them without importing the HTTP client)
+# Maximum number of concurrent requests (over all hosts)
+MAX_REQUESTS = 100
+# Maximum number of concurrent requests sent to a single host
+MAX_REQUESTS_PER_HOST = 4
+# Maximum size of a wheel that is downloaded whole (bytes)
+MAX_WHEEL_SIZE = 50 * 1024**2
 
 # These are the main entrypoints, the other will fall under 'other'
 main_entrypoints = [
@@ -141,66 +165,261 @@ entrypointtypes = {k: v["longname"] for k, v in entrypoint_metainfo.items()}
 
 
 # Logging
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+
+class _ReporterState:  # pylint: disable=too-few-public-methods
+    """Plugin currently processed, with its warnings and errors."""
+
+    def __init__(self, plugin_name=None):
+        self.plugin_name = plugin_name
+        self.warnings = []
+        self.errors = []
+
+
+class JsonLinesSink:
+    """Buffered log file with one JSON record per message.
+
+    Records are appended to a thread-safe queue and written in batches.
+    """
+
+    def __init__(self, path, buffer_size=100):
+        """Open the log file (records are appended)."""
+        self.buffer_size = buffer_size
+        self._buffer = collections.deque()
+        self._lock = threading.Lock()
+        self._handle = open(path, "a", encoding="utf8")  # pylint: disable=consider-using-with
+
+    def write(self, record: dict):
+        """Add a record, writing the buffered records if the buffer is full."""
+        self._buffer.append(record)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records."""
+        with self._lock:
+            lines = []
+            while self._buffer:
+                lines.append(json.dumps(self._buffer.popleft()) + "\n")
+            if lines and not self._handle.closed:
+                self._handle.writelines(lines)
+                self._handle.flush()
+
+    def close(self):
+        """Write the buffered records and close the file."""
+        self.flush()
+        with self._lock:
+            self._handle.close()
+
+
+class PluginReporter:
+    """Handle reporting the messages of a single plugin.
+
+    The handle can be passed around explicitly, or used as a context manager to make
+    the plugin the current one of the `Reporter` within the ``with`` block.
+    """
+
+    def __init__(self, reporter: "Reporter", state: _ReporterState):
+        self._reporter = reporter
+        self._state = state
+        self._token = None
+
+    @property
+    def plugin_name(self):
+        """Name of the plugin."""
+        return self._state.plugin_name
+
+    @property
+    def warnings(self):
+        """Warnings of the plugin."""
+        return self._state.warnings
+
+    @property
+    def errors(self):
+        """Errors of the plugin."""
+        return self._state.errors
+
+    def warn(self, message, check_id=None):
+        """Report a warning of the plugin."""
+        self._reporter.report("warning", message, check_id, state=self._state)
+
+    def error(self, message, check_id=None):
+        """Report an error of the plugin."""
+        self._reporter.report("error", message, check_id, state=self._state)
+
+    def info(self, string):
+        """Report information on the plugin."""
+        self._reporter.report("info", string, state=self._state)
+
+    def debug(self, string):
+        """Report debugging information on the plugin."""
+        self._reporter.report("debug", string, state=self._state)
+
+    def __enter__(self):
+        self._token = self._reporter._state.set(self._state)  # pylint: disable=protected-access
+        return self
+
+    def __exit__(self, *exc_info):
+        self._reporter._state.reset(self._token)  # pylint: disable=protected-access
+
+
 class Reporter:
-    """Logging methods"""
+    """Logging methods
+
+    The current plugin (and its warnings/errors) is tracked in a context variable,
+    so that plugins can be processed concurrently, both in threads and in coroutines.
+    Alternatively, `plugin` returns an explicit handle for a plugin.
+
+    Messages are printed if their level is at least ``level`` (and not in quiet mode),
+    and written to a JSON-lines log file if one is configured.
+    """
 
     def __init__(self):
         """Initialize the reporter."""
-        self.warnings = []
-        self.errors = []
-        self.plugin_name = None
+        self._state = contextvars.ContextVar("reporter_state")
+        self._captured = contextvars.ContextVar("reporter_captured", default=None)
         self.plugins_warnings = {}
         self.plugins_errors = {}
+        # number of warnings/errors of each check id, by (level, check_id)
+        self.check_counts = collections.Counter()
+        self.level = LOG_LEVELS["debug"]
+        self.quiet = False
+        self._sink: Optional[JsonLinesSink] = None
+
+    def configure(self, level=None, quiet=None, log_file=None):
+        """Set the level of printed messages, the quiet mode and the log file."""
+        if level is not None:
+            self.level = LOG_LEVELS[level]
+        if quiet is not None:
+            self.quiet = quiet
+        if log_file is not None:
+            self.close()
+            self._sink = JsonLinesSink(log_file)
+
+    def close(self):
+        """Write the buffered messages to the log file and close it."""
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    @property
+    def _current(self) -> _ReporterState:
+        try:
+            return self._state.get()
+        except LookupError:
+            state = _ReporterState()
+            self._state.set(state)
+            return state
+
+    @property
+    def plugin_name(self):
+        """Name of the plugin processed in the current context."""
+        return self._current.plugin_name
+
+    @property
+    def warnings(self):
+        """Warnings of the current context."""
+        return self._current.warnings
+
+    @property
+    def errors(self):
+        """Errors of the current context."""
+        return self._current.errors
 
     def reset(self):
         """Reset the warnings list."""
-        self.warnings = []
-        self.errors = []
+        self._state.set(_ReporterState(self.plugin_name))
+
+    def plugin(self, name, reset=True) -> PluginReporter:
+        """Return a handle reporting the messages of plugin ``name``.
+
+        :param reset: discard the previous warnings and errors of the plugin (else the
+            messages are added to them).
+        """
+        if reset or name not in self.plugins_warnings:
+            self.plugins_warnings[name] = []
+            self.plugins_errors[name] = []
+        return PluginReporter(self, _ReporterState(name))
 
     def set_plugin_name(self, name):
         """Set the plugin name."""
-        self.plugin_name = name
-        self.reset()
+        self._state.set(_ReporterState(name))
 
         self.plugins_warnings[self.plugin_name] = []
         self.plugins_errors[self.plugin_name] = []
 
-    def warn(self, message, check_id=None):
-        """Write to stdout and log.
+    @contextlib.contextmanager
+    def capture(self):
+        """Collect the warnings and errors reported within the ``with`` block.
 
-        Used to display log in actions.
+        The messages are still reported; the list yielded is filled with their
+        ``(level, message, check_id)``, so that they can be reported again later.
         """
-        # Set the step output error message which can be used,
-        # e.g., for display as part of an issue comment.
+        captured = []
+        token = self._captured.set(captured)
+        try:
+            yield captured
+        finally:
+            self._captured.reset(token)
+
+    def report(self, level, message, check_id=None, state=None):
+        """Report a message of the plugin of ``state`` (default: the current context)."""
+        state = state or self._current
+        raw_message = message
+        captured = self._captured.get()
+        if captured is not None and level in ("warning", "error"):
+            captured.append((level, raw_message, check_id))
         if check_id is not None:
             message = f"<a href='https://github.com/aiidateam/aiida-registry#{check_id}'>{check_id}</a>: {message}"
 
-        if self.plugin_name:
-            self.warnings.append(f"{message} [{self.plugin_name}]")
-            self.plugins_warnings[self.plugin_name].append(message)
-        else:
-            self.warnings.append(f"{message}")
-        print(f"{message}")
+        # Set the step output error message which can be used,
+        # e.g., for display as part of an issue comment.
+        if level in ("warning", "error"):
+            if check_id is not None:
+                self.check_counts[level, check_id] += 1
+            messages = state.warnings if level == "warning" else state.errors
+            if state.plugin_name:
+                messages.append(f"{message} [{state.plugin_name}]")
+                plugins_messages = (
+                    self.plugins_warnings if level == "warning" else self.plugins_errors
+                )
+                plugins_messages[state.plugin_name].append(message)
+            else:
+                messages.append(f"{message}")
+
+        if not self.quiet and LOG_LEVELS[level] >= self.level:
+            print(f"{message}")
+        if self._sink is not None:
+            self._sink.write(
+                {
+                    "time": time.time(),
+                    "level": level,
+                    "plugin": state.plugin_name,
+                    "check_id": check_id,
+                    "message": raw_message,
+                }
+            )
+
+    def warn(self, message, check_id=None):
+        """Write to stdout and log.
+
+        Used to display log in actions.
+        """
+        self.report("warning", message, check_id)
 
     def error(self, message, check_id=None):
         """Write to stdout and log."""
-        if check_id is not None:
-            message = f"<a href='https://github.com/aiidateam/aiida-registry#{check_id}'>{check_id}</a>: {message}"
-
-        if self.plugin_name:
-            self.errors.append(f"{message} [{self.plugin_name}]")
-            self.plugins_errors[self.plugin_name].append(message)
-        else:
-            self.errors.append(f"{message}")
-        print(f"{message}")
+        self.report("error", message, check_id)
 
     def info(self, string):
         """Write to stdout."""
-        print(string)
+        self.report("info", string)
 
     def debug(self, string):
         """Write to stdout."""
-        print(string)
+        self.report("debug", string)
 
 
 REPORTER = Reporter()
+atexit.register(REPORTER.close)
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of fetching the registry: offline end-to-end runs and build-file parsers.
+
+A corpus of the responses of a real run is recorded with `recording` (``aiida-registry
+fetch --record CORPUS``), including the mirrors of the repositories. The run can then
+be reproduced without network with `replaying`, which serves the corpus from a local
+`replay.ReplayServer` with a configurable latency and bandwidth.
+
+Note that the GitHub API queries depend on the current date: they are only replayed
+on the day they were recorded, so corpora are best recorded without ``GITHUB_TOKEN``
+(the commits are then counted in the mirrors).
+
+The build-file parsers are timed on a corpus of real-world build files
+(`BUILD_FILES_DIR`), scaled up synthetically with `scale_build_files`.
+"""
+
+import contextlib
+import functools
+import json
+import math
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from . import BUILD_FILES_DIR, PARSERS_TOLERANCE, REPORTER, git_mirror
+from .http_client import HTTP_ENGINE
+from .parse_build_file import (
+    get_aiida_version_list,
+    get_aiida_version_poetry,
+    get_data_parser,
+    identify_build_tool,
+    load_build_file,
+)
+from .replay import ReplayServer
+
+# Directory of the mirrors of the repositories in a corpus
+MIRRORS_DIR = "git-mirrors"
+
+
+@contextlib.contextmanager
+def recording(corpus_dir):
+    """Record the responses and mirrors of the run of the ``with`` block in ``corpus_dir``."""
+    mirror_dir = git_mirror.get_mirror_dir()
+    HTTP_ENGINE.enable_recording(corpus_dir)
+    git_mirror.set_mirror_dir(os.path.join(corpus_dir, MIRRORS_DIR))
+    try:
+        yield HTTP_ENGINE.recorder
+    finally:
+        HTTP_ENGINE.disable_recording()
+        git_mirror.set_mirror_dir(mirror_dir)
+
+
+@contextlib.contextmanager
+def replaying(corpus_dir, latency=0.0, bandwidth=None):
+    """Replay the corpus in ``corpus_dir`` for all requests of the ``with`` block.
+
+    :param latency: delay before each response (seconds).
+    :param bandwidth: rate at which bodies are sent (bytes per second), unlimited if None.
+    :return: the `ReplayServer`, counting the requests.
+    """
+    mirror_dir = git_mirror.get_mirror_dir()
+    with ReplayServer(corpus_dir, latency=latency, bandwidth=bandwidth) as server:
+        HTTP_ENGINE.enable_replay(server.address)
+        HTTP_ENGINE.reset_breakers()
+        git_mirror.set_mirror_dir(os.path.join(corpus_dir, MIRRORS_DIR))
+        git_mirror.set_offline(True)
+        try:
+            yield server
+        finally:
+            HTTP_ENGINE.disable_replay()
+            git_mirror.set_offline(False)
+            git_mirror.set_mirror_dir(mirror_dir)
+
+
+def get_peak_rss() -> int:
+    """Return the peak resident set size of the process (bytes)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def benchmark_fetch(  # pylint: disable=too-many-arguments
+    corpus_dir, run, repeat=1, latency=0.0, bandwidth=None
+) -> dict:
+    """Time ``run()`` (e.g. `make_pages.make_pages`) replaying the corpus.
+
+    :return: the wall times of the runs (seconds), the number of requests per run, the
+        requests missing from the corpus, and the peak RSS of the process (bytes).
+    """
+    wall_times = []
+    requests = []
+    missing = set()
+    for _ in range(repeat):
+        with replaying(corpus_dir, latency, bandwidth) as server:
+            start = time.perf_counter()
+            run()
+            wall_times.append(time.perf_counter() - start)
+        requests.append(server.requests)
+        missing.update(server.missing)
+    return {
+        "wall_time": wall_times,
+        "requests": requests,
+        "missing": sorted(missing),
+        "peak_rss": get_peak_rss(),
+    }
+
+
+# Micro-benchmarks of the build-file parsers
+
+# Maximum number of entries added to a synthetic build file
+MAX_PADDING = 500
+# Maximum number of parses per parser whose allocations are traced (tracing is slow)
+MAX_TRACED = 100
+# Parses slower than this factor times the median parse of a parser are outliers
+OUTLIER_FACTOR = 5.0
+
+
+def load_build_files(directory=BUILD_FILES_DIR) -> Dict[str, str]:
+    """Return the contents of the build files in ``directory``, by name."""
+    files = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), encoding="utf8") as handle:
+            files[name] = handle.read()
+    return files
+
+
+def _pad(name: str, content: str, size: int, index: int) -> str:
+    """Add ``size`` entries to a build file, keeping it valid (and its build tool)."""
+    if name.endswith("setup.json"):
+        data = json.loads(content)
+        data.setdefault("entry_points", {})[f"aiida.synthetic{index}"] = [
+            f"synthetic.ep{i} = synthetic.module{i}:Class{i}" for i in range(size)
+        ]
+        return json.dumps(data, indent=4)
+    if name.endswith("setup.cfg"):
+        lines = [f"key{i} = value {i}" for i in range(size)]
+        return content + f"\n[synthetic{index}]\n" + "\n".join(lines) + "\n"
+    lines = [f'key{i} = "value {i}"' for i in range(size)]
+    return content + f"\n[tool.synthetic{index}]\n" + "\n".join(lines) + "\n"
+
+
+def scale_build_files(
+    files: Dict[str, str], count: int, seed=0
+) -> List[Tuple[str, str]]:
+    """Return ``count`` synthetic build files derived from the real-world ``files``.
+
+    Each file is a real-world file with a random number of additional entries
+    (Pareto-distributed, so that a few files are much larger than the others).
+    """
+    rng = random.Random(seed)
+    names = sorted(files)
+    scaled = []
+    for index in range(count):
+        name = names[index % len(names)]
+        size = min(int(rng.paretovariate(2.0)) * 10 - 10, MAX_PADDING)
+        scaled.append(
+            (f"synthetic{index}-{name}", _pad(name, files[name], size, index))
+        )
+    return scaled
+
+
+def _get_cases(build_files: List[Tuple[str, str]]) -> Dict[str, list]:
+    """Return the functions to time on each build file: ``{benchmark: [(file, call)]}``."""
+    cases = defaultdict(list)
+    for name, content in build_files:
+        cases["identify_build_tool"].append(
+            (name, functools.partial(identify_build_tool, name, content))
+        )
+        tool, data = load_build_file(name, content)
+        if tool is None:
+            continue
+        # the parsers are timed on the content, including the parsing of TOML files
+        parser = get_data_parser(tool)
+        cases[parser.__name__].append((name, functools.partial(parser, content)))
+
+        # the inputs of the version parsers are prepared outside of the timing
+        if tool == "POETRY":
+            cases["get_aiida_version_poetry"].append(
+                (name, functools.partial(get_aiida_version_poetry, data))
+            )
+        elif tool in ("PEP621", "SETUPTOOLS_JSON"):
+            requires = (
+                data.get("project", {}).get("dependencies", [])
+                if tool == "PEP621"
+                else json.loads(data).get("install_requires", [])
+            )
+            cases["get_aiida_version_list"].append(
+                (name, functools.partial(get_aiida_version_list, list(requires)))
+            )
+    return cases
+
+
+def _calibrate() -> float:
+    """Return the rate of a fixed pure-Python workload (per second), to normalize scores."""
+    best = math.inf
+    for _ in range(5):
+        start = time.perf_counter()
+        sorted(str(i) for i in range(100_000))
+        best = min(best, time.perf_counter() - start)
+    return 1 / best
+
+
+def _time_calls(calls, repeat: int) -> List[float]:
+    """Return the best time of each call over ``repeat`` runs (seconds)."""
+    timings = [math.inf] * len(calls)
+    for _ in range(repeat):
+        for index, call in enumerate(calls):
+            start = time.perf_counter()
+            call()
+            timings[index] = min(timings[index], time.perf_counter() - start)
+    return timings
+
+
+def _trace_peaks(calls) -> List[int]:
+    """Return the peak memory allocated by each call (bytes)."""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for call in calls:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def benchmark_parsers(build_files: List[Tuple[str, str]], repeat=3) -> dict:
+    """Time the build-file parsers on ``build_files`` (name and content).
+
+    :return: for each parser, the number of files, parses per second, timing
+        percentiles, peak allocations and outliers, and a score normalized by the speed
+        of the machine (see `compare_to_baseline`). The score is the inverse of the
+        median time, relative to a fixed workload run just before each parser, so that
+        it is not skewed by outliers or by changes of the load of the machine.
+    """
+    results = {}
+    quiet, REPORTER.quiet = REPORTER.quiet, True
+    try:
+        with REPORTER.plugin("parsers-benchmark"):
+            all_cases = _get_cases(build_files)
+            for benchmark, cases in sorted(all_cases.items()):
+                names = [name for name, _ in cases]
+                calls = [call for _, call in cases]
+                calibration = _calibrate()
+                timings = _time_calls(calls, repeat)
+                peaks = _trace_peaks(
+                    calls[:: max(len(calls) // MAX_TRACED, 1)][:MAX_TRACED]
+                )
+                ordered = sorted(timings)
+                median = statistics.median(ordered)
+                rate = len(timings) / sum(timings)
+                results[benchmark] = {
+                    "files": len(timings),
+                    "parses_per_second": rate,
+                    "score": 1 / median / calibration,
+                    "median": median,
+                    "p95": ordered[int(0.95 * (len(ordered) - 1))],
+                    "max": ordered[-1],
+                    "peak_allocated_mean": statistics.mean(peaks),
+                    "peak_allocated_max": max(peaks),
+                    "outliers": sorted(
+                        (
+                            (name, timing)
+                            for name, timing in zip(names, timings)
+                            if timing > OUTLIER_FACTOR * median
+                        ),
+                        key=lambda item: -item[1],
+                    )[:5],
+                }
+    finally:
+        REPORTER.quiet = quiet
+    return results
+
+
+def median_scores(runs: List[dict]) -> dict:
+    """Return the results of the last run, with the median score of each parser.
+
+    :param runs: results of several runs of `benchmark_parsers`.
+    """
+    results = runs[-1]
+    for benchmark, result in results.items():
+        result["score"] = statistics.median(run[benchmark]["score"] for run in runs)
+    return results
+
+
+def compare_to_baseline(
+    results: dict, baseline: dict, tolerance=PARSERS_TOLERANCE
+) -> list:
+    """Return the parsers slower than in the baseline.
+
+    Scores are parses per second relative to a fixed workload, so that baselines are
+    roughly comparable between machines.
+
+    :param baseline: ``{parser: score}``.
+    :return: list of (parser, score, baseline score).
+    """
+    return [
+        (benchmark, results[benchmark]["score"], score)
+        for benchmark, score in sorted(baseline.items())
+        if benchmark in results
+        and results[benchmark]["score"] < score * (1 - tolerance)
+    ]
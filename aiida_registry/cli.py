@@ -1,22 +1,351 @@
 # -*- coding: utf-8 -*-
-"""CLI for AiiDA registry."""
+"""CLI for AiiDA registry.
+
+Only lightweight modules are imported at startup: the modules that pull in heavy
+dependencies (aiohttp, tomlkit, poetry, ...) are imported by the commands that use them.
+"""
+# pylint: disable=import-outside-toplevel
+
+import contextlib
+import json
+import os
+import tempfile
+import time
 
 import click
 
-from aiida_registry.make_pages import make_pages
-from aiida_registry.test_install import test_install_all
+from aiida_registry import (
+    BUILD_FILES_DIR,
+    LOG_LEVELS,
+    MAX_REQUESTS_PER_HOST,
+    MAX_WHEEL_SIZE,
+    PARSERS_BASELINE,
+    PARSERS_TOLERANCE,
+    PLUGINS_METADATA,
+    REPORTER,
+)
+from aiida_registry.http_cache import DEFAULT_MAX_SIZE
+from aiida_registry.metrics import METRICS, record_run
+from aiida_registry.parse_memo import ParseMemo, enable_memo
+from aiida_registry.trace import TRACER
+from aiida_registry.wheel_store import WheelStore, enable_store
 
 
 @click.group()
-def cli():
+@click.option(
+    "--log-level",
+    default="debug",
+    show_default=True,
+    type=click.Choice(list(LOG_LEVELS)),
+    help="Minimum level of the messages printed.",
+)
+@click.option("-q", "--quiet", is_flag=True, help="Do not print any message.")
+@click.option(
+    "--log-file",
+    type=click.Path(dir_okay=False),
+    help="Append all messages to this file, as JSON lines.",
+)
+@click.option(
+    "--trace",
+    type=click.Path(dir_okay=False),
+    help="Write the timing of all stages and requests to this file "
+    "(Chrome trace format, see https://ui.perfetto.dev).",
+)
+@click.option(
+    "--metrics",
+    type=click.Path(dir_okay=False),
+    help="Write aggregate metrics of the run to this file, for the textfile "
+    "collector of the Prometheus node exporter (e.g. aiida_registry.prom).",
+)
+@click.pass_context
+def cli(ctx, log_level, quiet, log_file, trace, metrics):  # pylint: disable=too-many-arguments
     """CLI for AiiDA registry."""
+    REPORTER.configure(level=log_level, quiet=quiet, log_file=log_file)
+    ctx.call_on_close(REPORTER.close)
+    if trace:
+        TRACER.start(trace)
+        ctx.call_on_close(TRACER.stop)
+    if metrics:
+        start = time.perf_counter()
+
+        def write_metrics():
+            record_run(ctx.invoked_subcommand, time.perf_counter() - start)
+            METRICS.write(metrics)
+
+        ctx.call_on_close(write_metrics)
 
 
 @cli.command()
 @click.argument("package", nargs=-1, required=False)
-def fetch(package):
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of plugins to fetch concurrently.",
+)
+@click.option(
+    "--max-per-host",
+    default=MAX_REQUESTS_PER_HOST,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Maximum number of concurrent requests to a single host.",
+)
+@click.option(
+    "--cache-dir",
+    envvar="AIIDA_REGISTRY_CACHE_DIR",
+    type=click.Path(file_okay=False),
+    help="Cache HTTP responses, the data read from wheels and build files, and the "
+    "mirrors of repositories in this directory (env: AIIDA_REGISTRY_CACHE_DIR).",
+)
+@click.option(
+    "--cache-max-size",
+    default=DEFAULT_MAX_SIZE // 1024**2,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Maximum size of the HTTP cache in MiB.",
+)
+@click.option(
+    "--max-wheel-size",
+    default=MAX_WHEEL_SIZE // 1024**2,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Maximum size in MiB of a wheel that is downloaded whole "
+    "(when the server does not support range requests).",
+)
+@click.option(
+    "--incremental",
+    "previous_file",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Reuse the records of unchanged plugins from this previous plugins_metadata.json.",
+)
+@click.option(
+    "--record",
+    "record_dir",
+    type=click.Path(file_okay=False),
+    help="Record all responses (and the mirrors of repositories) in this corpus "
+    "directory, to replay the run offline.",
+)
+@click.option(
+    "--replay",
+    "replay_dir",
+    type=click.Path(exists=True, file_okay=False),
+    help="Replay the responses of this corpus directory instead of using the network.",
+)
+@click.option(
+    "--shard-dir",
+    type=click.Path(file_okay=False),
+    help="Also write a slim index and one detail file per plugin to this directory.",
+)
+def fetch(  # pylint: disable=too-many-arguments
+    package,
+    jobs,
+    max_per_host,
+    cache_dir,
+    cache_max_size,
+    max_wheel_size,
+    previous_file,
+    record_dir,
+    replay_dir,
+    shard_dir,
+):
     """Fetch data from PyPI and write to JSON file."""
-    make_pages(package)
+    from aiida_registry.benchmark import recording, replaying
+    from aiida_registry.git_mirror import set_mirror_dir
+    from aiida_registry.http_client import HTTP_ENGINE
+    from aiida_registry.make_pages import make_pages
+    from aiida_registry.remote_zip import set_max_size
+
+    if record_dir and replay_dir:
+        raise click.UsageError("--record and --replay are mutually exclusive.")
+    HTTP_ENGINE.configure(max_requests_per_host=max_per_host)
+    set_max_size(max_wheel_size * 1024**2)
+    if cache_dir:
+        HTTP_ENGINE.enable_cache(cache_dir, max_size=cache_max_size * 1024**2)
+        enable_store(cache_dir)
+        enable_memo(cache_dir)
+        set_mirror_dir(os.path.join(cache_dir, "git-mirrors"))
+    if record_dir:
+        mode = recording(record_dir)
+    elif replay_dir:
+        mode = replaying(replay_dir)
+    else:
+        mode = contextlib.nullcontext()
+    with mode:
+        make_pages(package, jobs=jobs, previous_file=previous_file, shard_dir=shard_dir)
+    if HTTP_ENGINE.cache is not None:
+        click.echo(HTTP_ENGINE.cache.stats)
+
+
+@cli.command()
+@click.argument("corpus", type=click.Path(exists=True, file_okay=False))
+@click.argument("package", nargs=-1, required=False)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of plugins to fetch concurrently.",
+)
+@click.option(
+    "--latency",
+    default=0.0,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Delay of the responses of the replay server (milliseconds).",
+)
+@click.option(
+    "--bandwidth",
+    default=0.0,
+    type=click.FloatRange(min=0),
+    help="Bandwidth of the replay server per request (KiB/s), 0 for unlimited.",
+)
+@click.option(
+    "--repeat",
+    default=3,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of runs.",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    help="Write the results to this JSON file.",
+)
+def benchmark(  # pylint: disable=too-many-arguments
+    corpus, package, jobs, latency, bandwidth, repeat, output
+):
+    """Time fetching the plugins offline, replaying a corpus recorded with fetch --record.
+
+    The metadata of the plugins is written to a temporary directory.
+    """
+    from aiida_registry.benchmark import benchmark_fetch
+    from aiida_registry.make_pages import make_pages
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_file = os.path.join(tmp_dir, PLUGINS_METADATA)
+        results = benchmark_fetch(
+            corpus,
+            lambda: make_pages(package, jobs=jobs, output=output_file),
+            repeat=repeat,
+            latency=latency / 1000,
+            bandwidth=bandwidth * 1024 if bandwidth else None,
+        )
+    click.echo(
+        f"Wall time: {min(results['wall_time']):.2f} s (best of {repeat}), "
+        f"requests: {max(results['requests'])}, "
+        f"peak RSS: {results['peak_rss'] / 1024**2:.1f} MiB"
+    )
+    if results["missing"]:
+        click.echo(f"{len(results['missing'])} requests not in the corpus:", err=True)
+        for url in results["missing"]:
+            click.echo(f"  {url}", err=True)
+    if output:
+        with open(output, "w", encoding="utf8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+@cli.command("benchmark-parsers")
+@click.option(
+    "--corpus",
+    default=BUILD_FILES_DIR,
+    show_default=True,
+    type=click.Path(exists=True, file_okay=False),
+    help="Directory of real-world build files, named <plugin>-<build file>.",
+)
+@click.option(
+    "--count",
+    default=2000,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of synthetic build files derived from the corpus.",
+)
+@click.option(
+    "--repeat",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of times each file is parsed (the best time is kept).",
+)
+@click.option(
+    "--runs",
+    default=3,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of runs of the benchmark (the median score is kept).",
+)
+@click.option(
+    "--baseline",
+    default=PARSERS_BASELINE,
+    show_default=True,
+    type=click.Path(dir_okay=False),
+    help="Fail if a parser is slower than in this baseline (skipped if missing).",
+)
+@click.option(
+    "--tolerance",
+    default=PARSERS_TOLERANCE,
+    show_default=True,
+    type=click.FloatRange(0, 1),
+    help="Fraction of the baseline score a parser may lose before failing.",
+)
+@click.option(
+    "--save-baseline",
+    is_flag=True,
+    help="Write the scores of this run to the baseline instead of comparing them.",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    help="Write the results to this JSON file.",
+)
+def benchmark_parsers_cmd(  # pylint: disable=too-many-arguments
+    corpus, count, repeat, runs, baseline, tolerance, save_baseline, output
+):
+    """Time the build-file parsers on a synthetic corpus of build files."""
+    from aiida_registry.benchmark import (
+        benchmark_parsers,
+        compare_to_baseline,
+        load_build_files,
+        median_scores,
+        scale_build_files,
+    )
+
+    build_files = scale_build_files(load_build_files(corpus), count)
+    results = median_scores(
+        [benchmark_parsers(build_files, repeat=repeat) for _ in range(runs)]
+    )
+    for name, result in results.items():
+        click.echo(
+            f"{name:26} {result['files']:5} files {result['parses_per_second']:9.0f}/s "
+            f"(score {result['score']:8.3f}), median {result['median'] * 1000:.2f} ms, "
+            f"peak memory {result['peak_allocated_mean'] / 1024:.0f} KiB"
+        )
+        for file_name, timing in result["outliers"]:
+            click.echo(f"    outlier: {file_name} {timing * 1000:.1f} ms")
+    if output:
+        with open(output, "w", encoding="utf8") as handle:
+            json.dump(results, handle, indent=2)
+
+    scores = {name: result["score"] for name, result in results.items()}
+    if save_baseline:
+        with open(baseline, "w", encoding="utf8") as handle:
+            json.dump(scores, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        return
+    if not os.path.exists(baseline):
+        return
+    with open(baseline, encoding="utf8") as handle:
+        regressions = compare_to_baseline(results, json.load(handle), tolerance)
+    if regressions:
+        raise click.ClickException(
+            "Parsers slower than the baseline: "
+            + ", ".join(
+                f"{name} (score {score:.3f} < {reference:.3f})"
+                for name, score, reference in regressions
+            )
+        )
 
 
 @cli.command()
@@ -28,8 +357,109 @@ def fetch(package):
 )
 def test_install(container_image):
     """Test installing all plugins in a Docker container."""
+    from aiida_registry.test_install import test_install_all
+
     test_install_all(container_image)
 
 
+@cli.command()
+@click.argument("version")
+@click.option(
+    "--metadata",
+    "metadata_file",
+    default=PLUGINS_METADATA,
+    show_default=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Metadata of the plugins written by fetch.",
+)
+def compatible(version, metadata_file):
+    """List the plugins compatible with release VERSION of aiida-core.
+
+    VERSION is compared as a version, i.e. 2.5 is the release 2.5.0.
+    """
+    from packaging.version import InvalidVersion, Version
+
+    with open(metadata_file, encoding="utf8") as handle:
+        matrix = json.load(handle).get("aiida_compatibility")
+    if matrix is None:
+        raise click.ClickException(f"No compatibility matrix in {metadata_file}.")
+    try:
+        release = Version(version)
+    except InvalidVersion as exc:
+        raise click.ClickException(f"Invalid version: {version}") from exc
+    for key, plugins in matrix["plugins"].items():
+        if Version(key) == release:
+            break
+    else:
+        raise click.ClickException(f"Unknown release of aiida-core: {version}")
+    for plugin_name in plugins:
+        click.echo(plugin_name)
+
+
+@cli.command()
+@click.argument("shard_dir", type=click.Path(file_okay=False))
+@click.option(
+    "--metadata",
+    "metadata_file",
+    default=PLUGINS_METADATA,
+    show_default=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Metadata of the plugins written by fetch (or test-install).",
+)
+def shard(shard_dir, metadata_file):
+    """Write a slim index and one detail file per plugin to SHARD_DIR."""
+    from aiida_registry.shards import write_shards
+
+    with open(metadata_file, encoding="utf8") as handle:
+        index = write_shards(json.load(handle), shard_dir)
+    click.echo(f"Wrote the index of {len(index['plugins'])} plugins to {shard_dir}.")
+
+
+@cli.group()
+@click.option(
+    "--cache-dir",
+    envvar="AIIDA_REGISTRY_CACHE_DIR",
+    required=True,
+    type=click.Path(file_okay=False),
+    help="Directory of the stores (env: AIIDA_REGISTRY_CACHE_DIR).",
+)
+@click.pass_context
+def stores(ctx, cache_dir):
+    """Manage the stores of the data read from wheels and build files."""
+    ctx.obj = [WheelStore(cache_dir), ParseMemo(cache_dir)]
+    for store in ctx.obj:
+        ctx.call_on_close(store.close)
+
+
+@stores.command()
+@click.pass_obj
+def stats(all_stores):
+    """Show the size and hit rate of the stores."""
+    for store in all_stores:
+        store_stats = store.stats()
+        click.echo(
+            f"{store.TABLE.capitalize()}: {store_stats[store.TABLE]}, "
+            f"size: {store_stats['size'] / 1024**2:.1f} MiB, "
+            f"hits: {store_stats['hits']}, misses: {store_stats['misses']} "
+            f"(hit rate {store_stats['hit_rate']:.0%})"
+        )
+
+
+@stores.command()
+@click.option(
+    "--max-age",
+    type=click.IntRange(min=0),
+    help="Remove the entries that have not been used for this number of days.",
+)
+@click.pass_obj
+def compact(all_stores, max_age):
+    """Remove unused entries and reclaim disk space."""
+    for store in all_stores:
+        removed = store.compact(max_age)
+        click.echo(
+            f"Removed {removed} {store.TABLE}, size is now {store.stats()['size']} bytes."
+        )
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Compatibility matrix of the plugins with the releases of aiida-core.
+
+The aiida-core constraint of each plugin (e.g. ``>=2.0,<3``) is evaluated once against
+all releases of aiida-core, so that compatibility filters are lookups:
+
+* each plugin gets a bitset of its compatible releases (bit ``i`` is set if the plugin
+  is compatible with the ``i``-th release, in increasing order), as a hex string;
+* the releases are mapped to the names of the compatible plugins (reverse index).
+
+Constraints are either PEP 440 specifiers (from setup.json/setup.cfg/PEP 621) or
+the string representation of Poetry constraints (e.g. ``>=1.6,<2.0 || >=2.1``).
+"""
+
+import functools
+from typing import Dict, List, Optional, Tuple
+
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+from packaging.version import InvalidVersion, Version
+
+AIIDA_CORE_PACKAGE = "aiida-core"
+
+
+def get_release_versions(pypi_data: Optional[dict]) -> List[str]:
+    """Return the final releases in the PyPI JSON data of aiida-core, in increasing order.
+
+    Pre-releases, development releases and invalid versions are ignored.
+    """
+    versions = []
+    for release in (pypi_data or {}).get("releases", {}):
+        try:
+            version = Version(release)
+        except InvalidVersion:
+            continue
+        if not version.is_prerelease:
+            versions.append(version)
+    return [str(version) for version in sorted(versions)]
+
+
+@functools.lru_cache(maxsize=None)
+def compile_constraint(constraint: str) -> Optional[Tuple[SpecifierSet, ...]]:
+    """Return the specifier sets of a constraint (any of them must match).
+
+    :return: None if the constraint is invalid.
+    """
+    specifiers = []
+    for alternative in constraint.split("||"):
+        alternative = alternative.strip()
+        if alternative == "*":
+            alternative = ""
+        elif alternative[:1].isdigit():
+            # Poetry shows exact versions without operator
+            alternative = f"=={alternative}"
+        try:
+            specifiers.append(SpecifierSet(alternative))
+        except InvalidSpecifier:
+            return None
+    return tuple(specifiers)
+
+
+@functools.lru_cache(maxsize=None)
+def get_bitset(constraint: Optional[str], versions: Tuple[str, ...]) -> Optional[int]:
+    """Return the bitset of the ``versions`` satisfying ``constraint``.
+
+    :return: None if the constraint is missing or invalid (compatibility unknown).
+    """
+    specifiers = compile_constraint(constraint) if constraint else None
+    if specifiers is None:
+        return None
+    bitset = 0
+    for index, version in enumerate(versions):
+        if any(specifier.contains(version) for specifier in specifiers):
+            bitset |= 1 << index
+    return bitset
+
+
+def make_matrix(plugins_metadata: dict, versions: List[str]) -> Optional[dict]:
+    """Set the ``aiida_compatibility`` bitset of each plugin and return the matrix.
+
+    Without releases (e.g. the PyPI data of aiida-core could not be fetched), the
+    compatibility is unknown: the bitsets are None and there is no matrix.
+
+    :return: the ``versions`` and the ``plugins`` compatible with each version.
+    """
+    if not versions:
+        for plugin_data in plugins_metadata.values():
+            plugin_data["aiida_compatibility"] = None
+        return None
+    versions = tuple(versions)
+    plugins: Dict[str, List[str]] = {version: [] for version in versions}
+    for plugin_name, plugin_data in sorted(plugins_metadata.items()):
+        bitset = get_bitset(plugin_data.get("aiida_version"), versions)
+        plugin_data["aiida_compatibility"] = None if bitset is None else f"{bitset:x}"
+        for index, version in enumerate(versions):
+            if bitset is not None and bitset >> index & 1:
+                plugins[version].append(plugin_name)
+    return {"versions": list(versions), "plugins": plugins}
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Registry-wide index of the entry points of the plugins.
+
+`validate_plugin_entry_points` checks each plugin in isolation. Installing two plugins
+that register the same entry point, or that register entry points under the prefix of
+another plugin, is a problem at runtime: this is checked over all plugins at once.
+
+* The index maps each entry point (group and name) to the plugins registering it.
+* The prefix trie maps the segments of the ``entry_point_prefix`` of the plugins
+  (e.g. ``quantumespresso.hp``) to the plugins owning it, so that the owner of an entry
+  point name is its longest prefix, matching whole segments.
+
+Only aiida's entry point groups are considered.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterator, List, Tuple
+
+from . import REPORTER
+
+
+class PrefixTrie:
+    """Trie of the entry point prefixes, by segment (separated by ``.``)."""
+
+    def __init__(self):
+        self._root = {"children": {}, "plugins": []}
+
+    def add(self, prefix: str, plugin_name: str):
+        """Add the prefix owned by a plugin."""
+        node = self._root
+        for segment in prefix.split("."):
+            node = node["children"].setdefault(segment, {"children": {}, "plugins": []})
+        node["plugins"].append(plugin_name)
+
+    def get_owners(self, name: str) -> Tuple[str, List[str]]:
+        """Return the longest prefix of an entry point name, and its owners.
+
+        :return: the prefix and the plugins owning it (empty if no prefix matches).
+        """
+        node = self._root
+        segments = []
+        prefix, owners = "", []
+        for segment in name.split("."):
+            node = node["children"].get(segment)
+            if node is None:
+                break
+            segments.append(segment)
+            if node["plugins"]:
+                prefix, owners = ".".join(segments), node["plugins"]
+        return prefix, owners
+
+
+def iter_entry_points(plugin_data: dict) -> Iterator[Tuple[str, str]]:
+    """Yield the group and name of the entry points of aiida's groups of a plugin."""
+    for group, entry_points in (plugin_data.get("entry_points") or {}).items():
+        if not group.startswith("aiida."):
+            continue
+        for name in entry_points:
+            if not isinstance(entry_points, dict):
+                name = name.split("=")[0]
+            yield group, name.strip()
+
+
+def build_index(plugins_metadata: dict) -> Dict[str, Dict[str, List[str]]]:
+    """Return the plugins registering each entry point: ``{group: {name: [plugin]}}``."""
+    index = defaultdict(lambda: defaultdict(list))
+    for plugin_name, plugin_data in sorted(plugins_metadata.items()):
+        for group, name in iter_entry_points(plugin_data):
+            if plugin_name not in index[group][name]:
+                index[group][name].append(plugin_name)
+    return {group: dict(names) for group, names in sorted(index.items())}
+
+
+def build_prefix_trie(plugins_metadata: dict) -> PrefixTrie:
+    """Return the trie of the entry point prefixes of the plugins."""
+    trie = PrefixTrie()
+    for plugin_name, plugin_data in sorted(plugins_metadata.items()):
+        if plugin_data.get("entry_point_prefix"):
+            trie.add(plugin_data["entry_point_prefix"], plugin_name)
+    return trie
+
+
+def check_entry_points(plugins_metadata: dict) -> Dict[str, Dict[str, List[str]]]:
+    """Report the entry points registered by several plugins, or under another prefix.
+
+    The warnings are added to those of the plugins (see `Reporter.plugin`).
+
+    :return: the index of the entry points (see `build_index`).
+    """
+    index = build_index(plugins_metadata)
+    trie = build_prefix_trie(plugins_metadata)
+
+    for plugin_name, plugin_data in sorted(plugins_metadata.items()):
+        with REPORTER.plugin(plugin_name, reset=False):
+            for group, name in iter_entry_points(plugin_data):
+                others = [other for other in index[group][name] if other != plugin_name]
+                if others:
+                    REPORTER.warn(
+                        f"Entry point '{name}' in group '{group}' is also registered "
+                        f"by {', '.join(others)}.",
+                        check_id="W021",
+                    )
+                prefix, owners = trie.get_owners(name)
+                if owners and plugin_name not in owners:
+                    REPORTER.warn(
+                        f"Entry point '{name}' uses the prefix '{prefix}' of "
+                        f"{', '.join(owners)}.",
+                        check_id="W022",
+                    )
+            prefix = plugin_data.get("entry_point_prefix")
+            owners = trie.get_owners(prefix)[1] if prefix else []
+            if len(owners) > 1:
+                others = [other for other in owners if other != plugin_name]
+                REPORTER.warn(
+                    f"Prefix '{prefix}' is also used by {', '.join(others)}.",
+                    check_id="W022",
+                )
+    return index
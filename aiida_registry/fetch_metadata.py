@@ -5,21 +5,19 @@ Data is primarily sourced from PyPI,
 with a fallback to the repository build file (setup.json, setup.cfg, pyproject.toml).
 """
 
+import copy
+import hashlib
 import json
 
 # pylint: disable=consider-using-f-string
 import os
 import re
-import subprocess
-import sys
-import traceback
 import urllib
 from collections import OrderedDict
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
-from typing import Optional
+from typing import Dict, Optional
 
-import requests
 import yaml
 
 from . import (
@@ -27,13 +25,29 @@ from . import (
     PLUGINS_METADATA,
     REPORTER,
     classifier_to_status,
+    git_mirror,
+    http_client,
     status_dict,
 )
-from .parse_build_file import get_data_parser, identify_build_tool
-from .parse_pypi import PypiData, get_pypi_metadata
+from .entry_point_index import check_entry_points
+from .github import get_commits_counts, get_github_commits_count
+from .link_check import LinkStatus, check_link_async, check_links, collect_links
+from .parse_build_file import PARSER_VERSION, parse_build_file
+from .parse_pypi import (
+    PypiData,
+    get_latest_release,
+    get_pypi_json,
+    get_pypi_metadata,
+    has_wheel,
+)
+from .trace import TRACER
 from .utils import add_registry_checks, fetch_file
 
 GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
+# Version of the records, part of their fingerprint (see `complete_plugin_data`):
+# increment it when a change of the code changes the records, so that the records of
+# previous runs are not reused
+RECORD_VERSION = 1
 
 
 @lru_cache(maxsize=None)
@@ -47,12 +61,22 @@ def load_plugins_metadata(json_file_path):
         return None
 
 
-def get_hosted_on(url):
-    """Get the hosting service from a URL."""
-    try:
-        requests.get(url, timeout=30)
-    except Exception as exc:
-        raise ValueError("Unable to open 'code_home' url: '{}'".format(url)) from exc
+async def get_hosted_on_async(url, link: Optional[LinkStatus] = None):
+    """Get the hosting service from a URL.
+
+    An error is reported for the current plugin if the URL cannot be opened (e.g. when
+    the requests to its host are suspended by its circuit breaker), and the hosting
+    service is still derived from the URL.
+
+    :param link: the result of checking the URL, if already checked.
+    """
+    if link is None:
+        link = await check_link_async(url)
+    if link.error is not None:
+        REPORTER.error(
+            "Unable to open 'code_home' url: '{}' ({})".format(url, link.error),
+            check_id="E005",
+        )
 
     netloc = urllib.parse.urlparse(url).netloc
 
@@ -66,117 +90,134 @@ def get_hosted_on(url):
     return netloc
 
 
-def get_github_commits_count(repo_url):
-    """
-    Get the commits count on the default branch of the repository.
-    """
-    owner, repo = repo_url.split("/")[3:5]
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits"
-    today = datetime.today().date()
-    last_twelve_months = today - timedelta(days=365)
-
-    # Run locally without GITHUB_TOKEN
-    if GITHUB_TOKEN is None:
-        headers = {"Accept": "application/vnd.github+json"}
-    else:
-        headers = {
-            "Authorization": f"Bearer {GITHUB_TOKEN}",
-            "Accept": "application/vnd.github+json",
-        }
-
-    params = {
-        "since": last_twelve_months.isoformat(),
-        "until": today.isoformat(),
-        "per_page": 1,
-        "page": 1,
-    }
-
-    response = requests.get(url, params=params, headers=headers, timeout=60)
-    if response.status_code == 200:
-        if len(response.json()) == 0:
-            commits_count = 0
-        else:
-            # https://stackoverflow.com/a/70610670/1069467
-            link_header = response.headers.get("Link")
-            match = re.search(r'page=(\d+)>; rel="last"', link_header)
-            commits_count = int(match.group(1))
-    else:
-        commits_count = -1
+def get_hosted_on(url, link: Optional[LinkStatus] = None):
+    """Get the hosting service from a URL."""
+    return http_client.run(get_hosted_on_async(url, link))
 
-    return commits_count
 
+def fetch_build_file(url, link: Optional[LinkStatus] = None) -> Optional[str]:
+    """Fetch the content of a build file, unless its URL is known to be unreachable.
 
-def clone_repository(url, repo_name):
-    """
-    clone the plugin repository.
+    :param link: the result of checking the URL, if already checked.
     """
-    if not os.path.exists("installed_plugins"):
-        os.makedirs("installed_plugins")
-    subprocess.run(["git", "clone", url, f"installed_plugins/{repo_name}"], check=False)
+    if link is not None and not link.ok:
+        REPORTER.error(
+            f"Unable to retrieve plugin metadata, plugin info '{url}' cannot be "
+            f"reached ({link.error or f'HTTP status {link.status}'}).",
+            check_id="E004",
+        )
+        return None
+    with TRACER.span("fetch_build_file", url=url):
+        return fetch_file(url)
 
 
-def get_git_commits_count(repo_name):
-    """
-    get the number of commits in the last year.
-    """
-    last_twelve_months = datetime.now() - timedelta(days=365)
-    git_command = [
-        "git",
-        "rev-list",
-        "--count",
-        f'--since="{last_twelve_months}"',
-        "--all",
-    ]
-    commits_count = (
-        subprocess.check_output(git_command, cwd=f"./installed_plugins/{repo_name}")
-        .decode()
-        .strip()
-    )
-    return int(commits_count)
-
+def get_previous_record(record: dict) -> dict:
+    """Return a record of a previous run as it was produced by the fetch.
 
-def complete_plugin_data(plugin_data: dict, fetch_pypi=True, fetch_pypi_wheel=True):  # pylint: disable=too-many-branches,too-many-statements
+    Removes what `test-install` adds to the record: the `is_installable` key,
+    its warnings/errors and the process metadata of the entry points.
+    """
+    record = copy.deepcopy(record)
+    record.pop("is_installable", None)
+    num_errors, num_warnings = record["fingerprint"]["checks"]
+    record["errors"] = record.get("errors", [])[:num_errors]
+    record["warnings"] = record.get("warnings", [])[:num_warnings]
+    for entry_points in (record.get("entry_points") or {}).values():
+        for name, value in entry_points.items():
+            if isinstance(value, dict) and "class" in value:
+                entry_points[name] = value["class"]
+    return record
+
+
+def is_unchanged(fingerprint: dict, previous: Optional[dict]) -> bool:
+    """Return True if the fingerprint of a plugin matches the one of the previous record."""
+    if previous is None or None in fingerprint.values():
+        return False
+    previous_fingerprint = dict(previous.get("fingerprint", {}))
+    previous_fingerprint.pop("checks", None)
+    return previous_fingerprint == fingerprint
+
+
+def complete_plugin_data(  # pylint: disable=too-many-branches,too-many-statements,too-many-locals
+    plugin_data: dict,
+    fetch_pypi=True,
+    fetch_pypi_wheel=True,
+    previous=None,
+    links: Optional[Dict[str, LinkStatus]] = None,
+):
     """Update plugin data dictionary.
 
      * add metadata, aiida_version and entrypoints from plugin_info
      * add package_name if missing
-     * add hosted_on
      & more
     used for rendering.
+
+    The data that changes independently of the sources of the plugin (hosting service,
+    commits count and checks of links) is added by `update_live_data`.
+
+    :param previous: record of the plugin from a previous run.
+        It is returned instead (see `get_previous_record`), if neither the entry in
+        plugins.yaml, the latest PyPI release, the build file nor the version of the
+        records have changed since.
+    :param links: results of checking the URLs of the plugin, if already checked
+        (see `link_check.check_links`).
     """
+    links = links or {}
+    # identifies the data the record is derived from
+    fingerprint = {
+        "entry": hashlib.sha256(
+            json.dumps(plugin_data, sort_keys=True).encode("utf8")
+        ).hexdigest(),
+        "version": [RECORD_VERSION, PARSER_VERSION],
+    }
+
     if "package_name" not in list(plugin_data.keys()):
         plugin_data["package_name"] = plugin_data["name"].replace("-", "_")
 
     REPORTER.info(f"{plugin_data['package_name']}")
 
-    plugin_data["hosted_on"] = get_hosted_on(plugin_data["code_home"])
+    pypi_data = None
+    if fetch_pypi and is_pip_url_pypi(plugin_data.get("pip_url", "")):
+        with TRACER.span("get_pypi_json", package=plugin_data["pip_url"]):
+            pypi_data = get_pypi_json(plugin_data["pip_url"])
+        fingerprint["pypi_release"] = pypi_data and get_latest_release(pypi_data)
+
+    # the build file is only needed if the entry points cannot be read from a wheel
+    plugin_info_url = plugin_data.get("plugin_info")
+    plugin_info_content = None
+    if plugin_info_url and (
+        pypi_data is None or not fetch_pypi_wheel or not has_wheel(pypi_data)
+    ):
+        # retrieve content of build file
+        plugin_info_content = fetch_build_file(
+            plugin_info_url, links.get(plugin_info_url)
+        )
+        fingerprint["plugin_info"] = plugin_info_content and (
+            hashlib.sha256(plugin_info_content.encode("utf8")).hexdigest()
+        )
 
-    if plugin_data["hosted_on"] == "github.com" and GITHUB_TOKEN:
-        commits_count = get_github_commits_count(plugin_data["code_home"])
-    else:
-        # when running locally, we don't have a GITHUB_TOKEN
-        # all the repositories are cloned locally
-        # this may take a while (10s per plugin)
-        try:
-            clone_repository(plugin_data["code_home"], plugin_data["name"])
-            commits_count = get_git_commits_count(plugin_data["name"])
-        except Exception as exc:  # pylint: disable=broad-except
-            commits_count = -1
-            print("Failed to clone the plugin repository:", str(exc))
+    if is_unchanged(fingerprint, previous):
+        REPORTER.info("  unchanged since previous run")
+        return get_previous_record(previous)
 
     plugin_data.update(
         {
             "metadata": {},
             "aiida_version": None,
             "entry_points": None,
-            "commits_count": commits_count,
         }
     )
 
     # First try to get metadata from PyPI
     pypi_metadata: Optional[PypiData] = None
-    if fetch_pypi and is_pip_url_pypi(plugin_data.get("pip_url", "")):
-        pypi_metadata = get_pypi_metadata(plugin_data["pip_url"], fetch_pypi_wheel)
+    if pypi_data is not None:
+        with TRACER.span("get_pypi_metadata", package=plugin_data["pip_url"]):
+            pypi_metadata = get_pypi_metadata(
+                plugin_data["pip_url"], fetch_pypi_wheel, pypi_data=pypi_data
+            )
+    if pypi_metadata and not pypi_metadata.complete:
+        # the record falls back on other data: it is not reused (see `is_unchanged`)
+        fingerprint["wheel"] = None
     if pypi_metadata:
         plugin_data["metadata"] = pypi_metadata.metadata
         plugin_data["aiida_version"] = pypi_metadata.aiida_version
@@ -191,28 +232,29 @@ def complete_plugin_data(plugin_data: dict, fetch_pypi=True, fetch_pypi_wheel=Tr
                 check_id="E001",
             )
         else:
-            # retrieve content of build file
-            plugin_info_content = fetch_file(plugin_info_url)
+            if "plugin_info" not in fingerprint:
+                # reading the wheel failed unexpectedly
+                plugin_info_content = fetch_build_file(
+                    plugin_info_url, links.get(plugin_info_url)
+                )
 
             if plugin_info_content:
-                # Identify build system
-                build_tool_name = identify_build_tool(
-                    plugin_info_url,
-                    plugin_info_content,
-                )
-                if pypi_metadata is not None:
-                    # we only need to get the entry points
-                    data = get_data_parser(build_tool_name)(
-                        plugin_info_content, ep_only=True
-                    )  # , entry_points_only=True
-                    plugin_data["entry_points"] = data.entry_points
-                else:
-                    data = get_data_parser(build_tool_name)(
-                        plugin_info_content, ep_only=False
+                with TRACER.span(
+                    "parse_build_file", bytes=len(plugin_info_content)
+                ) as span:
+                    # we only need to get the entry points if PyPI has the metadata
+                    build_tool, data = parse_build_file(
+                        plugin_info_url,
+                        plugin_info_content,
+                        ep_only=pypi_metadata is not None,
                     )
-                    plugin_data["metadata"] = data.metadata
-                    plugin_data["aiida_version"] = data.aiida_version
-                    plugin_data["entry_points"] = data.entry_points
+                    span["build_tool"] = build_tool
+                    if pypi_metadata is not None:
+                        plugin_data["entry_points"] = data.entry_points
+                    else:
+                        plugin_data["metadata"] = data.metadata
+                        plugin_data["aiida_version"] = data.aiida_version
+                        plugin_data["entry_points"] = data.entry_points
 
     # ensure entry points are not None
     plugin_data["entry_points"] = plugin_data.get("entry_points") or {}
@@ -229,14 +271,64 @@ def complete_plugin_data(plugin_data: dict, fetch_pypi=True, fetch_pypi_wheel=Tr
 
     validate_dev_status(plugin_data)
 
-    if "documentation_url" in plugin_data:
-        validate_doc_url(plugin_data["documentation_url"])
-
     validate_plugin_entry_points(plugin_data)
 
+    plugin_data["fingerprint"] = fingerprint
+
     return plugin_data
 
 
+def update_live_data(
+    record: dict,
+    commits_count=None,
+    links: Optional[Dict[str, LinkStatus]] = None,
+):
+    """Add the hosting service and commits count to a record, and check its links.
+
+    This data changes independently of the sources of the plugin, so it is updated on
+    every run, also for the records reused from a previous run. Its checks are reported
+    after the checks of the plugin are counted in its fingerprint, so that they are not
+    carried over by `get_previous_record`.
+
+    :param commits_count: commits count of the GitHub repository, if already collected
+        (see `github.get_commits_counts`).
+    :param links: results of checking the URLs of the plugin, if already checked
+        (see `link_check.check_links`).
+    """
+    links = links or {}
+    with TRACER.span("get_hosted_on", url=record["code_home"]):
+        record["hosted_on"] = get_hosted_on(
+            record["code_home"], links.get(record["code_home"])
+        )
+
+    with TRACER.span("commits_count", url=record["code_home"]) as span:
+        if record["hosted_on"] == "github.com" and GITHUB_TOKEN:
+            span["source"] = "github"
+            if commits_count is None:
+                commits_count = get_github_commits_count(
+                    record["code_home"], GITHUB_TOKEN
+                )
+        else:
+            # when running locally, we don't have a GITHUB_TOKEN
+            # the commits are counted in a local mirror of the repository
+            # (only the commits since the last run are fetched, see `git_mirror`)
+            span["source"] = "git_mirror"
+            try:
+                commits_count = git_mirror.get_commits_count(record["code_home"])
+            except Exception as exc:  # pylint: disable=broad-except
+                commits_count = -1
+                REPORTER.info(f"Failed to mirror the plugin repository: {exc}")
+
+    record["commits_count"] = commits_count
+
+    if "documentation_url" in record:
+        with TRACER.span("validate_doc_url", url=record["documentation_url"]):
+            validate_doc_url(
+                record["documentation_url"],
+                links.get(record["documentation_url"]),
+            )
+
+
 def validate_dev_status(plugin_data: dict):
     """Validate the development_status key, potentially sourcing from classifiers."""
     classifiers = (
@@ -290,17 +382,24 @@ def validate_dev_status(plugin_data: dict):
         )
 
 
-def validate_doc_url(url):
-    """Validate that documentation URL provides valid HTTP response."""
-    try:
-        response = requests.get(url, timeout=60)
-        response.raise_for_status()  # raise an exception for all 4xx/5xx errors
-    except Exception:  # pylint: disable=broad-except
+async def validate_doc_url_async(url, link: Optional[LinkStatus] = None):
+    """Validate that documentation URL provides valid HTTP response.
+
+    :param link: the result of checking the URL, if already checked.
+    """
+    if link is None:
+        link = await check_link_async(url)
+    if not link.ok:  # all 4xx/5xx errors
         REPORTER.warn(
             f"Unable to reach documentation URL: {url}",
             check_id="W008",
         )
-        REPORTER.debug(traceback.print_exc(file=sys.stdout))
+        REPORTER.debug(link.error or f"HTTP status {link.status}")
+
+
+def validate_doc_url(url, link: Optional[LinkStatus] = None):
+    """Validate that documentation URL provides valid HTTP response."""
+    http_client.run(validate_doc_url_async(url, link))
 
 
 def validate_plugin_entry_points(plugin_data):
@@ -347,22 +446,106 @@ def is_pip_url_pypi(string: str) -> bool:
     return PYPI_NAME_RE.match(string) is not None
 
 
-def fetch_metadata(filter_list=None, fetch_pypi=True, fetch_pypi_wheel=True):
-    """Fetch metadata from PyPI and AiiDA-Plugins."""
+def is_github_url(url: str) -> bool:
+    """Check if the URL points to a GitHub repository."""
+    parsed = urllib.parse.urlparse(url)
+    return parsed.netloc == "github.com" and len(parsed.path.strip("/").split("/")) >= 2
+
+
+def fetch_metadata(
+    filter_list=None, fetch_pypi=True, fetch_pypi_wheel=True, jobs=1, previous=None
+):
+    """Fetch metadata from PyPI and AiiDA-Plugins.
+
+    :param jobs: number of plugins to process concurrently.
+        The result does not depend on the number of jobs.
+    :param previous: plugins metadata of a previous run (the "plugins" of its JSON file),
+        whose records are reused for plugins that have not changed since.
+    :return: the plugins metadata, and the index of their entry points
+        (see `entry_point_index.build_index`).
+    """
     with open(PLUGINS_FILE_ABS, encoding="utf8") as handle:
         plugins_raw_data: dict = yaml.safe_load(handle)
 
-    plugins_metadata = OrderedDict()
+    plugins_to_fetch = [
+        (plugin_name, plugin_data)
+        for plugin_name, plugin_data in sorted(plugins_raw_data.items())
+        if not filter_list or plugin_name in filter_list
+    ]
+    previous = previous or {}
 
-    for plugin_name, plugin_data in sorted(plugins_raw_data.items()):
-        if filter_list and plugin_name not in filter_list:
-            continue
-        REPORTER.set_plugin_name(plugin_name)
-        plugin_data["name"] = plugin_name
-        plugins_metadata[plugin_name] = complete_plugin_data(
-            plugin_data, fetch_pypi=fetch_pypi, fetch_pypi_wheel=fetch_pypi_wheel
+    # all links are checked at once
+    with TRACER.span("check_links") as span:
+        links = check_links(
+            collect_links(plugin_data for _, plugin_data in plugins_to_fetch)
         )
+        span["links"] = len(links)
+    for link in links.values():
+        if not link.ok:
+            REPORTER.info(f"Unable to reach {link.url}: {link.error or link.status}")
+
+    # the commits of all GitHub repositories are counted at once
+    commits_counts = {}
+    if GITHUB_TOKEN:
+        with TRACER.span("get_commits_counts"):
+            commits_counts = get_commits_counts(
+                (
+                    plugin_data["code_home"]
+                    for _, plugin_data in plugins_to_fetch
+                    if is_github_url(plugin_data["code_home"])
+                ),
+                GITHUB_TOKEN,
+            )
+
+    def fetch_plugin(plugin_name, plugin_data):
+        with REPORTER.plugin(plugin_name) as report, TRACER.span("plugin"):
+            plugin_data["name"] = plugin_name
+            record = complete_plugin_data(
+                plugin_data,
+                fetch_pypi=fetch_pypi,
+                fetch_pypi_wheel=fetch_pypi_wheel,
+                previous=previous.get(plugin_name),
+                links=links,
+            )
+            # number of checks reported for the plugin itself (see `get_previous_record`)
+            record["fingerprint"].setdefault(
+                "checks", [len(report.errors), len(report.warnings)]
+            )
+            update_live_data(
+                record,
+                commits_count=commits_counts.get(record["code_home"]),
+                links=links,
+            )
+        return record
+
+    if jobs > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(fetch_plugin, plugin_name, plugin_data)
+                for plugin_name, plugin_data in plugins_to_fetch
+            ]
+            try:
+                results = [future.result() for future in futures]
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    else:
+        results = [
+            fetch_plugin(plugin_name, plugin_data)
+            for plugin_name, plugin_data in plugins_to_fetch
+        ]
+
+    # keep the (sorted) order of plugins.yaml, independent of completion order
+    plugins_metadata = OrderedDict(
+        (plugin_name, result)
+        for (plugin_name, _), result in zip(plugins_to_fetch, results)
+    )
+    # checks of the entry points over all plugins (after the "checks" of the plugins
+    # are counted, so that they are not carried over by `get_previous_record`)
+    with TRACER.span("check_entry_points"):
+        entry_point_index = check_entry_points(plugins_metadata)
     plugins_metadata = add_registry_checks(plugins_metadata)
     REPORTER.info(f"{PLUGINS_METADATA} dumped")
 
-    return plugins_metadata
+    return plugins_metadata, entry_point_index
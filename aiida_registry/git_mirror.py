@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Mirrors of plugin repositories, used to count commits without the GitHub API.
+
+Each repository is cloned once as a bare partial clone (commits and trees only, no
+file contents), with the history limited to the window of the commit count.
+Later runs only fetch the new commits of the existing mirror.
+In offline mode, the existing mirrors are used as they are.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import threading
+import urllib.parse
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from .metrics import METRICS
+from .trace import TRACER
+
+# Default directory of the mirrors
+MIRROR_DIR = ".git-mirrors"
+# Window of the commit count
+COMMITS_WINDOW = timedelta(days=365)
+# Timeout of a single git command (seconds)
+GIT_TIMEOUT = 300
+
+_mirror_dir = MIRROR_DIR
+_offline = False
+# a mirror may be shared by several plugins fetched concurrently
+_locks = defaultdict(threading.Lock)
+_locks_lock = threading.Lock()
+
+
+def set_mirror_dir(directory):
+    """Set the directory of the mirrors."""
+    global _mirror_dir  # pylint: disable=global-statement
+    _mirror_dir = directory
+
+
+def get_mirror_dir() -> str:
+    """Return the directory of the mirrors."""
+    return _mirror_dir
+
+
+def set_offline(offline: bool):
+    """Use the existing mirrors without updating them (and fail for missing ones)."""
+    global _offline  # pylint: disable=global-statement
+    _offline = offline
+
+
+def get_mirror_path(url: str) -> str:
+    """Return the path of the mirror of the repository at ``url``."""
+    parsed = urllib.parse.urlparse(url)
+    name = re.sub(r"[^\w.-]+", "_", f"{parsed.netloc}{parsed.path}".strip("/"))
+    if not name.endswith(".git"):
+        name += ".git"
+    return os.path.join(_mirror_dir, name)
+
+
+def _git(*args, cwd=None) -> str:
+    """Run a git command and return its output."""
+    return subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        text=True,
+        timeout=GIT_TIMEOUT,
+        # fail instead of asking for credentials of private/deleted repositories
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+    ).stdout
+
+
+def _with_shallow_fallback(*args, since: datetime, cwd=None):
+    """Run a git clone/fetch limited to the history since ``since``.
+
+    If there is no commit in that window, git refuses the request: only the last commit
+    is fetched instead.
+    """
+    try:
+        _git(*args[:1], f"--shallow-since={since:%Y-%m-%d}", *args[1:], cwd=cwd)
+    except subprocess.CalledProcessError as exc:
+        if "no commits selected for shallow requests" not in exc.stderr:
+            raise
+        _git(*args[:1], "--depth=1", *args[1:], cwd=cwd)
+
+
+def update_mirror(url: str, since: datetime) -> str:
+    """Create or update the mirror of the repository at ``url``.
+
+    :param since: start of the history needed.
+    :return: the path of the mirror.
+    """
+    path = get_mirror_path(url)
+    with _locks_lock:
+        lock = _locks[path]
+    with lock:
+        if _offline:
+            if not os.path.isdir(path):
+                raise FileNotFoundError(f"No mirror of {url} in {_mirror_dir}")
+            return path
+        if os.path.isdir(path):
+            with TRACER.span("git fetch", "git", url=url):
+                _with_shallow_fallback(
+                    "fetch", "--prune", "--tags", "origin", since=since, cwd=path
+                )
+            METRICS.inc("git_operations_total", operation="fetch")
+            return path
+
+        # clone next to the mirror, so that a failed clone does not leave a broken mirror
+        os.makedirs(_mirror_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        try:
+            with TRACER.span("git clone", "git", url=url):
+                _with_shallow_fallback(
+                    "clone", "--bare", "--filter=blob:none", url, tmp_path, since=since
+                )
+            METRICS.inc("git_operations_total", operation="clone")
+            # a bare clone does not configure which references to fetch
+            _git(
+                "config",
+                "remote.origin.fetch",
+                "+refs/heads/*:refs/heads/*",
+                cwd=tmp_path,
+            )
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        os.rename(tmp_path, path)
+    return path
+
+
+def get_commits_count(url: str, window: timedelta = COMMITS_WINDOW) -> int:
+    """Return the number of commits in the repository at ``url`` during the last ``window``.
+
+    All branches and tags are counted.
+    """
+    since = datetime.now() - window
+    path = update_mirror(url, since)
+    count = _git(
+        "rev-list", "--count", f"--since={since.isoformat()}", "--all", cwd=path
+    )
+    return int(count.strip())
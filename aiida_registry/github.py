@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""Commit activity of GitHub repositories.
+
+The commit counts of many repositories are collected at once with the GraphQL API
+(one aliased ``repository`` field per repository), which costs a single request per
+batch instead of one REST request per repository.
+Repositories for which the GraphQL query fails fall back to the REST API.
+"""
+
+import asyncio
+import json
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from . import http_client
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+REST_URL = "https://api.github.com"
+# Number of repositories per GraphQL query
+BATCH_SIZE = 50
+# Window of the commit count
+COMMITS_WINDOW = timedelta(days=365)
+
+REPOSITORY_FRAGMENT = """
+  {alias}: repository(owner: {owner}, name: {name}) {{
+    defaultBranchRef {{
+      target {{
+        ... on Commit {{
+          history(since: {since}) {{
+            totalCount
+          }}
+        }}
+      }}
+    }}
+  }}"""
+
+
+def get_owner_repo(repo_url: str) -> List[str]:
+    """Return the owner and name of a repository from its URL."""
+    return repo_url.split("/")[3:5]
+
+
+def _headers(token: Optional[str]) -> dict:
+    headers = {"Accept": "application/vnd.github+json"}
+    if token is not None:
+        headers["Authorization"] = f"Bearer {token}"
+    return headers
+
+
+def _since(window: timedelta) -> str:
+    """Return the start of the window of the commit count (ISO 8601).
+
+    Commits are counted from midnight, ``window`` before today, until now: the GraphQL
+    and REST queries must count the same commits.
+    """
+    today = datetime.today().date()
+    return datetime.combine(today - window, datetime.min.time()).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+
+
+async def get_github_commits_count_async(
+    repo_url,
+    token: Optional[str] = None,
+    window: timedelta = COMMITS_WINDOW,
+    rest_url: str = REST_URL,
+) -> int:
+    """Get the commits count on the default branch of the repository (REST API).
+
+    :return: the number of commits, or -1 if the request fails.
+    """
+    owner, repo = get_owner_repo(repo_url)
+    url = f"{rest_url}/repos/{owner}/{repo}/commits"
+    params = {
+        "since": _since(window),
+        "per_page": 1,
+        "page": 1,
+    }
+
+    response = await http_client.get(
+        url, params=params, headers=_headers(token), timeout=60
+    )
+    if response.status != 200:
+        return -1
+    # with one commit per page, the number of the last page is the number of commits
+    # https://stackoverflow.com/a/70610670/1069467
+    match = re.search(r'page=(\d+)>; rel="last"', response.headers.get("Link", ""))
+    if match is None:
+        return len(response.json())
+    return int(match.group(1))
+
+
+def get_github_commits_count(repo_url, token: Optional[str] = None) -> int:
+    """Get the commits count on the default branch of the repository (REST API)."""
+    return http_client.run(get_github_commits_count_async(repo_url, token))
+
+
+def build_commits_query(repo_urls: List[str], since: str) -> str:
+    """Return a GraphQL query of the commit counts of repositories.
+
+    The repository ``repo_urls[i]`` is queried as field ``r<i>``.
+    """
+    fields = [
+        REPOSITORY_FRAGMENT.format(
+            alias=f"r{index}",
+            owner=json.dumps(owner),
+            name=json.dumps(name),
+            since=json.dumps(since),
+        )
+        for index, (owner, name) in enumerate(map(get_owner_repo, repo_urls))
+    ]
+    return "query {%s\n}" % "".join(fields)  # pylint: disable=consider-using-f-string
+
+
+async def _get_batch_counts_async(
+    repo_urls: List[str], token, endpoint, window
+) -> Dict[str, Optional[int]]:
+    """Return the commit counts of a batch of repositories (None if the query failed)."""
+    query = build_commits_query(repo_urls, _since(window))
+    response = await http_client.post(
+        endpoint,
+        data=json.dumps({"query": query}).encode("utf8"),
+        headers={**_headers(token), "Content-Type": "application/json"},
+        timeout=60,
+    )
+    if response.status != 200:
+        return dict.fromkeys(repo_urls)
+    data = response.json().get("data") or {}
+
+    counts = {}
+    for index, repo_url in enumerate(repo_urls):
+        # repositories not found (or inaccessible) are null, with an entry in "errors"
+        repository = data.get(f"r{index}")
+        if repository is None:
+            counts[repo_url] = None
+        elif repository["defaultBranchRef"] is None:
+            # empty repository
+            counts[repo_url] = 0
+        else:
+            target = repository["defaultBranchRef"]["target"]
+            counts[repo_url] = target.get("history", {}).get("totalCount")
+    return counts
+
+
+async def get_commits_counts_async(  # pylint: disable=too-many-arguments
+    repo_urls: Iterable[str],
+    token: Optional[str],
+    *,
+    endpoint: str = GRAPHQL_URL,
+    rest_url: str = REST_URL,
+    batch_size: int = BATCH_SIZE,
+    window: timedelta = COMMITS_WINDOW,
+) -> Dict[str, int]:
+    """Get the commits counts on the default branch of many GitHub repositories.
+
+    The GraphQL API requires a token. Repositories for which the query fails are
+    counted with the REST API.
+
+    :param endpoint: the URL of the GraphQL API.
+    :param rest_url: the base URL of the REST API.
+    :return: the number of commits per repository URL (-1 if it cannot be counted).
+    """
+    repo_urls = list(dict.fromkeys(repo_urls))
+    batches = [
+        repo_urls[start : start + batch_size]
+        for start in range(0, len(repo_urls), batch_size)
+    ]
+    counts = {}
+    batches_counts = await asyncio.gather(
+        *(_get_batch_counts_async(batch, token, endpoint, window) for batch in batches),
+        return_exceptions=True,
+    )
+    for batch, batch_counts in zip(batches, batches_counts):
+        if isinstance(batch_counts, Exception):
+            batch_counts = dict.fromkeys(batch)
+        counts.update(batch_counts)
+
+    failed = [repo_url for repo_url, count in counts.items() if count is None]
+    rest_counts = await asyncio.gather(
+        *(
+            get_github_commits_count_async(url, token, window, rest_url)
+            for url in failed
+        ),
+        return_exceptions=True,
+    )
+    for repo_url, count in zip(failed, rest_counts):
+        counts[repo_url] = -1 if isinstance(count, Exception) else count
+    return counts
+
+
+def get_commits_counts(repo_urls: Iterable[str], token: Optional[str], **kwargs):
+    """Get the commits counts on the default branch of many GitHub repositories."""
+    return http_client.run(get_commits_counts_async(repo_urls, token, **kwargs))
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""On-disk cache of HTTP responses.
+
+Responses are stored in a sqlite database, with a time-to-live depending on the class
+of the resource (see `CACHE_POLICIES`). Expired responses carrying an ``ETag`` or
+``Last-Modified`` header are revalidated with a conditional request, so that an
+unchanged resource costs a ``304 Not Modified`` instead of a full download.
+When the cache grows beyond its size limit, the least recently used entries are evicted.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+# Default maximum size of the cache (bytes)
+DEFAULT_MAX_SIZE = 512 * 1024**2
+CACHE_FILENAME = "http_cache.sqlite"
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+class CachePolicy(NamedTuple):
+    """How long responses of a class of resources are considered fresh."""
+
+    name: str
+    pattern: Optional[str]
+    ttl: Optional[float]  # None: never expires
+
+
+CACHE_POLICIES = [
+    # released distribution files are immutable
+    CachePolicy("wheel", r"^https://files\.pythonhosted\.org/", None),
+    CachePolicy("pypi_json", r"^https://pypi\.org/pypi/", HOUR),
+    CachePolicy("github_api", r"^https://api\.github\.com/", HOUR),
+    CachePolicy("build_file", r"^https://raw\.(githubusercontent|github)\.com/", HOUR),
+    CachePolicy("default", r"", HOUR),
+]
+# Policy of requests that only check that a URL can be reached (no body is read)
+LIVENESS_POLICY = CachePolicy("liveness", None, 7 * DAY)
+
+
+def get_policy(url: str, read=True) -> CachePolicy:
+    """Return the cache policy for a request."""
+    if not read:
+        return LIVENESS_POLICY
+    for policy in CACHE_POLICIES:
+        if re.match(policy.pattern, url):
+            return policy
+    raise ValueError(f"No cache policy for '{url}'")  # pragma: no cover
+
+
+def cache_key(method: str, url: str, read=True, headers: Optional[dict] = None) -> str:
+    """Return the key of a request (headers that do not change the response are ignored)."""
+    key = f"{method} {url} {'body' if read else 'status'}"
+    if headers and "Range" in headers:
+        key += f" {headers['Range']}"
+    return hashlib.sha256(key.encode("utf8")).hexdigest()
+
+
+class CacheEntry(NamedTuple):
+    """A cached response."""
+
+    url: str
+    status: int
+    headers: list  # list of (name, value) pairs
+    content: bytes
+    encoding: Optional[str]
+    expires_at: Optional[float]
+
+    @property
+    def is_fresh(self) -> bool:
+        """Return True if the entry can be used without revalidation."""
+        return self.expires_at is None or time.time() < self.expires_at
+
+    def validators(self) -> dict:
+        """Return the headers of a conditional request to revalidate the entry."""
+        conditional = {}
+        for name, value in self.headers:
+            if name.lower() == "etag":
+                conditional["If-None-Match"] = value
+            elif name.lower() == "last-modified":
+                conditional["If-Modified-Since"] = value
+        return conditional
+
+
+class CacheStats:  # pylint: disable=too-few-public-methods
+    """Counters of cache usage."""
+
+    def __init__(self):
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evicted = 0
+
+    def __str__(self):
+        return (
+            f"HTTP cache: {self.hits} hits, {self.revalidated} revalidated (304), "
+            f"{self.misses} misses, {self.bytes_saved / 1024**2:.1f} MiB saved, "
+            f"{self.evicted} evicted"
+        )
+
+
+class HttpCache:
+    """Cache of HTTP responses in a sqlite database."""
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        """Open (or create) the cache in ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, CACHE_FILENAME)
+        self.max_size = max_size
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, "
+            "content BLOB, encoding TEXT, policy TEXT, expires_at REAL, "
+            "last_access REAL, size INTEGER)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)"
+        )
+        self._db.commit()
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+
+    @property
+    def size(self) -> int:
+        """Return the total size of the cached responses (bytes)."""
+        return self._size
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry for ``key`` (fresh or not), or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, headers, content, encoding, expires_at "
+                "FROM entries WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._db.commit()
+        url, status, headers, content, encoding, expires_at = row
+        return CacheEntry(
+            url, status, json.loads(headers), content, encoding, expires_at
+        )
+
+    def put(  # pylint: disable=too-many-arguments
+        self, key, policy: CachePolicy, url, status, headers, content=b"", encoding=None
+    ):
+        """Store a response."""
+        now = time.time()
+        expires_at = None if policy.ttl is None else now + policy.ttl
+        size = len(content) + len(url)
+        with self._lock:
+            old = self._db.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    url,
+                    status,
+                    json.dumps(list(headers)),
+                    content,
+                    encoding,
+                    policy.name,
+                    expires_at,
+                    now,
+                    size,
+                ),
+            )
+            self._size += size - (old[0] if old else 0)
+            self._evict()
+            self._db.commit()
+
+    def refresh(self, key, policy: CachePolicy):
+        """Mark an entry as fresh again, after a successful revalidation."""
+        expires_at = None if policy.ttl is None else time.time() + policy.ttl
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET expires_at = ? WHERE key = ?", (expires_at, key)
+            )
+            self._db.commit()
+
+    def _evict(self):
+        """Evict least recently used entries until the cache fits its size limit."""
+        if self._size <= self.max_size:
+            return
+        for key, size in self._db.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            if self._size <= self.max_size:
+                break
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._size -= size
+            self.stats.evicted += 1
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+            self._size = 0
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,561 @@
+# -*- coding: utf-8 -*-
+"""Asynchronous HTTP engine used for all network I/O of the registry.
+
+All requests are multiplexed on a single event loop, running in a background thread,
+and share one `aiohttp.ClientSession` (and hence its pool of keep-alive connections).
+Failed requests are retried with jittered exponential backoff, and a per-host circuit
+breaker makes requests to a host that keeps failing fail fast for the rest of the run.
+Requests are paced to stay within the rate limits announced by the servers.
+GET and HEAD requests can be served from an on-disk cache (see `aiida_registry.http_cache`).
+
+Coroutines can simply ``await`` the module-level `get`/`post` functions,
+while synchronous code waits for a coroutine with `run`.
+"""
+
+import asyncio
+import atexit
+import contextvars
+import json
+import random
+import threading
+import time
+import urllib.parse
+from typing import NamedTuple, Optional
+
+import aiohttp
+import yarl
+from multidict import CIMultiDict
+
+from . import MAX_REQUESTS, MAX_REQUESTS_PER_HOST
+from .http_cache import DEFAULT_MAX_SIZE, CacheEntry, HttpCache, cache_key, get_policy
+from .metrics import METRICS
+from .rate_limit import RateLimiter
+from .replay import LoopbackResolver, Recorder, wire_url
+from .trace import TRACER
+
+# Timeout for establishing a connection (seconds)
+CONNECT_TIMEOUT = 10
+# How long idle connections are kept alive for reuse (seconds)
+KEEPALIVE_TIMEOUT = 60
+
+
+class HttpError(IOError):
+    """Error raised for 4xx/5xx responses."""
+
+    def __init__(self, response: "HttpResponse"):
+        super().__init__(f"{response.status} Error for url: {response.url}")
+        self.response = response
+
+
+class ContentTooLarge(IOError):
+    """Error raised when a response body exceeds the size limit of the request."""
+
+    def __init__(self, url, max_size: int):
+        super().__init__(f"Response from {url} exceeds {max_size} bytes")
+        self.max_size = max_size
+
+
+class HttpResponse(NamedTuple):
+    """Response of a request, with the body fully read."""
+
+    url: str
+    status: int
+    headers: CIMultiDict
+    content: bytes = b""
+    encoding: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:  # pylint: disable=invalid-name
+        """Return True if the status code is not a 4xx/5xx error."""
+        return self.status < 400
+
+    @property
+    def text(self) -> str:
+        """Return the decoded body of the response."""
+        return self.content.decode(self.encoding or "utf8")
+
+    def json(self):
+        """Return the body of the response parsed as JSON."""
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        """Raise an `HttpError` for all 4xx/5xx responses."""
+        if not self.ok:
+            raise HttpError(self)
+
+
+class CircuitOpenError(ConnectionError):
+    """Error raised when requests to a host are suspended by its circuit breaker."""
+
+
+class RetryPolicy(NamedTuple):
+    """When and how long to wait before retrying a failed request."""
+
+    retries: int = 3
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+    statuses: frozenset = frozenset({429, 500, 502, 503, 504})
+
+    def delay(self, attempt: int) -> float:
+        """Return the delay before retry number ``attempt`` (exponential, with full jitter)."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+
+class CircuitBreaker:
+    """Suspend requests to a host after too many consecutive failures.
+
+    Once open, the breaker rejects requests until ``reset_timeout`` seconds have passed,
+    after which a single request is let through to probe whether the host is back.
+    """
+
+    def __init__(self, host, threshold=5, reset_timeout=300.0):
+        """Initialize a closed breaker."""
+        self.host = host
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self) -> bool:
+        """Return True if requests to the host are currently suspended."""
+        if self.opened_at is None:
+            return False
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # half-open: let the next request probe the host
+            self.opened_at = None
+            self.failures = self.threshold - 1
+            return False
+        return True
+
+    def check(self):
+        """Raise `CircuitOpenError` if requests to the host are suspended."""
+        if self.is_open:
+            raise CircuitOpenError(
+                f"Requests to '{self.host}' suspended after {self.failures} consecutive failures"
+            )
+
+    def record_success(self):
+        """Close the breaker."""
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        """Count a failure, opening the breaker when the threshold is reached."""
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+# errors that are worth retrying (as opposed to e.g. an invalid URL)
+RETRY_ERRORS = (
+    aiohttp.ClientConnectionError,
+    aiohttp.ClientPayloadError,
+    asyncio.TimeoutError,
+)
+
+# errors of a request that failed (including `CircuitOpenError`), to catch by callers
+# that can do without the response
+REQUEST_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, OSError)
+
+
+def _from_cache(entry: CacheEntry) -> "HttpResponse":
+    """Return the response stored in a cache entry."""
+    return HttpResponse(
+        url=entry.url,
+        status=entry.status,
+        headers=CIMultiDict(entry.headers),
+        content=entry.content,
+        encoding=entry.encoding,
+    )
+
+
+def _is_cacheable(response: "HttpResponse") -> bool:
+    return response.status in (
+        200,
+        203,
+        206,
+    ) and "no-store" not in response.headers.get("Cache-Control", "")
+
+
+async def _read_body(response: aiohttp.ClientResponse, max_size: Optional[int]):
+    """Read the body of a response, failing early if it is larger than ``max_size``."""
+    if max_size is None:
+        return await response.read()
+    if (response.content_length or 0) > max_size:
+        raise ContentTooLarge(response.url, max_size)
+    buffer = bytearray()
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        buffer += chunk
+        if len(buffer) > max_size:
+            raise ContentTooLarge(response.url, max_size)
+    return bytes(buffer)
+
+
+def _record_metrics(method, host, span, seconds):
+    """Record the metrics of a request, from the attributes of its span."""
+    cache = span.get("cache")
+    if cache is not None:
+        METRICS.inc("http_cache_requests_total", result=cache)
+    if cache == "hit":
+        # no request sent
+        return
+    if cache == "revalidated":
+        # the response served is the cached one: the server answered 304 without body
+        status, size = 304, 0
+    else:
+        status, size = span.get("status", "error"), span.get("bytes", 0)
+    METRICS.inc("http_requests_total", host=host, method=method, status=status)
+    METRICS.observe("http_request_duration_seconds", seconds, host=host)
+    METRICS.inc("http_downloaded_bytes_total", size, host=host)
+
+
+def _with_params(url, params) -> str:
+    """Return ``url`` with the query parameters ``params``."""
+    return f"{url}?{urllib.parse.urlencode(params)}" if params else url
+
+
+def _timeout(seconds: Optional[float]) -> aiohttp.ClientTimeout:
+    """Timeout for connecting and for every read (not for the whole transfer)."""
+    connect = CONNECT_TIMEOUT if seconds is None else min(seconds, CONNECT_TIMEOUT)
+    return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=seconds)
+
+
+async def _in_context(context: contextvars.Context, coro):
+    """Await ``coro`` with the context variables of the calling thread (e.g. the current plugin)."""
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+class HttpEngine:
+    """Event loop and client session shared by all requests."""
+
+    def __init__(
+        self, max_requests=MAX_REQUESTS, max_requests_per_host=MAX_REQUESTS_PER_HOST
+    ):
+        """Initialize the engine; the event loop is only started on first use."""
+        self.max_requests = max_requests
+        self.max_requests_per_host = max_requests_per_host
+        self.retry_policy = RetryPolicy()
+        self.breaker_threshold = 5
+        self.breaker_reset_timeout = 300.0
+        self._breakers = {}
+        self.rate_limiter = RateLimiter()
+        self.cache: Optional[HttpCache] = None
+        self.recorder: Optional[Recorder] = None
+        self.replay_address = None
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._session = None
+
+    def configure(self, max_requests=None, max_requests_per_host=None):
+        """Change the connection limits (applies to the next session)."""
+        if max_requests is not None:
+            self.max_requests = max_requests
+        if max_requests_per_host is not None:
+            self.max_requests_per_host = max_requests_per_host
+        if self._session is not None:
+            self.run(self._close_session())
+
+    def enable_cache(self, directory, max_size=DEFAULT_MAX_SIZE) -> HttpCache:
+        """Serve GET and HEAD requests from an on-disk cache in ``directory``."""
+        self.cache = HttpCache(directory, max_size=max_size)
+        return self.cache
+
+    def disable_cache(self):
+        """Stop using the on-disk cache."""
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def enable_recording(self, directory) -> Recorder:
+        """Record all responses in the corpus at ``directory`` (see `replay`)."""
+        self.recorder = Recorder(directory)
+        return self.recorder
+
+    def disable_recording(self):
+        """Stop recording responses."""
+        self.recorder = None
+
+    def enable_replay(self, address):
+        """Send all requests to the replay server at ``address`` (host, port)."""
+        self.replay_address = tuple(address)
+        if self._session is not None:
+            self.run(self._close_session())
+
+    def disable_replay(self):
+        """Send requests to their actual hosts again."""
+        self.replay_address = None
+        if self._session is not None:
+            self.run(self._close_session())
+
+    def _target(self, url, params=None):
+        """Return the URL and parameters to send a request to (see `enable_replay`)."""
+        if self.replay_address is None:
+            return url, params
+        url = wire_url(_with_params(url, params), self.replay_address)
+        return yarl.URL(url, encoded=True), None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Return the event loop of the engine, starting it if necessary."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="aiida-registry-http",
+                    daemon=True,
+                )
+                self._thread.start()
+        return self._loop
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the client session (must be called from the engine loop)."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_requests,
+                limit_per_host=self.max_requests_per_host,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300,
+                resolver=(
+                    LoopbackResolver(self.replay_address[0])
+                    if self.replay_address is not None
+                    else None
+                ),
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _close_session(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def breaker(self, url) -> CircuitBreaker:
+        """Return the circuit breaker for the host of ``url``."""
+        host = urllib.parse.urlparse(url).netloc
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(
+                host, self.breaker_threshold, self.breaker_reset_timeout
+            )
+        return self._breakers[host]
+
+    def reset_breakers(self):
+        """Close all circuit breakers."""
+        self._breakers = {}
+
+    async def _with_retries(self, url, send, headers=None):
+        """Await ``send()`` (returning a response), retrying on failure.
+
+        Connection errors, timeouts and 5xx responses count as failures of the host.
+        Requests are paced according to the rate limit of the host (see `rate_limit`),
+        and requests rejected because of the rate limit are retried after the reset.
+        """
+        breaker = self.breaker(url)
+        policy = self.retry_policy
+        rate_limit_key = self.rate_limiter.key(url, headers)
+        for attempt in range(policy.retries + 1):
+            breaker.check()
+            await self.rate_limiter.wait(rate_limit_key)
+            try:
+                response = await send()
+            except RETRY_ERRORS:
+                breaker.record_failure()
+                if attempt == policy.retries:
+                    raise
+            else:
+                if response.status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                retry_after = self.rate_limiter.update(
+                    rate_limit_key, response.status, response.headers
+                )
+                if attempt == policy.retries:
+                    return response
+                if retry_after is not None:
+                    # the rate limiter waits until the request is allowed again
+                    continue
+                if response.status not in policy.statuses:
+                    return response
+            await asyncio.sleep(policy.delay(attempt))
+        raise RuntimeError("unreachable")  # pragma: no cover
+
+    def _on_engine_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    async def _dispatch(self, coro):
+        """Await ``coro`` on the engine loop, also when called from another event loop."""
+        if self._on_engine_loop():
+            return await coro
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(
+                _in_context(contextvars.copy_context(), coro), self.loop
+            )
+        )
+
+    async def request(  # pylint: disable=too-many-arguments
+        self,
+        method,
+        url,
+        *,
+        params=None,
+        headers=None,
+        data=None,
+        timeout=60,
+        read=True,
+        max_size=None,
+    ) -> HttpResponse:
+        """Send a request and return the response.
+
+        :param data: the body of the request (responses to requests with a body are
+            not cached).
+        :param read: if False, only the status and headers are retrieved, not the body.
+        :param max_size: raise `ContentTooLarge` (before reading it, if the
+            ``Content-Length`` is known) if the body is larger than this number of bytes.
+        """
+        if not self._on_engine_loop():
+            return await self._dispatch(
+                self.request(
+                    method,
+                    url,
+                    params=params,
+                    headers=headers,
+                    data=data,
+                    timeout=timeout,
+                    read=read,
+                    max_size=max_size,
+                )
+            )
+
+        host = urllib.parse.urlparse(url).netloc
+        start = time.perf_counter()
+        with TRACER.span(method, "http", host=host, url=url) as span:
+            try:
+                response = await self._request(
+                    method, url, params, headers, data, timeout, read, max_size, span
+                )
+                span.update(status=response.status, bytes=len(response.content))
+                if self.recorder is not None:
+                    self.recorder.record(
+                        method, _with_params(url, params), headers, data, response, read
+                    )
+                return response
+            finally:
+                _record_metrics(method, host, span, time.perf_counter() - start)
+
+    async def _request(  # pylint: disable=too-many-arguments,too-many-locals
+        self, method, url, params, headers, data, timeout, read, max_size, span
+    ) -> HttpResponse:
+        """Send a request, or serve it from the cache (see `request`)."""
+
+        target, target_params = self._target(url, params)
+
+        async def send(request_headers):
+            async with self._get_session().request(
+                method,
+                target,
+                params=target_params,
+                headers=request_headers,
+                data=data,
+                timeout=_timeout(timeout),
+            ) as response:
+                content = await _read_body(response, max_size) if read else b""
+                return HttpResponse(
+                    url=(
+                        str(response.url)
+                        if self.replay_address is None
+                        else _with_params(url, params)
+                    ),
+                    status=response.status,
+                    headers=CIMultiDict(response.headers),
+                    content=content,
+                    encoding=response.charset,
+                )
+
+        if self.cache is None or method not in ("GET", "HEAD") or data is not None:
+            return await self._with_retries(url, lambda: send(headers), headers)
+
+        cache = self.cache
+        url_with_params = _with_params(url, params)
+        key = cache_key(method, url_with_params, read, headers)
+        policy = get_policy(url_with_params, read)
+        entry = cache.get(key)
+        if entry is not None and entry.is_fresh:
+            cache.stats.hits += 1
+            cache.stats.bytes_saved += len(entry.content)
+            span["cache"] = "hit"
+            return _from_cache(entry)
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            request_headers.update(entry.validators())
+        response = await self._with_retries(
+            url, lambda: send(request_headers), request_headers
+        )
+        if response.status == 304 and entry is not None:
+            cache.refresh(key, policy)
+            cache.stats.revalidated += 1
+            cache.stats.bytes_saved += len(entry.content)
+            span["cache"] = "revalidated"
+            return _from_cache(entry)
+
+        cache.stats.misses += 1
+        span["cache"] = "miss"
+        if _is_cacheable(response):
+            cache.put(
+                key,
+                policy,
+                response.url,
+                response.status,
+                response.headers.items(),
+                response.content,
+                response.encoding,
+            )
+        return response
+
+    def run(self, coro):
+        """Run a coroutine on the engine loop and wait for its result."""
+        if self._on_engine_loop():
+            raise RuntimeError("Cannot block the HTTP engine loop, use `await` instead")
+        return asyncio.run_coroutine_threadsafe(
+            _in_context(contextvars.copy_context(), coro), self.loop
+        ).result()
+
+    def close(self):
+        """Close the session and stop the event loop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._close_session(), loop).result()
+        self.disable_cache()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+
+HTTP_ENGINE = HttpEngine()
+atexit.register(HTTP_ENGINE.close)
+
+
+async def get(url, **kwargs) -> HttpResponse:
+    """Send a GET request using the shared engine."""
+    return await HTTP_ENGINE.request("GET", url, **kwargs)
+
+
+async def post(url, **kwargs) -> HttpResponse:
+    """Send a POST request using the shared engine."""
+    return await HTTP_ENGINE.request("POST", url, **kwargs)
+
+
+def run(coro):
+    """Run a coroutine on the shared engine and wait for its result."""
+    return HTTP_ENGINE.run(coro)
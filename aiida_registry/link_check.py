@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Check that the URLs of the registry can be reached.
+
+All URLs of the plugins are gathered, deduplicated and checked concurrently, before
+the plugins are processed. A link is checked with a ``HEAD`` request, falling back to
+a ``GET`` of the first byte for servers that do not support ``HEAD``, so that no page
+is downloaded. When the HTTP cache is enabled, the results are cached for a week
+(see `http_cache.LIVENESS_POLICY`).
+"""
+
+import asyncio
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from . import http_client
+
+# Fields of plugins.yaml holding URLs, whose checks are used when fetching the plugins
+# (code_home: hosting service, documentation_url: W008, plugin_info: build file)
+LINK_FIELDS = ("code_home", "documentation_url", "plugin_info")
+
+# Statuses of servers that do not support HEAD requests (properly)
+HEAD_NOT_SUPPORTED = (403, 404, 405, 501)
+
+
+class LinkStatus(NamedTuple):
+    """Result of checking a link."""
+
+    url: str
+    status: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:  # pylint: disable=invalid-name
+        """Return True if the link can be reached."""
+        return self.status is not None and self.status < 400
+
+
+def is_url(value) -> bool:
+    """Check if the value is an HTTP(S) URL."""
+    return isinstance(value, str) and value.startswith(("http://", "https://"))
+
+
+def collect_links(plugins: Iterable[dict]) -> List[str]:
+    """Return the unique URLs of plugins (entries of plugins.yaml), in order."""
+    links = {}
+    for plugin_data in plugins:
+        for field in LINK_FIELDS:
+            if is_url(plugin_data.get(field)):
+                links[plugin_data[field]] = None
+    return list(links)
+
+
+async def check_link_async(url: str, timeout=30) -> LinkStatus:
+    """Check that a URL can be reached, without downloading its content."""
+    try:
+        response = await http_client.HTTP_ENGINE.request(
+            "HEAD", url, timeout=timeout, read=False
+        )
+        if response.status in HEAD_NOT_SUPPORTED:
+            response = await http_client.get(
+                url, headers={"Range": "bytes=0-0"}, timeout=timeout, read=False
+            )
+    except Exception as exc:  # pylint: disable=broad-except
+        return LinkStatus(url, error=f"{type(exc).__name__}: {exc}")
+    return LinkStatus(url, status=response.status)
+
+
+def check_link(url: str) -> LinkStatus:
+    """Check that a URL can be reached, without downloading its content."""
+    return http_client.run(check_link_async(url))
+
+
+async def check_links_async(urls: Iterable[str]) -> Dict[str, LinkStatus]:
+    """Check URLs concurrently."""
+    urls = list(dict.fromkeys(urls))
+    results = await asyncio.gather(*(check_link_async(url) for url in urls))
+    return dict(zip(urls, results))
+
+
+def check_links(urls: Iterable[str]) -> Dict[str, LinkStatus]:
+    """Check URLs concurrently."""
+    return http_client.run(check_links_async(urls))
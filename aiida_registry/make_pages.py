@@ -3,17 +3,24 @@
 
 Reads plugin-metadata.json produced by fetch_metadata.
 """
-# pylint: disable=missing-function-docstring,invalid-name,global-statement,consider-using-f-string
+# pylint: disable=missing-function-docstring,invalid-name,consider-using-f-string
 
 import copy
 import json
-from collections import defaultdict
 
+from aiida_registry.compatibility import (
+    AIIDA_CORE_PACKAGE,
+    get_release_versions,
+    make_matrix,
+)
 from aiida_registry.fetch_metadata import fetch_metadata
+from aiida_registry.parse_pypi import get_pypi_json
+from aiida_registry.shards import write_shards
 
 from . import (
     OTHERCOLORCLASS,
     PLUGINS_METADATA,
+    REPORTER,
     entrypoint_metainfo,
     entrypointtypes,
     main_entrypoints,
@@ -21,16 +28,77 @@ from . import (
     status_no_pip_url_required,
 )
 
-entrypoints_count = defaultdict(list)
-other_entrypoint_names = set()
+
+class SummaryAccumulator:
+    """Counts of the entry points of plugins, by entry point type, for the global summary.
+
+    Partial summaries (e.g. of single plugins, computed concurrently) are merged with
+    ``+``, which is associative and commutative: the global summary does not depend on
+    how the plugins are split or in which order the partial summaries are merged.
+    """
+
+    def __init__(self):
+        # number of plugins with entry points of each type, and of entry points
+        self.entrypoints_count = {}
+        self.other_entrypoint_names = set()
+
+    def add(self, entrypoint_name, num):
+        """Count the ``num`` entry points of type ``entrypoint_name`` of a plugin."""
+        plugins, total = self.entrypoints_count.get(entrypoint_name, (0, 0))
+        self.entrypoints_count[entrypoint_name] = (plugins + 1, total + num)
+
+    def __add__(self, other):
+        merged = SummaryAccumulator()
+        for entrypoint_name in {*self.entrypoints_count, *other.entrypoints_count}:
+            plugins, total = self.entrypoints_count.get(entrypoint_name, (0, 0))
+            other_plugins, other_total = other.entrypoints_count.get(
+                entrypoint_name, (0, 0)
+            )
+            merged.entrypoints_count[entrypoint_name] = (
+                plugins + other_plugins,
+                total + other_total,
+            )
+        merged.other_entrypoint_names = (
+            self.other_entrypoint_names | other.other_entrypoint_names
+        )
+        return merged
+
+    def global_summary(self):
+        """Compute summary of plugin registry."""
+        summary = []
+        for entrypoint_name in main_entrypoints:
+            num_entries, total_num = self.entrypoints_count.get(entrypoint_name, (0, 0))
+            summary.append(
+                {
+                    "name": entrypoint_metainfo[entrypoint_name]["shortname"],
+                    "colorclass": entrypoint_metainfo[entrypoint_name]["colorclass"],
+                    "num_entries": num_entries,
+                    "total_num": total_num,
+                }
+            )
+
+        num_entries, total_num = self.entrypoints_count.get("other", (0, 0))
+        summary.append(
+            {
+                "name": "Other",
+                "tooltip": format_entry_points_list(self.other_entrypoint_names),
+                "colorclass": OTHERCOLORCLASS,
+                "num_entries": num_entries,
+                "total_num": total_num,
+            }
+        )
+
+        return summary
 
 
 def get_summary_info(entry_points):
     """Get info for plugin detail page.
 
-    Note: this updates the global variables entrypoints_count and other_entrypoint_names.
+    :return: the summary info, and the partial summary of the plugin (see
+        `SummaryAccumulator`).
     """
     summary_info = []
+    partial = SummaryAccumulator()
     ep = (entry_points or {}).copy()
 
     # Collect "main" entry points first
@@ -47,7 +115,7 @@ def get_summary_info(entry_points):
                         "count": num,
                     }
                 )
-                entrypoints_count[entrypoint_name].append(num)
+                partial.add(entrypoint_name, num)
         except KeyError:
             # No specific entrypoints, pass
             pass
@@ -77,10 +145,10 @@ def get_summary_info(entry_points):
                 "count": total_count,
             }
         )
-        entrypoints_count["other"].append(total_count)
-        other_entrypoint_names.update(other_elements)
+        partial.add("other", total_count)
+        partial.other_entrypoint_names.update(other_elements)
 
-    return summary_info
+    return summary_info, partial
 
 
 def format_entry_points_list(ep_list):
@@ -93,32 +161,6 @@ def format_entry_points_list(ep_list):
     return ", ".join(tmp)
 
 
-def global_summary():
-    """Compute summary of plugin registry."""
-    summary = []
-    for entrypoint_name in main_entrypoints:
-        summary.append(
-            {
-                "name": entrypoint_metainfo[entrypoint_name]["shortname"],
-                "colorclass": entrypoint_metainfo[entrypoint_name]["colorclass"],
-                "num_entries": len(entrypoints_count[entrypoint_name]),
-                "total_num": sum(entrypoints_count[entrypoint_name]),
-            }
-        )
-
-    summary.append(
-        {
-            "name": "Other",
-            "tooltip": format_entry_points_list(other_entrypoint_names),
-            "colorclass": OTHERCOLORCLASS,
-            "num_entries": len(entrypoints_count["other"]),
-            "total_num": sum(entrypoints_count["other"]),
-        }
-    )
-
-    return summary
-
-
 def get_pip_install_cmd(plugin_data):
     if "pip_url" not in plugin_data:
         if plugin_data["development_status"] in status_no_pip_url_required:
@@ -141,26 +183,51 @@ def get_pip_install_cmd(plugin_data):
         return "pip install {}".format(pip_url)
 
 
-def make_pages(package=None):
+def make_pages(
+    package=None, jobs=1, previous_file=None, shard_dir=None, output=PLUGINS_METADATA
+):
     """
     Add additional information to the JSON data like plugins summary,
     global summary, pip install command, and static data.
+
+    :param previous_file: JSON file of a previous run, to only fetch changed plugins.
+    :param shard_dir: also write the sharded output to this directory (see `shards`).
+    :param output: path of the JSON file written.
     """
-    plugins_metadata = fetch_metadata(filter_list=list(package))
+    previous = None
+    if previous_file:
+        with open(previous_file, "r", encoding="utf8") as handle:
+            previous = json.load(handle)["plugins"]
+
+    plugins_metadata, entry_point_index = fetch_metadata(
+        filter_list=list(package or []), jobs=jobs, previous=previous
+    )
 
+    summary = SummaryAccumulator()
     for plugin_name, plugin_data in plugins_metadata.items():
-        print("  - {}".format(plugin_name))
+        REPORTER.info(f"  - {plugin_name}")
 
-        plugin_data["summaryinfo"] = get_summary_info(plugin_data["entry_points"])
+        plugin_data["summaryinfo"], partial = get_summary_info(
+            plugin_data["entry_points"]
+        )
+        summary += partial
         plugin_data["pip_install_cmd"] = get_pip_install_cmd(plugin_data)
 
     all_data = {}
     all_data["plugins"] = plugins_metadata
-    all_data["globalsummary"] = global_summary()
+    all_data["globalsummary"] = summary.global_summary()
     all_data["status_dict"] = status_dict
     all_data["entrypointtypes"] = (
         entrypointtypes  # add a static entrypointtypes dictionary
     )
+    # plugins registering each entry point
+    all_data["entry_point_index"] = entry_point_index
+    # plugins compatible with each release of aiida-core
+    all_data["aiida_compatibility"] = make_matrix(
+        plugins_metadata, get_release_versions(get_pypi_json(AIIDA_CORE_PACKAGE))
+    )
 
-    with open(PLUGINS_METADATA, "w", encoding="utf8") as handle:
+    with open(output, "w", encoding="utf8") as handle:
         json.dump(all_data, handle, indent=2)
+    if shard_dir:
+        write_shards(all_data, shard_dir)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Aggregate metrics of a run, exported as a Prometheus/OpenMetrics textfile.
+
+The file is meant for the textfile collector of the Prometheus node exporter
+(https://github.com/prometheus/node_exporter#textfile-collector), so that the
+nightly runs can be monitored. It is written atomically at the end of a run,
+in the Prometheus text format (version 0.0.4) which the collector parses.
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+from . import REPORTER
+
+PREFIX = "aiida_registry_"
+
+# Type and description of the metrics (without PREFIX)
+DEFINITIONS = {
+    "http_requests_total": (
+        "counter",
+        "HTTP requests sent, by host, method and status ('error' if no response).",
+    ),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Duration of the HTTP requests sent, by host (including retries).",
+    ),
+    "http_downloaded_bytes_total": (
+        "counter",
+        "Size of the bodies of the HTTP responses received, by host.",
+    ),
+    "http_cache_requests_total": (
+        "counter",
+        "Requests looked up in the HTTP cache, by result (hit, revalidated, miss).",
+    ),
+    "http_cache_hit_ratio": (
+        "gauge",
+        "Fraction of the requests looked up in the HTTP cache that were served from it.",
+    ),
+    "wheels_parsed_total": ("counter", "Wheels read from PyPI."),
+    "build_file_memo_requests_total": (
+        "counter",
+        "Build files looked up in the memo of parse results, by result (hit, miss).",
+    ),
+    "git_operations_total": (
+        "counter",
+        "Clones and fetches of the mirrors of repositories, by operation.",
+    ),
+    "docker_container_seconds": (
+        "gauge",
+        "Lifetime of the container testing the installation of a plugin, by plugin.",
+    ),
+    "checks_total": ("counter", "Warnings and errors reported, by check id and level."),
+    "run_duration_seconds": ("gauge", "Duration of the last run, by command."),
+    "run_timestamp_seconds": ("gauge", "End time of the last run, by command."),
+}
+
+# Upper bounds of the buckets of the histograms (seconds)
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Counters, gauges and histograms with labels."""
+
+    def __init__(self):
+        """Initialize without any sample."""
+        self._lock = threading.Lock()
+        self._samples: Dict[str, dict] = {}
+
+    def reset(self):
+        """Discard all samples."""
+        with self._lock:
+            self._samples = {}
+
+    def _series(self, name, labels):
+        if name not in DEFINITIONS:
+            raise KeyError(f"Unknown metric '{name}'")
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        return self._samples.setdefault(name, {}), key
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter."""
+        with self._lock:
+            series, key = self._series(name, labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set the value of a gauge."""
+        with self._lock:
+            series, key = self._series(name, labels)
+            series[key] = value
+
+    def observe(self, name, value, **labels):
+        """Add an observation to a histogram."""
+        with self._lock:
+            series, key = self._series(name, labels)
+            # counts of the buckets, sum and count of the observations
+            histogram = series.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+            for index, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def value(self, name, **labels):
+        """Return the value of a counter or gauge (0 if not recorded)."""
+        with self._lock:
+            series, key = self._series(name, labels)
+            return series.get(key, 0)
+
+    def total(self, name) -> float:
+        """Return the sum of a counter over all labels."""
+        with self._lock:
+            return sum(self._samples.get(name, {}).values())
+
+    def render(self) -> str:
+        """Return the samples in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._samples.items()):
+                kind, description = DEFINITIONS[name]
+                full_name = PREFIX + name
+                lines.append(f"# HELP {full_name} {description}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for key, sample in sorted(series.items()):
+                    if kind != "histogram":
+                        lines.append(
+                            f"{full_name}{_format_labels(key)} {_format_value(sample)}"
+                        )
+                        continue
+                    buckets, total, count = sample
+                    for bound, bucket_count in zip(BUCKETS, buckets):
+                        labels = _format_labels(key + (("le", _format_value(bound)),))
+                        lines.append(f"{full_name}_bucket{labels} {bucket_count}")
+                    labels = _format_labels(key)
+                    lines.append(f"{full_name}_sum{labels} {_format_value(total)}")
+                    lines.append(f"{full_name}_count{labels} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the samples to ``path``.
+
+        The file is replaced atomically, so that it is never scraped half-written.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as handle:
+            handle.write(self.render())
+        os.replace(tmp_path, path)
+
+
+METRICS = Metrics()
+
+
+def record_run(command: str, duration: float):
+    """Record the duration of a run, and the ratios and checks of the whole run."""
+    METRICS.set("run_duration_seconds", duration, command=command)
+    METRICS.set("run_timestamp_seconds", time.time(), command=command)
+    cached = METRICS.total("http_cache_requests_total")
+    if cached:
+        hits = METRICS.value("http_cache_requests_total", result="hit") + METRICS.value(
+            "http_cache_requests_total", result="revalidated"
+        )
+        METRICS.set("http_cache_hit_ratio", hits / cached)
+    for (level, check_id), count in REPORTER.check_counts.items():
+        METRICS.set("checks_total", count, check_id=check_id, level=level)
@@ -1,17 +1,37 @@
 # -*- coding: utf-8 -*-
-"""Module for parsing package build files."""
+"""Module for parsing package build files.
+
+TOML files are parsed once, with the fast read-only `tomllib` parser, and the parsed
+document is passed to the parser of the build tool (see `load_build_file`).
+The style-preserving ``tomlkit`` parser is only used to describe parsing errors.
+
+The results are memoized across runs by the content of the build file (see
+`parse_memo` and `parse_build_file`).
+"""
 
 import ast
+import hashlib
 import json
+import sys
 from configparser import ConfigParser
-from typing import Callable, List, NamedTuple, Optional
+from typing import Callable, List, NamedTuple, Optional, Tuple, Union
 
 import requirements
-import tomlkit
 from poetry.core.semver import parse_constraint
-from tomlkit.toml_document import TOMLDocument
 
-from . import PLUGINS_METADATA_KEYS, REPORTER
+from . import PLUGINS_METADATA_KEYS, REPORTER, parse_memo
+from .metrics import METRICS
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+# Version of the parsers, part of the key of the memoized results (see `parse_memo`):
+# increment it when a change of the parsers changes their results or warnings
+PARSER_VERSION = 2
+# Kinds of build files, identified by their URL
+BUILD_FILE_KINDS = ("pyproject.toml", "setup.cfg", "setup.json")
 
 
 class SourceData(NamedTuple):
@@ -30,50 +50,105 @@ class SourceData(NamedTuple):
         }
 
 
-def identify_build_tool(url: str, content: str) -> Optional[str]:
-    """Identify the build tool, from the URL and content.
+def load_build_file(url: str, content: str) -> Tuple[Optional[str], Union[str, dict]]:
+    """Identify the build tool, from the URL and content, and parse TOML files.
 
     - pyproject.toml (for poetry/flit and any PEP 621 compliant build tool)
     - setup.cfg (for setuptools)
     - setup.json (for setuptools)
 
+    :return: the name of the build tool (None if unknown), and the input of its parser
+        (see `get_data_parser`): the parsed document for pyproject.toml files, and
+        else the content.
     """
     # pylint: disable=too-many-return-statements
     if "pyproject.toml" in url:
         try:
             pyproject = parse_toml(content)
-        except tomlkit.exceptions.TOMLKitError:
-            return None
+        except tomllib.TOMLDecodeError:
+            return None, content
 
         if "project" in pyproject:
-            return "PEP621"
+            return "PEP621", pyproject
 
         tool_name = pyproject.get("tool", "")
         if "poetry" in tool_name:
-            return "POETRY"
+            return "POETRY", pyproject
         if "flit" in tool_name:
-            return "FLIT_OLD"
+            return "FLIT_OLD", pyproject
 
         REPORTER.warn(
             f"Unknown build system in pyproject.toml: {tool_name}",
             check_id="W012",
         )
-        return None
+        return None, pyproject
 
     if "setup.cfg" in url:
-        return "SETUPTOOLS_CFG"
+        return "SETUPTOOLS_CFG", content
 
     if "setup.json" in url:
-        return "SETUPTOOLS_JSON"
+        return "SETUPTOOLS_JSON", content
 
     REPORTER.warn(
         f"Unknown build tool: {url}",
         check_id="W013",
     )
-    return None
+    return None, content
+
+
+def identify_build_tool(url: str, content: str) -> Optional[str]:
+    """Identify the build tool, from the URL and content (see `load_build_file`)."""
+    return load_build_file(url, content)[0]
+
+
+def parse_build_file(
+    url: str, content: str, ep_only=False
+) -> Tuple[Optional[str], SourceData]:
+    """Identify the build tool and parse the build file (see `load_build_file`).
+
+    If a memo is in use, the result is looked up by the content of the file, and the
+    warnings reported when the file was parsed are reported again.
+
+    :return: the name of the build tool (None if unknown), and the data read from the
+        file (empty if the build tool is unknown).
+    """
+    memo = parse_memo.get_memo()
+    kind = next((kind for kind in BUILD_FILE_KINDS if kind in url), url)
+    key = (
+        kind,
+        int(ep_only),
+        hashlib.sha256(content.encode("utf8")).hexdigest(),
+        PARSER_VERSION,
+    )
+    if memo is not None:
+        result = memo.get(key)
+        METRICS.inc(
+            "build_file_memo_requests_total", result="miss" if result is None else "hit"
+        )
+        if result is not None:
+            for level, message, check_id in result["messages"]:
+                REPORTER.report(level, message, check_id)
+            return result["build_tool"], SourceData(**result["data"])
+
+    with REPORTER.capture() as messages:
+        build_tool, data = load_build_file(url, content)
+        if build_tool is None:
+            source_data = SourceData()
+        else:
+            source_data = get_data_parser(build_tool)(data, ep_only=ep_only)
+    if memo is not None:
+        memo.put(
+            key,
+            {
+                "build_tool": build_tool,
+                "data": source_data.as_dict(),
+                "messages": messages,
+            },
+        )
+    return build_tool, source_data
 
 
-def get_data_parser(name: str) -> Callable[[str, bool], SourceData]:
+def get_data_parser(name: str) -> Callable[[Union[str, dict], bool], SourceData]:
     """Return the function that parses the build file."""
     return {
         "PEP621": parse_pep_621,
@@ -84,23 +159,40 @@ def get_data_parser(name: str) -> Callable[[str, bool], SourceData]:
     }[name]
 
 
-def parse_toml(content: str) -> Optional[TOMLDocument]:
-    """Parse a TOML file."""
+def parse_toml(content: Union[str, dict]) -> dict:
+    """Parse a TOML file (an already parsed document is returned as is)."""
+    if isinstance(content, dict):
+        return content
     try:
-        return tomlkit.parse(content)
-    except tomlkit.exceptions.TOMLKitError as exc:
+        return tomllib.loads(content)
+    except tomllib.TOMLDecodeError as exc:
         REPORTER.warn(
-            f"Unable to parse TOML: {exc}",
+            f"Unable to parse TOML: {describe_toml_error(content, exc)}",
             check_id="W011",
         )
         raise exc
 
 
-def parse_pep_621(content: str, ep_only=False) -> SourceData:
-    """Parse a https://www.python.org/dev/peps/pep-0621/ compliant pyproject.toml file."""
+def describe_toml_error(content: str, exc: Exception) -> str:
+    """Return a description of the error in a TOML file that `tomllib` failed to parse.
+
+    The messages of ``tomlkit`` show the offending line, so they are used if possible.
+    """
+    import tomlkit  # pylint: disable=import-outside-toplevel
+
+    try:
+        tomlkit.parse(content)
+    except tomlkit.exceptions.TOMLKitError as tomlkit_exc:
+        return str(tomlkit_exc)
+    return str(exc)
+
+
+def parse_pep_621(content: Union[str, dict], ep_only=False) -> SourceData:
+    """Parse a https://www.python.org/dev/peps/pep-0621/ compliant pyproject.toml file.
+
+    :param content: the content of the file, or the parsed document.
+    """
     data = parse_toml(content)
-    if data is None:
-        return SourceData()
 
     project_data = data.get("project", {})
 
@@ -157,11 +249,12 @@ def parse_setup_json(content: str, ep_only=False) -> SourceData:
     return SourceData(**infos)
 
 
-def parse_poetry(content: str, ep_only=False) -> SourceData:
-    """Parse poetry pyproject.toml."""
+def parse_poetry(content: Union[str, dict], ep_only=False) -> SourceData:
+    """Parse poetry pyproject.toml.
+
+    :param content: the content of the file, or the parsed document.
+    """
     data = parse_toml(content)
-    if data is None:
-        return SourceData()
 
     entry_points = data["tool"]["poetry"].get("plugins", {}).copy()
 
@@ -187,13 +280,14 @@ def parse_poetry(content: str, ep_only=False) -> SourceData:
     return SourceData(**infos)
 
 
-def parse_flit_old(content: str, ep_only=False) -> SourceData:
-    """Parse flit pyproject.toml with old-style metadata."""
+def parse_flit_old(content: Union[str, dict], ep_only=False) -> SourceData:
+    """Parse flit pyproject.toml with old-style metadata.
+
+    :param content: the content of the file, or the parsed document.
+    """
     # uses https://flit.readthedocs.io/en/latest/pyproject_toml.html#old-style-metadata
 
     data = parse_toml(content)
-    if data is None:
-        return SourceData()
 
     entry_points = data["tool"]["flit"].get("entrypoints", {}).copy()
 
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Persistent memo of the results of parsing build files, keyed by their content.
+
+Most build files (setup.json, setup.cfg, pyproject.toml) do not change between runs:
+a build file is only parsed again if its content (or the parsers) changed, and later
+runs look the result up by the sha256 of the content. The warnings reported when
+parsing the file are stored with the result, to be reported again (see
+`parse_build_file.parse_build_file`).
+"""
+
+from typing import Optional
+
+from .sqlite_store import SqliteStore
+
+MEMO_FILENAME = "parse_memo.sqlite"
+
+
+class ParseMemo(SqliteStore):
+    """Memo of build-file parse results in a sqlite database.
+
+    Results are keyed by the kind of build file, whether only the entry points were
+    parsed, the sha256 of the content and the version of the parsers.
+    """
+
+    FILENAME = MEMO_FILENAME
+    TABLE = "parses"
+    KEY = (
+        ("kind", "TEXT"),
+        ("ep_only", "INTEGER"),
+        ("sha256", "TEXT"),
+        ("version", "INTEGER"),
+    )
+
+
+_MEMO: Optional[ParseMemo] = None
+
+
+def enable_memo(directory) -> ParseMemo:
+    """Use the memo in ``directory`` when parsing build files."""
+    global _MEMO  # pylint: disable=global-statement
+    disable_memo()
+    _MEMO = ParseMemo(directory)
+    return _MEMO
+
+
+def disable_memo():
+    """Stop using the memo."""
+    global _MEMO  # pylint: disable=global-statement
+    if _MEMO is not None:
+        _MEMO.close()
+        _MEMO = None
+
+
+def get_memo() -> Optional[ParseMemo]:
+    """Return the memo in use, if any."""
+    return _MEMO
@@ -3,18 +3,20 @@
 
 # pylint: disable=too-many-ancestors,too-many-locals,too-many-branches
 import configparser
+import hashlib
 import json
-import tempfile
-import zipfile
 from datetime import datetime
-from pathlib import Path
-from typing import NamedTuple, Optional
+from email.message import Message
+from email.parser import Parser
+from typing import NamedTuple, Optional, Tuple
 
-import requests
 from poetry.core.version.requirements import Requirement
 
-from . import REPORTER
-from .utils import fetch_file
+from . import REPORTER, http_client, wheel_store
+from .metrics import METRICS
+from .remote_zip import read_zip_members_async
+from .trace import TRACER
+from .utils import fetch_file_async
 
 
 class PypiData(NamedTuple):
@@ -23,6 +25,8 @@ class PypiData(NamedTuple):
     metadata: dict
     aiida_version: Optional[str] = None
     entry_points: Optional[dict] = None
+    # False if the wheel or its core metadata could not be read (e.g. a network error)
+    complete: bool = True
 
 
 class CaseSensitiveConfigParser(configparser.ConfigParser):
@@ -31,18 +35,97 @@ class CaseSensitiveConfigParser(configparser.ConfigParser):
     optionxform = staticmethod(str)
 
 
-def get_pypi_metadata(package_name: str, parse_wheel=True) -> Optional[PypiData]:
+async def get_pypi_json_async(package_name: str) -> Optional[dict]:
+    """Get the JSON data of the project from PyPI."""
+    pypi_info = await fetch_file_async(f"https://pypi.org/pypi/{package_name}/json")
+    if pypi_info is None:
+        return None
+    return json.loads(pypi_info)
+
+
+def get_pypi_json(package_name: str) -> Optional[dict]:
+    """Get the JSON data of the project from PyPI."""
+    return http_client.run(get_pypi_json_async(package_name))
+
+
+def get_latest_release(pypi_data: dict) -> str:
+    """Return the version and upload time of the latest release in the PyPI JSON data."""
+    version = pypi_data["info"]["version"]
+    upload_times = [data["upload_time"] for data in pypi_data["releases"][version]]
+    return f"{version} {max(upload_times, default='')}"
+
+
+def has_wheel(pypi_data: dict) -> bool:
+    """Return True if the latest release in the PyPI JSON data provides a wheel."""
+    return get_wheel_data(pypi_data) is not None
+
+
+def get_wheel_data(pypi_data: dict) -> Optional[dict]:
+    """Return the ``urls`` entry of the wheel of the latest release, if any."""
+    for data in pypi_data.get("urls", []):
+        if data.get("packagetype") == "bdist_wheel":
+            return data
+    return None
+
+
+async def get_core_metadata_async(
+    wheel_data: dict,
+) -> Tuple[Optional[Message], bool]:
+    """Get the core metadata of a wheel from the file PyPI serves next to it.
+
+    See PEP 658 and PEP 714: the ``METADATA`` file of the wheel is available at
+    ``<wheel-url>.metadata``. The file is advertised by the ``core-metadata`` key
+    (``data-dist-info-metadata`` before PEP 714), which is not part of the project JSON
+    of the legacy API; if it is missing, the file is requested anyway.
+
+    :return: the parsed metadata (None if it is not available), and whether the
+        request failed (so that the metadata may be available next time).
+    """
+    advertised = None
+    for key in ("core-metadata", "data-dist-info-metadata", "dist_info_metadata"):
+        if key in wheel_data:
+            advertised = wheel_data[key]
+            break
+    if advertised is False:
+        return None, False
+
+    try:
+        response = await http_client.get(f"{wheel_data['url']}.metadata", timeout=60)
+    except http_client.REQUEST_ERRORS:
+        return None, True
+    if not response.ok:
+        return None, response.status >= 500
+    expected = advertised.get("sha256") if isinstance(advertised, dict) else None
+    if expected and hashlib.sha256(response.content).hexdigest() != expected:
+        return None, False
+    return Parser().parsestr(response.content.decode("utf-8", errors="replace")), False
+
+
+def get_pypi_metadata(
+    package_name: str, parse_wheel=True, pypi_data: Optional[dict] = None
+) -> Optional[PypiData]:
     """Get metadata from PyPI."""
+    return http_client.run(
+        get_pypi_metadata_async(package_name, parse_wheel, pypi_data=pypi_data)
+    )
+
+
+async def get_pypi_metadata_async(
+    package_name: str, parse_wheel=True, pypi_data: Optional[dict] = None
+) -> Optional[PypiData]:
+    """Get metadata from PyPI.
+
+    :param pypi_data: the JSON data of the project, if already retrieved from PyPI.
+    """
     metadata = {}
     aiida_version = None
     entry_points = None
 
-    pypi_info = fetch_file(f"https://pypi.org/pypi/{package_name}/json")
-    if pypi_info is None:
+    if pypi_data is None:
+        pypi_data = await get_pypi_json_async(package_name)
+    if pypi_data is None:
         return None
 
-    pypi_data = json.loads(pypi_info)
-
     # get data from pypi JSON
     pypi_info_data = pypi_data.get("info", {})
 
@@ -67,11 +150,32 @@ def get_pypi_metadata(package_name: str, parse_wheel=True) -> Optional[PypiData]
         if pypi_info_data.get(key_from):
             metadata[key_to] = pypi_info_data[key_from]
 
+    wheel_data = get_wheel_data(pypi_data)
+    if wheel_data is None:
+        REPORTER.warn(
+            "No <code>bdist_wheel</code> available for PyPI release.",
+            check_id="W019",
+        )
+
+    # prefer the core metadata of the wheel over the (possibly incomplete) project JSON
+    requires_dist = pypi_info_data.get("requires_dist")
+    wheel_info = wheel_data and await get_wheel_info_async(wheel_data, parse_wheel)
+    complete = True
+    if wheel_info:
+        complete = wheel_info.get("complete", True)
+        if wheel_info["classifiers"]:
+            metadata["classifiers"] = wheel_info["classifiers"]
+        if wheel_info["version"]:
+            metadata["version"] = wheel_info["version"]
+        requires_dist = wheel_info["requires_dist"] or requires_dist
+        if parse_wheel:
+            entry_points = wheel_info["entry_points"]
+
     # find aiida-version
     # note if a bdist_wheel is not available,
     # then requires_dist will likely not be available
-    if pypi_info_data.get("requires_dist"):
-        for req in pypi_info_data["requires_dist"]:
+    if requires_dist:
+        for req in requires_dist:
             try:
                 parsed = Requirement(req)
             except Exception:  # pylint: disable=broad-except
@@ -79,49 +183,132 @@ def get_pypi_metadata(package_name: str, parse_wheel=True) -> Optional[PypiData]
             if parsed.name in ["aiida-core", "aiida_core", "aiida"]:
                 aiida_version = str(parsed.constraint)
 
-    build_types = {}
-    for data in pypi_data.get("urls"):
-        if data.get("packagetype"):
-            build_types[data.get("packagetype")] = data.get("url")
-    if "bdist_wheel" not in build_types:
-        REPORTER.warn(
-            "No <code>bdist_wheel</code> available for PyPI release.",
-            check_id="W019",
-        )
+    return PypiData(
+        metadata,
+        aiida_version=aiida_version,
+        entry_points=entry_points,
+        complete=complete,
+    )
 
-    # We cannot read 'entry_points' from PyPI JSON so must download the wheel file
-    if not build_types.get("bdist_wheel") or not parse_wheel:
-        return PypiData(metadata, aiida_version=aiida_version)
 
-    try:
-        with requests.get(
-            build_types["bdist_wheel"], stream=True, timeout=120
-        ) as download:
-            download.raise_for_status()
-            with tempfile.TemporaryDirectory() as tmpdirname:
-                with Path(tmpdirname, "wheel.whl").open("wb") as handle:
-                    for chunk in download.iter_content(chunk_size=8192):
-                        handle.write(chunk)
-                with zipfile.ZipFile(Path(tmpdirname, "wheel.whl")) as whl:
-                    # see https://packaging.python.org/en/latest/specifications/entry-points/#file-format
-                    entry_points_content = None
-                    for name in whl.namelist():
-                        if name.endswith(".dist-info/entry_points.txt"):
-                            entry_points_content = whl.read(name).decode("utf-8")
-                    if entry_points_content is None:
-                        raise IOError("No entry_points.txt found in wheel")
-                    parser = CaseSensitiveConfigParser()
-                    parser.read_string(entry_points_content)
-                    entry_points = {}
-                    for key, value in parser.items():
-                        if key == "DEFAULT":
-                            continue
-                        entry_points[key] = dict(value.items())
-
-    except Exception as err:  # pylint: disable=broad-except
-        REPORTER.warn(
-            f"Unable to read wheel file from PyPI release: <pre>{err}</pre>",
-            check_id="W020",
+async def get_wheel_info_async(wheel_data: dict, parse_wheel=True) -> dict:
+    """Get the entry points and core metadata fields of a wheel.
+
+    The data is looked up in the wheel store (see `wheel_store`) by the sha256 of the
+    wheel, and only read from PyPI if it is not stored yet. The core metadata is
+    taken from the standalone metadata file if available, and else from the wheel.
+
+    :param parse_wheel: read the entry points from the wheel if they are not stored
+        (they are neither in the PyPI JSON nor in the core metadata).
+    :return: dict with ``entry_points``, ``version``, ``classifiers``,
+        ``requires_dist`` and ``complete``; the entry points are None if they could not
+        be read, and ``complete`` is False if the wheel or its core metadata could not
+        be read (such data is not stored).
+    """
+    store = wheel_store.get_store()
+    sha256 = wheel_data.get("digests", {}).get("sha256")
+    if store is not None and sha256:
+        wheel_info = store.get(sha256)
+        if wheel_info is not None:
+            return wheel_info
+
+    with TRACER.span("read_wheel", url=wheel_data["url"]):
+        wheel_info = await _read_wheel_info_async(wheel_data, parse_wheel)
+    if (
+        store is not None
+        and sha256
+        and wheel_info["entry_points"] is not None
+        and wheel_info["complete"]
+    ):
+        store.put(sha256, wheel_data.get("filename", ""), wheel_info)
+    return wheel_info
+
+
+async def _read_wheel_info_async(wheel_data: dict, parse_wheel: bool) -> dict:
+    """Read the entry points and core metadata fields of a wheel from PyPI."""
+    core_metadata, failed = await get_core_metadata_async(wheel_data)
+    entry_points = None
+    if parse_wheel:
+        try:
+            entry_points, wheel_metadata = await read_wheel_async(
+                wheel_data["url"], read_metadata=core_metadata is None
+            )
+            core_metadata = core_metadata or wheel_metadata
+            METRICS.inc("wheels_parsed_total")
+        except Exception as err:  # pylint: disable=broad-except
+            failed = True
+            REPORTER.warn(
+                f"Unable to read wheel file from PyPI release: <pre>{err}</pre>",
+                check_id="W020",
+            )
+
+    return {
+        "entry_points": entry_points,
+        "version": core_metadata.get("Version") if core_metadata else None,
+        "classifiers": core_metadata.get_all("Classifier", []) if core_metadata else [],
+        "requires_dist": (
+            core_metadata.get_all("Requires-Dist", []) if core_metadata else []
+        ),
+        "complete": not failed,
+    }
+
+
+def get_dist_info_dir(wheel_url: str) -> Optional[str]:
+    """Return the expected name of the ``.dist-info`` directory of a wheel.
+
+    See https://packaging.python.org/en/latest/specifications/binary-distribution-format/
+    """
+    parts = wheel_url.rpartition("/")[2].split("-")
+    if len(parts) < 2:
+        return None
+    return f"{parts[0]}-{parts[1]}.dist-info"
+
+
+async def read_wheel_async(
+    wheel_url: str, read_metadata=True
+) -> Tuple[dict, Optional[Message]]:
+    """Read the entry points, and optionally the ``METADATA``, of a remote wheel.
+
+    Only the required parts of the wheel are downloaded (see `read_zip_members_async`).
+    """
+    names = ["entry_points.txt", "METADATA"] if read_metadata else ["entry_points.txt"]
+    dist_info_dir = get_dist_info_dir(wheel_url)
+    members = {}
+    if dist_info_dir:
+        members = await read_zip_members_async(
+            wheel_url, [f"{dist_info_dir}/{name}" for name in names]
+        )
+    if not members:
+        # the name of the directory is not normalized in some (older) wheels
+        members = await read_zip_members_async(
+            wheel_url, lambda name: name.rpartition(".dist-info/")[2] in names
         )
+    entry_points_content = [
+        content
+        for name, content in members.items()
+        if name.endswith("entry_points.txt")
+    ]
+    if not entry_points_content:
+        raise IOError("No entry_points.txt found in wheel")
+    entry_points = parse_entry_points(entry_points_content[-1].decode("utf-8"))
+    metadata_content = [
+        content for name, content in members.items() if name.endswith("/METADATA")
+    ]
+    if not metadata_content:
+        return entry_points, None
+    return entry_points, Parser().parsestr(
+        metadata_content[-1].decode("utf-8", errors="replace")
+    )
+
 
-    return PypiData(metadata, aiida_version=aiida_version, entry_points=entry_points)
+def parse_entry_points(content: str) -> dict:
+    """Parse the content of an ``entry_points.txt`` file."""
+    # see https://packaging.python.org/en/latest/specifications/entry-points/#file-format
+    parser = CaseSensitiveConfigParser()
+    parser.read_string(content)
+    entry_points = {}
+    for key, value in parser.items():
+        if key == "DEFAULT":
+            continue
+        entry_points[key] = dict(value.items())
+    return entry_points
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Pacing of requests according to the rate limits announced by servers.
+
+Servers like the GitHub API announce the remaining quota of a client in the
+``X-RateLimit-Remaining`` and ``X-RateLimit-Reset`` headers, and ask clients to back
+off with ``Retry-After``. The quota is tracked per host, resource and token (the
+GitHub API has separate quotas for its REST, GraphQL and search resources, see its
+``X-RateLimit-Resource`` header). When it runs low, requests are spread evenly until
+the reset; when it is exhausted, requests wait for the reset instead of failing.
+"""
+
+import asyncio
+import email.utils
+import hashlib
+import time
+import urllib.parse
+from typing import Mapping, Optional, Tuple
+
+# Requests are paced when fewer than this number of requests remain in the quota
+PACING_THRESHOLD = 100
+# Maximum time to wait for a quota to be reset (seconds)
+MAX_WAIT = 15 * 60
+# Resources with their own quota, by the start of their path (else "core")
+RESOURCE_PATHS = (("/graphql", "graphql"), ("/search/", "search"))
+
+
+class RateLimit:  # pylint: disable=too-few-public-methods
+    """Quota of a host, resource and token."""
+
+    def __init__(self):
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None  # time.time() of the reset
+        self.blocked_until = 0.0  # no request before this time.time()
+        self.next_request = 0.0  # time.time() of the next paced request
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Return the number of seconds to wait from a ``Retry-After`` header."""
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(
+            email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0
+        )
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Track the quotas of hosts, resources and tokens, and pace requests accordingly."""
+
+    def __init__(self, pacing_threshold=PACING_THRESHOLD, max_wait=MAX_WAIT):
+        """Initialize without any known quota."""
+        self.pacing_threshold = pacing_threshold
+        self.max_wait = max_wait
+        self._limits = {}
+
+    @staticmethod
+    def key(url: str, headers: Optional[Mapping] = None) -> Tuple[str, str, str]:
+        """Return the key of the quota of a request.
+
+        :return: its host, resource (see `RESOURCE_PATHS`) and (a hash of) its token.
+        """
+        token = (headers or {}).get("Authorization", "")
+        parsed = urllib.parse.urlparse(url)
+        resource = next(
+            (
+                resource
+                for prefix, resource in RESOURCE_PATHS
+                if parsed.path.startswith(prefix)
+            ),
+            "core",
+        )
+        return (
+            parsed.netloc,
+            resource,
+            hashlib.sha256(token.encode("utf8")).hexdigest()[:16],
+        )
+
+    def delay(self, key) -> float:
+        """Return how long to wait before sending a request, and account for it."""
+        limit = self._limits.get(key)
+        if limit is None:
+            return 0.0
+        now = time.time()
+        delay = max(limit.blocked_until - now, 0.0)
+        if limit.remaining is not None and limit.reset_at is not None:
+            if limit.remaining <= 0 and limit.reset_at > now:
+                delay = max(delay, limit.reset_at - now)
+            elif limit.remaining < self.pacing_threshold:
+                # spread the remaining requests until the reset
+                interval = max(limit.reset_at - now, 0.0) / max(limit.remaining, 1)
+                start = max(limit.next_request, now + delay)
+                limit.next_request = start + interval
+                delay = start - now
+            # count requests in flight, until their response updates the quota
+            limit.remaining -= 1
+        # a quota that is not reset soon enough is left to fail
+        return delay if delay <= self.max_wait else 0.0
+
+    async def wait(self, key):
+        """Wait until a request can be sent."""
+        delay = self.delay(key)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def update(self, key, status: int, headers: Mapping) -> Optional[float]:
+        """Update the quota from the headers of a response.
+
+        :return: the time to wait before retrying if the request was rejected because
+            of the rate limit (or None, also if the wait would exceed ``max_wait``).
+        """
+        limit = self._limits.setdefault(key, RateLimit())
+        now = time.time()
+        try:
+            limit.remaining = int(headers["X-RateLimit-Remaining"])
+            limit.reset_at = float(headers["X-RateLimit-Reset"])
+        except (KeyError, ValueError):
+            pass
+        retry_after = None
+        if "Retry-After" in headers:
+            retry_after = parse_retry_after(headers["Retry-After"])
+        elif status in (403, 429) and limit.remaining == 0 and limit.reset_at:
+            retry_after = max(limit.reset_at - now, 0.0)
+        if retry_after is None or status not in (403, 429, 503):
+            return None
+        limit.blocked_until = max(limit.blocked_until, now + retry_after)
+        return retry_after if retry_after <= self.max_wait else None
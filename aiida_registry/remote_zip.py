@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Read members of a remote zip file (e.g. a wheel) using HTTP range requests.
+
+Instead of downloading the whole archive, only the end of the file (containing the
+central directory) and the compressed bytes of the requested members are fetched.
+The zip file is parsed by `zipfile` from a sparse file; whenever it reads bytes that
+have not been fetched yet, the missing range is requested and parsing starts over.
+If the server does not support range requests, the full file is read into memory
+instead, unless it is larger than the maximum size (see `set_max_size`).
+Members are looked up by name in the central directory, without scanning all names.
+"""
+
+import io
+import re
+import zipfile
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+from . import MAX_WHEEL_SIZE, http_client
+
+# Size of the first request, from the end of the file: usually covers the central
+# directory, and often also the *.dist-info files which are written last in wheels
+TAIL_SIZE = 64 * 1024
+# Minimum size of subsequent range requests
+MIN_RANGE_SIZE = 16 * 1024
+# Maximum number of range requests for a single zip file
+MAX_RANGE_REQUESTS = 10
+
+CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class MissingRange(Exception):
+    """Bytes that were read from a `SparseFile` have not been fetched.
+
+    Not an `OSError`, which `zipfile` would turn into a `BadZipFile` error.
+    """
+
+    def __init__(self, start, end):
+        super().__init__(f"Bytes {start}-{end} have not been fetched")
+        self.start = start
+        self.end = end
+
+
+_max_size = MAX_WHEEL_SIZE
+
+
+def set_max_size(max_size: int):
+    """Set the maximum size of a zip file that is downloaded whole (bytes)."""
+    global _max_size  # pylint: disable=global-statement
+    _max_size = max_size
+
+
+class SparseFile:
+    """Read-only file of known size, of which only some ranges are available."""
+
+    def __init__(self, size: int):
+        """Initialize an empty file of ``size`` bytes."""
+        self.size = size
+        self._segments = []  # list of (start, data)
+        self._pos = 0
+
+    def add(self, start: int, data: bytes):
+        """Make the range of ``data`` starting at ``start`` available."""
+        self._segments.append((start, data))
+
+    def seekable(self):  # pylint: disable=no-self-use
+        """The file is seekable."""
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Change the position."""
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def tell(self):
+        """Return the position."""
+        return self._pos
+
+    def read(self, size=-1) -> bytes:
+        """Read from the position, raising `MissingRange` if the bytes are not available."""
+        end = (
+            self.size if size is None or size < 0 else min(self._pos + size, self.size)
+        )
+        if end <= self._pos:
+            return b""
+        for start, data in self._segments:
+            if start <= self._pos and end <= start + len(data):
+                chunk = data[self._pos - start : end - start]
+                self._pos = end
+                return chunk
+        raise MissingRange(self._pos, end)
+
+
+async def _get_range(
+    url, byte_range: str
+) -> Tuple[Optional[int], bytes, Optional[int]]:
+    """Request a range of bytes.
+
+    :return: start of the range, content and total size of the file;
+        start and size are None if the server returned the full file instead.
+    :raise `http_client.ContentTooLarge`: if the server returned a full file that is
+        larger than the maximum size.
+    """
+    response = await http_client.get(
+        url, headers={"Range": byte_range}, timeout=120, max_size=_max_size
+    )
+    response.raise_for_status()
+    if response.status == 206:
+        match = CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+        if match:
+            return int(match.group(1)), response.content, int(match.group(3))
+    if response.status == 200:
+        return None, response.content, None
+    raise IOError(f"Unexpected response to range request: {response.status}")
+
+
+async def read_zip_members_async(
+    url: str, select: Union[Callable[[str], bool], Iterable[str]]
+) -> Dict[str, bytes]:
+    """Return the content of the members of a remote zip file.
+
+    :param select: the names of the members (missing members are ignored),
+        or a function selecting members by name.
+    """
+    start, content, size = await _get_range(url, f"bytes=-{TAIL_SIZE}")
+    if start is None:
+        # ranges not supported by the server: we already have the full file
+        return _read_members(io.BytesIO(content), select)
+
+    source = SparseFile(size)
+    source.add(start, content)
+    for _ in range(MAX_RANGE_REQUESTS):
+        try:
+            return _read_members(source, select)
+        except MissingRange as exc:
+            end = min(max(exc.end, exc.start + MIN_RANGE_SIZE), size) - 1
+            start, content, _ = await _get_range(url, f"bytes={exc.start}-{end}")
+            if start is None:
+                return _read_members(io.BytesIO(content), select)
+            source.add(start, content)
+
+    raise IOError(f"Too many range requests needed to read '{url}'")
+
+
+def _read_members(source, select) -> Dict[str, bytes]:
+    with zipfile.ZipFile(source) as archive:
+        if callable(select):
+            names = [name for name in archive.namelist() if select(name)]
+        else:
+            names = [name for name in select if _has_member(archive, name)]
+        return {name: archive.read(name) for name in names}
+
+
+def _has_member(archive: zipfile.ZipFile, name: str) -> bool:
+    try:
+        archive.getinfo(name)
+    except KeyError:
+        return False
+    return True
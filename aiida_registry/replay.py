@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""Record the HTTP responses of a run, and replay them from a local stand-in server.
+
+In record mode (`Recorder`), every response received by the HTTP engine is written to
+an on-disk corpus: one ``<key>.json`` file (request, status and headers) and one
+``<key>.body`` file per request. The key is a hash of the method, URL, ``Range``
+header and body of the request.
+
+In replay mode, the `ReplayServer` serves the corpus, with an optional latency and
+bandwidth, and the HTTP engine sends all requests to it (see
+`http_client.HttpEngine.enable_replay`): the URL ``https://pypi.org/pypi/aiida-diff/json``
+is requested as ``http://pypi.org:<port>/https/pypi.org/pypi/aiida-diff/json``, with
+every host name resolved to the address of the server. Requests are thus still
+grouped by host (for connection limits, circuit breakers, rate limits, ...).
+"""
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+from aiohttp.abc import AbstractResolver
+
+# Headers that describe the transfer of a response, rather than the response itself
+TRANSFER_HEADERS = {
+    "connection",
+    "content-encoding",
+    "content-length",
+    "keep-alive",
+    "transfer-encoding",
+}
+
+
+def corpus_key(method: str, url: str, headers: Optional[Mapping] = None, data=None):
+    """Return the key of a request in the corpus."""
+    byte_range = None
+    for name, value in (headers or {}).items():
+        if name.lower() == "range":
+            byte_range = value
+    body_hash = hashlib.sha256(data).hexdigest() if data else None
+    return hashlib.sha256(
+        json.dumps([method, url, byte_range, body_hash]).encode("utf8")
+    ).hexdigest()
+
+
+def wire_url(url: str, address: Tuple[str, int]) -> str:
+    """Return the URL to send a request for ``url`` to the replay server at ``address``."""
+    parsed = urllib.parse.urlsplit(url)
+    rest = url[len(parsed.scheme) + 3 :]
+    return f"http://{parsed.hostname}:{address[1]}/{parsed.scheme}/{rest}"
+
+
+def original_url(path: str) -> str:
+    """Return the original URL of a request received by the replay server."""
+    scheme, _, rest = path.lstrip("/").partition("/")
+    return f"{scheme}://{rest}"
+
+
+class CorpusEntry(NamedTuple):
+    """Response recorded in the corpus."""
+
+    status: int
+    headers: list
+    content: bytes
+
+
+class Corpus:
+    """Directory of recorded responses."""
+
+    def __init__(self, directory):
+        """Open (or create) the corpus in ``directory``."""
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key, "json"))
+
+    def __len__(self):
+        return sum(name.endswith(".json") for name in os.listdir(self.directory))
+
+    def get(self, key) -> Optional[CorpusEntry]:
+        """Return the response recorded for ``key``, or None."""
+        try:
+            with open(self._path(key, "json"), encoding="utf8") as handle:
+                meta = json.load(handle)
+            with open(self._path(key, "body"), "rb") as handle:
+                content = handle.read()
+        except FileNotFoundError:
+            return None
+        return CorpusEntry(meta["status"], meta["headers"], content)
+
+    def put(  # pylint: disable=too-many-arguments
+        self, key, method, url, status, headers, content
+    ):
+        """Record a response (the body is written first, so that entries are complete)."""
+        with open(self._path(key, "body"), "wb") as handle:
+            handle.write(content)
+        meta = {
+            "method": method,
+            "url": url,
+            "status": status,
+            "headers": [
+                [name, value]
+                for name, value in headers
+                if name.lower() not in TRANSFER_HEADERS
+            ],
+        }
+        with open(self._path(key, "json"), "w", encoding="utf8") as handle:
+            json.dump(meta, handle, indent=1)
+
+
+class Recorder:  # pylint: disable=too-few-public-methods
+    """Record the responses received by the HTTP engine in a `Corpus`."""
+
+    def __init__(self, directory):
+        """Record responses in the corpus at ``directory``."""
+        self.corpus = Corpus(directory)
+
+    def record(  # pylint: disable=too-many-arguments
+        self, method, url, headers, data, response, read=True
+    ):
+        """Record the response to a request."""
+        key = corpus_key(method, url, headers, data)
+        # the body of a response that was not read is missing, keep the full one
+        if not read and key in self.corpus:
+            return
+        self.corpus.put(
+            key,
+            method,
+            url,
+            response.status,
+            response.headers.items(),
+            response.content,
+        )
+
+
+class LoopbackResolver(AbstractResolver):
+    """Resolve every host name to the address of the replay server."""
+
+    def __init__(self, host="127.0.0.1"):
+        self.host = host
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        return [
+            {
+                "hostname": host,
+                "host": self.host,
+                "port": port,
+                "family": socket.AF_INET,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST,
+            }
+        ]
+
+    async def close(self):
+        pass
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    """Serve the responses of the corpus of the server."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Respond with the recorded response."""
+        server: ReplayServer = self.server.replay
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length) if length else None
+        url = original_url(self.path)
+        entry = server.corpus.get(corpus_key(self.command, url, self.headers, data))
+        server.count(url, entry is None)
+        if entry is None:
+            entry = CorpusEntry(404, [], f"Not in the corpus: {url}".encode("utf8"))
+
+        time.sleep(server.latency)
+        self.send_response(entry.status)
+        for name, value in entry.headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(entry.content)))
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        if not server.bandwidth:
+            self.wfile.write(entry.content)
+            return
+        # send chunks of a tenth of a second
+        chunk_size = max(int(server.bandwidth / 10), 1)
+        for start in range(0, len(entry.content), chunk_size):
+            chunk = entry.content[start : start + chunk_size]
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / server.bandwidth)
+
+    do_HEAD = do_GET
+    do_POST = do_GET
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Do not log requests."""
+
+
+class ReplayServer:
+    """Local HTTP server replaying a corpus, in a background thread.
+
+    :param latency: delay before each response (seconds).
+    :param bandwidth: rate at which bodies are sent (bytes per second, per request),
+        unlimited if None.
+    """
+
+    def __init__(self, directory, latency=0.0, bandwidth=None, port=0):
+        """Create the server (it is started by `start` or by entering a ``with`` block)."""
+        self.corpus = Corpus(directory)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.missing = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _ReplayHandler)
+        self._server.daemon_threads = True
+        self._server.replay = self
+        self._thread = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """Host and port of the server."""
+        return self._server.server_address[:2]
+
+    def count(self, url, missing):
+        """Count a request (and record it if it is not in the corpus)."""
+        with self._lock:
+            self.requests += 1
+            if missing:
+                self.missing.append(url)
+
+    def start(self):
+        """Start serving requests."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": 0.1},
+            name="aiida-registry-replay",
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Sharded output: a slim index of the plugins plus one detail file per plugin.
+
+The single ``plugins_metadata.json`` contains everything (process specs, warnings,
+entry points, ...), so its size grows with the registry. The sharded output splits it:
+
+* ``index.json`` has the fields shown in the list of plugins, the registry-wide data
+  of the list view (global summary, status badges, ...) and the path of the detail
+  file of each plugin;
+* ``plugins/<plugin>-<hash>.json`` has the full record of a plugin. The path contains
+  the hash of the content, so that the files can be cached indefinitely.
+
+Both are compact JSON (no indentation), written atomically. The detail files of the
+previous index are kept until the next run, so that clients still holding the previous
+index can fetch them.
+"""
+
+import hashlib
+import json
+import os
+
+INDEX_FILENAME = "index.json"
+DETAILS_DIR = "plugins"
+# Registry-wide data in the index
+INDEX_KEYS = ("globalsummary", "status_dict", "entrypointtypes")
+# Fields of the plugins in the index
+INDEX_FIELDS = (
+    "name",
+    "development_status",
+    "aiida_version",
+    "aiida_compatibility",
+    "summaryinfo",
+    "code_home",
+    "documentation_url",
+    "commits_count",
+    "is_installable",
+)
+INDEX_METADATA_FIELDS = ("description", "release_date")
+
+
+def dumps(data) -> str:
+    """Return the compact JSON representation of ``data``."""
+    return json.dumps(data, separators=(",", ":"), sort_keys=True)
+
+
+def write_file(path, content: str):
+    """Write a file atomically (a temporary file is moved into place)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf8") as handle:
+        handle.write(content)
+    os.replace(tmp_path, path)
+
+
+def get_index_record(plugin_data: dict) -> dict:
+    """Return the fields of a plugin in the index."""
+    record = {
+        field: plugin_data[field] for field in INDEX_FIELDS if field in plugin_data
+    }
+    metadata = plugin_data.get("metadata") or {}
+    record["metadata"] = {
+        field: metadata[field] for field in INDEX_METADATA_FIELDS if field in metadata
+    }
+    return record
+
+
+def get_detail_files(index: dict) -> set:
+    """Return the names of the detail files referenced by an index."""
+    return {
+        os.path.basename(plugin["detail"])
+        for plugin in index.get("plugins", {}).values()
+    }
+
+
+def write_shards(all_data: dict, directory) -> dict:
+    """Write the index and the detail files of the plugins of ``all_data`` to ``directory``.
+
+    The new index is written after the detail files it references. Then the detail
+    files referenced neither by the new nor by the previous index are removed.
+
+    :param all_data: the content of ``plugins_metadata.json``.
+    :return: the index.
+    """
+    details_dir = os.path.join(directory, DETAILS_DIR)
+    os.makedirs(details_dir, exist_ok=True)
+    index_path = os.path.join(directory, INDEX_FILENAME)
+    referenced = set()
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf8") as handle:
+            referenced = get_detail_files(json.load(handle))
+
+    index = {key: all_data[key] for key in INDEX_KEYS if key in all_data}
+    index["plugins"] = {}
+    for plugin_name, plugin_data in all_data["plugins"].items():
+        content = dumps(plugin_data)
+        digest = hashlib.sha256(content.encode("utf8")).hexdigest()[:16]
+        path = f"{DETAILS_DIR}/{plugin_name}-{digest}.json"
+        write_file(os.path.join(directory, path), content)
+        index["plugins"][plugin_name] = {
+            **get_index_record(plugin_data),
+            "detail": path,
+        }
+
+    write_file(index_path, dumps(index))
+
+    referenced |= get_detail_files(index)
+    for filename in os.listdir(details_dir):
+        if filename not in referenced:
+            os.remove(os.path.join(details_dir, filename))
+    return index
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Persistent key-value store of JSON data in a sqlite database.
+
+Base of the stores of data that never changes for a given key (e.g. the data read
+from a wheel, keyed by its sha256), see `wheel_store` and `parse_memo`.
+The numbers of hits and misses are persisted, to follow the hit rate across runs, and
+the entries not used for a while can be removed (see `SqliteStore.compact`).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DAY = 24 * 60 * 60
+
+
+class SqliteStore:
+    """Store of JSON data in a sqlite database.
+
+    Subclasses define the file of the database, the table of the entries, and the
+    columns of the keys (``KEY``) and of the other values stored (``VALUES``).
+    """
+
+    FILENAME: str
+    TABLE: str
+    # columns of the key and of the other values, with their types
+    KEY: tuple = ()
+    VALUES: tuple = ()
+
+    def __init__(self, directory):
+        """Open (or create) the store in ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, self.FILENAME)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        columns = ", ".join(f"{name} {type_}" for name, type_ in self.KEY + self.VALUES)
+        key = ", ".join(name for name, _ in self.KEY)
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} ({columns}, data TEXT, "
+            f"created REAL, last_access REAL, PRIMARY KEY ({key}))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)"
+        )
+        self._db.commit()
+        self._where = " AND ".join(f"{name} = ?" for name, _ in self.KEY)
+
+    def _increment(self, name):
+        self._db.execute(
+            "INSERT INTO counters VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key: tuple) -> Optional[dict]:
+        """Return the data stored for ``key`` (the values of the ``KEY`` columns), or None."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT data FROM {self.TABLE} WHERE {self._where}", key
+            ).fetchone()
+            if row is None:
+                self._increment("misses")
+            else:
+                self._increment("hits")
+                self._db.execute(
+                    f"UPDATE {self.TABLE} SET last_access = ? WHERE {self._where}",
+                    (time.time(), *key),
+                )
+            self._db.commit()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key: tuple, data: dict, values: tuple = ()):
+        """Store the data for ``key``, with the ``values`` of the ``VALUES`` columns."""
+        now = time.time()
+        # the order of the keys is kept, so that a hit returns exactly what was stored
+        row = (*key, *values, json.dumps(data), now, now)
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.TABLE} "
+                f"VALUES ({', '.join('?' * len(row))})",
+                row,
+            )
+            self._db.commit()
+
+    def compact(self, max_age: Optional[float] = None) -> int:
+        """Remove the entries not used for ``max_age`` days and reclaim disk space.
+
+        :return: the number of removed entries.
+        """
+        with self._lock:
+            removed = 0
+            if max_age is not None:
+                removed = self._db.execute(
+                    f"DELETE FROM {self.TABLE} WHERE last_access < ?",
+                    (time.time() - max_age * DAY,),
+                ).rowcount
+            self._db.commit()
+            self._db.execute("VACUUM")
+        return removed
+
+    def stats(self) -> dict:
+        """Return the number of entries (keyed by ``TABLE``), the size and the hit counters."""
+        with self._lock:
+            (entries,) = self._db.execute(
+                f"SELECT COUNT(*) FROM {self.TABLE}"
+            ).fetchone()
+            counters = dict(self._db.execute("SELECT name, value FROM counters"))
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            self.TABLE: entries,
+            "size": os.path.getsize(self.path),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._db.close()
@@ -8,11 +8,13 @@ This uses the aiida-core Docker container to test the installation of the plugin
 import json
 import os
 import sys
+import time
 from dataclasses import asdict, dataclass
 
 from aiida_registry.utils import add_registry_checks
 
 from . import PLUGINS_METADATA, REPORTER
+from .metrics import METRICS
 
 # Where to mount the workdir inside the Docker container
 _DOCKER_WORKDIR = "/tmp/scripts"
@@ -96,6 +98,7 @@ def test_install_one_docker(container_image, plugin):
     REPORTER.set_plugin_name(plugin["name"])
 
     print("   - Starting container for {}".format(plugin["name"]))
+    start = time.perf_counter()
     container = client.containers.run(
         container_image,
         detach=True,
@@ -172,6 +175,11 @@ def test_install_one_docker(container_image, plugin):
 
     finally:
         container.remove(force=True)
+        METRICS.set(
+            "docker_container_seconds",
+            time.perf_counter() - start,
+            plugin=plugin["name"],
+        )
 
     return asdict(
         TestResult(
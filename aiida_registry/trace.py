@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Timing spans of the stages of a run, exported in the Chrome trace event format.
+
+The trace file can be opened in https://ui.perfetto.dev or ``about:tracing``.
+Stages are shown on one track per plugin (the plugin of the `REPORTER` context), and
+HTTP requests on one track per host, since many of them overlap.
+Spans are only recorded when tracing has been started, and are almost free otherwise.
+
+See https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+"""
+
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from . import REPORTER
+
+# Track of the stages that do not belong to a plugin
+REGISTRY_TRACK = "registry"
+
+
+class Tracer:
+    """Recorder of timing spans."""
+
+    def __init__(self):
+        """Initialize a disabled tracer."""
+        self.path: Optional[str] = None
+        self._events = []
+        self._tracks = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._start = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Return True if spans are recorded."""
+        return self.path is not None
+
+    def start(self, path):
+        """Start recording spans, to be written to ``path`` by `stop`."""
+        self.path = path
+        self._events = []
+        self._tracks = {}
+        self._start = time.perf_counter_ns()
+
+    def stop(self):
+        """Stop recording spans and write the trace file."""
+        if self.path is None:
+            return
+        path, self.path = self.path, None
+        events, self._events = self._events, []
+        with open(path, "w", encoding="utf8") as handle:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, handle)
+
+    def _now(self) -> float:
+        """Return the time since the start of the trace (microseconds)."""
+        return (time.perf_counter_ns() - self._start) / 1000
+
+    def _track(self, name) -> int:
+        """Return the id of the track named ``name``, creating it if needed."""
+        track = self._tracks.get(name)
+        if track is not None:
+            return track
+        with self._lock:
+            if name not in self._tracks:
+                self._tracks[name] = len(self._tracks) + 1
+                self._events.append(
+                    {
+                        "ph": "M",
+                        "name": "thread_name",
+                        "pid": os.getpid(),
+                        "tid": self._tracks[name],
+                        "args": {"name": name},
+                    }
+                )
+            return self._tracks[name]
+
+    @contextlib.contextmanager
+    def span(self, name, category="stage", **args):
+        """Record the duration of the ``with`` block.
+
+        Attributes can be added to the yielded dictionary within the block.
+        Spans of the "http" category are recorded as asynchronous events, on the track
+        of their ``host`` attribute.
+        """
+        if not self.enabled:
+            yield {}
+            return
+        args = {"plugin": REPORTER.plugin_name, **args}
+        start = self._now()
+        try:
+            yield args
+        except BaseException as exc:
+            args["error"] = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            self._record(name, category, start, args)
+
+    def _record(self, name, category, start, args):
+        end = self._now()
+        pid = os.getpid()
+        if category == "http":
+            event = {"cat": category, "name": args.get("host", name), "pid": pid}
+            event["id"] = next(self._ids)
+            event["tid"] = self._track(args.get("host", name))
+            self._events.append({**event, "ph": "b", "ts": start, "args": args})
+            self._events.append({**event, "ph": "e", "ts": end})
+        else:
+            self._events.append(
+                {
+                    "ph": "X",
+                    "cat": category,
+                    "name": name,
+                    "pid": pid,
+                    "tid": self._track(args["plugin"] or REGISTRY_TRACK),
+                    "ts": start,
+                    "dur": end - start,
+                    "args": args,
+                }
+            )
+
+
+TRACER = Tracer()
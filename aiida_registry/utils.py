@@ -1,24 +1,16 @@
 # -*- coding: utf-8 -*-
 """Utility functions."""
 
-import os
 import traceback
+from typing import Optional
 
-import requests
-import requests_cache
+from . import REPORTER, http_client
 
-from . import REPORTER
 
-if os.environ.get("CACHE_REQUESTS"):
-    # Set environment variable CACHE_REQUESTS to cache requests for 1 day for faster testing
-    # e.g.: export CACHE_REQUESTS=1
-    requests_cache.install_cache("demo_cache", expire_after=60 * 60 * 24)
-
-
-def fetch_file(file_url: str, warn=True) -> str:
+async def fetch_file_async(file_url: str, warn=True) -> Optional[str]:
     """Fetch plugin info from a URL to a file."""
     try:
-        response = requests.get(file_url, timeout=60)
+        response = await http_client.get(file_url, timeout=60)
         # raise an exception for all 4xx/5xx errors
         response.raise_for_status()
     except Exception:  # pylint: disable=broad-except
@@ -30,7 +22,12 @@ def fetch_file(file_url: str, warn=True) -> str:
             )
             REPORTER.debug(traceback.format_exc())
         return None
-    return response.content.decode(response.encoding or "utf8")
+    return response.text
+
+
+def fetch_file(file_url: str, warn=True) -> Optional[str]:
+    """Fetch plugin info from a URL to a file."""
+    return http_client.run(fetch_file_async(file_url, warn=warn))
 
 
 def add_registry_checks(metadata):
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Persistent store of the data read from wheels, keyed by the sha256 of the wheel.
+
+Released wheels are immutable, so the entry points and core metadata read from a
+wheel never change: each wheel is read at most once, and later runs look its data up
+by the ``digests.sha256`` listed in the PyPI JSON.
+"""
+
+from typing import Optional
+
+from .sqlite_store import SqliteStore
+
+STORE_FILENAME = "wheel_store.sqlite"
+
+
+class WheelStore(SqliteStore):
+    """Store of wheel data in a sqlite database, with the filename of the wheels."""
+
+    FILENAME = STORE_FILENAME
+    TABLE = "wheels"
+    KEY = (("sha256", "TEXT"),)
+    VALUES = (("filename", "TEXT"),)
+
+    def get(self, sha256: str) -> Optional[dict]:  # pylint: disable=arguments-renamed
+        """Return the data of the wheel with digest ``sha256``, or None."""
+        return super().get((sha256,))
+
+    def put(self, sha256: str, filename: str, data: dict):  # pylint: disable=arguments-differ,arguments-renamed
+        """Store the data of a wheel."""
+        super().put((sha256,), data, (filename,))
+
+
+_STORE: Optional[WheelStore] = None
+
+
+def enable_store(directory) -> WheelStore:
+    """Use the wheel store in ``directory`` when reading wheels from PyPI."""
+    global _STORE  # pylint: disable=global-statement
+    disable_store()
+    _STORE = WheelStore(directory)
+    return _STORE
+
+
+def disable_store():
+    """Stop using the wheel store."""
+    global _STORE  # pylint: disable=global-statement
+    if _STORE is not None:
+        _STORE.close()
+        _STORE = None
+
+
+def get_store() -> Optional[WheelStore]:
+    """Return the wheel store in use, if any."""
+    return _STORE
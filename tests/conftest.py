@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Fixtures for the tests of the registry code."""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+def _get_range(byte_range, headers, body):
+    """Return the response to a request for a single range (``bytes=start-end`` or ``bytes=-length``)."""
+    start, end = byte_range.split("=")[1].split("-")
+    if not start:
+        start, end = max(len(body) - int(end), 0), len(body) - 1
+    start, end = int(start), min(int(end or len(body) - 1), len(body) - 1)
+    headers = {**headers, "Content-Range": f"bytes {start}-{end}/{len(body)}"}
+    return 206, headers, body[start : end + 1]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serve the routes registered on the server: ``{path: (status, headers, body)}``."""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Respond to a GET request."""
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+        status, headers, body = self.server.routes.get(
+            self.path.split("?")[0], (404, {}, b"not found")
+        )
+        if callable(body):
+            status, headers, body = body(self)
+        byte_range = self.headers.get("Range")
+        if self.server.accept_ranges and byte_range and status == 200:
+            status, headers, body = _get_range(byte_range, headers, body)
+        time.sleep(self.server.delay)
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+            self.server.bytes_sent += len(body)
+
+    do_HEAD = do_GET
+    do_POST = do_GET
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Do not log requests."""
+
+
+@pytest.fixture
+def http_server():
+    """Local HTTP server; register responses in ``http_server.routes``."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.routes = {}
+    server.requests = []
+    server.delay = 0
+    server.accept_ranges = True
+    server.bytes_sent = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
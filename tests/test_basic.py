@@ -12,14 +12,27 @@ This fetches metadata from plugins defined using different build systems
  * flit: pyproject.toml
 """
 
+import hashlib
+import json
+import random
+import time
 from pathlib import Path
 
 import yaml
 
+from aiida_registry import REPORTER, fetch_metadata, http_client
 from aiida_registry.fetch_metadata import validate_plugin_entry_points
-from aiida_registry.make_pages import get_pip_install_cmd
+from aiida_registry.link_check import LinkStatus
+from aiida_registry.make_pages import (
+    SummaryAccumulator,
+    get_pip_install_cmd,
+    get_summary_info,
+)
+from aiida_registry.parse_pypi import PypiData
 from aiida_registry.parse_build_file import (
+    PARSER_VERSION,
     get_version_from_module,
+    load_build_file,
     parse_flit_old,
     parse_pep_621,
     parse_poetry,
@@ -60,6 +73,25 @@ def test_parse_setup_cfg(data_regression):
     data_regression.check(data.as_dict())
 
 
+def test_load_build_file(capsys):
+    """Test that build files are parsed once, and that TOML errors are reported."""
+    content = (TEST_PATH / "poetry-pyproject.toml").read_text()
+    tool, data = load_build_file("pyproject.toml", content)
+    assert tool == "POETRY"
+    assert parse_poetry(data) == parse_poetry(content)
+
+    assert load_build_file("setup.json", "{}") == ("SETUPTOOLS_JSON", "{}")
+
+    with REPORTER.plugin("invalid-toml"):
+        assert load_build_file("pyproject.toml", "[tool]\nname = ") == (
+            None,
+            "[tool]\nname = ",
+        )
+    captured = capsys.readouterr()
+    assert "W011" in captured.out
+    assert "line 2" in captured.out
+
+
 def test_get_version_from_module():
     """Test parsing __version__ from module."""
     assert get_version_from_module('# comment\n__version__="0.0.1"') == "0.0.1"
@@ -94,3 +126,209 @@ def test_pip_install_cmd():
 
     # aiida-gudhi is in alpha and does not provide a pip_url
     assert "See" not in get_pip_install_cmd(test_data["gudhi"])
+
+
+def test_global_summary():
+    """Test that merging the partial summaries of plugins does not depend on the order."""
+    with open(TEST_PATH / "plugins.yaml", "r", encoding="utf8") as handle:
+        test_data = yaml.safe_load(handle)
+    partials = [
+        get_summary_info(plugin_data.get("entry_points"))[1]
+        for plugin_data in test_data.values()
+    ]
+
+    summary = sum(partials, SummaryAccumulator()).global_summary()
+    half = len(partials) // 2
+    merged = sum(partials[half:], SummaryAccumulator()) + sum(
+        reversed(partials[:half]), SummaryAccumulator()
+    )
+    assert merged.global_summary() == summary
+    # the partial summaries are not changed by merging
+    assert sum(partials, SummaryAccumulator()).global_summary() == summary
+
+    calculations = summary[0]
+    assert calculations["name"] == "Calculations"
+    assert calculations["num_entries"] == sum(
+        bool((plugin_data.get("entry_points") or {}).get("aiida.calculations"))
+        for plugin_data in test_data.values()
+    )
+
+
+def test_fetch_metadata_jobs(http_server, tmp_path, monkeypatch):
+    """Test that fetching plugins concurrently gives the same result as sequentially."""
+    build_files = {
+        "aiida-diff": ("setup.json", "setup.json"),
+        "aiida-cfg": ("setup.cfg", "setup.cfg"),
+        "aiida-pep621": ("pep621-pyproject.toml", "pyproject.toml"),
+        "aiida-poetry": ("poetry-pyproject.toml", "pyproject.toml"),
+        "aiida-flit": ("flit-old-pyproject.toml", "pyproject.toml"),
+    }
+
+    def respond(status, body=b""):
+        def handler(_):
+            # the plugins complete in a different order than they are submitted
+            time.sleep(random.random() / 50)
+            return status, {}, body
+
+        return handler
+
+    plugins = {}
+    for name, (static_file, filename) in build_files.items():
+        content = (TEST_PATH / static_file).read_bytes()
+        http_server.routes[f"/{name}/{filename}"] = (200, {}, respond(200, content))
+        http_server.routes[f"/{name}"] = (200, {}, respond(200))
+        plugins[name] = {
+            "code_home": f"{http_server.url}/{name}",
+            "documentation_url": f"{http_server.url}/{name}/docs",
+            "entry_point_prefix": name.split("-")[1],
+            "pip_url": name,
+            "plugin_info": f"{http_server.url}/{name}/{filename}",
+        }
+    # unreachable code_home (E005), documentation (W008) of the other plugins
+    plugins["aiida-flit"]["code_home"] = "http://127.0.0.1:1/aiida-flit"
+    http_server.routes["/aiida-diff/docs"] = (200, {}, respond(200))
+    plugins_file = tmp_path / "plugins.yaml"
+    plugins_file.write_text(yaml.dump(plugins))
+
+    monkeypatch.setattr(fetch_metadata, "PLUGINS_FILE_ABS", plugins_file)
+    monkeypatch.setattr(fetch_metadata, "GITHUB_TOKEN", None)
+    monkeypatch.setattr(fetch_metadata.git_mirror, "get_commits_count", len)
+
+    results = []
+    for jobs in [1, 4]:
+        monkeypatch.setattr(REPORTER, "plugins_warnings", {})
+        monkeypatch.setattr(REPORTER, "plugins_errors", {})
+        http_client.HTTP_ENGINE.reset_breakers()
+        metadata, _ = fetch_metadata.fetch_metadata(fetch_pypi=False, jobs=jobs)
+        results.append(json.dumps(metadata, indent=2))
+    http_client.HTTP_ENGINE.reset_breakers()
+
+    assert results[0] == results[1]
+    metadata = json.loads(results[1])
+    assert list(metadata) == sorted(build_files)
+    assert metadata["aiida-diff"]["entry_points"]
+    assert metadata["aiida-cfg"]["entry_points"]
+    assert "E005" in metadata["aiida-flit"]["errors"][0]
+    assert metadata["aiida-cfg"]["commits_count"] == len(
+        plugins["aiida-cfg"]["code_home"]
+    )
+    assert not any("W008" in warning for warning in metadata["aiida-diff"]["warnings"])
+    assert any("W008" in warning for warning in metadata["aiida-cfg"]["warnings"])
+
+
+def test_incremental_previous_record():
+    """Test reusing the record of an unchanged plugin from a previous run."""
+    fingerprint = {"entry": "abc", "pypi_release": "1.0.0 2024-01-01T00:00:00"}
+    previous = {
+        "entry_points": {
+            "aiida.calculations": {
+                "diff": {"class": "aiida_diff.calculations:DiffCalculation"}
+            },
+            "aiida.data": {"diff": "aiida_diff.data:DiffParameters"},
+        },
+        "is_installable": "True",
+        "errors": ["E001: Failed to install plugin aiida-diff"],
+        "warnings": ["W003: Missing classifier 'Framework :: AiiDA'"],
+        "fingerprint": {**fingerprint, "checks": [0, 1]},
+    }
+
+    assert fetch_metadata.is_unchanged(fingerprint, previous)
+    assert not fetch_metadata.is_unchanged({**fingerprint, "entry": "def"}, previous)
+    assert not fetch_metadata.is_unchanged(
+        {**fingerprint, "pypi_release": None}, previous
+    )
+
+    record = fetch_metadata.get_previous_record(previous)
+    assert "is_installable" not in record
+    assert record["errors"] == []
+    assert record["warnings"] == previous["warnings"]
+    assert record["entry_points"]["aiida.calculations"] == {
+        "diff": "aiida_diff.calculations:DiffCalculation"
+    }
+
+
+def test_incremental_wheel_failed(monkeypatch):
+    """Test that a record is not reused if the wheel could not be read."""
+    pypi_data = {"info": {"version": "1.0.0"}, "releases": {}}
+    monkeypatch.setattr(fetch_metadata, "get_pypi_json", lambda _: pypi_data)
+    monkeypatch.setattr(fetch_metadata, "get_latest_release", lambda _: "1.0.0")
+    monkeypatch.setattr(fetch_metadata, "has_wheel", lambda _: True)
+    monkeypatch.setattr(
+        fetch_metadata,
+        "get_pypi_metadata",
+        lambda *_, **__: PypiData({}, entry_points={}, complete=False),
+    )
+    plugin_data = {"name": "aiida-diff", "pip_url": "aiida-diff", "code_home": ""}
+
+    with REPORTER.plugin("aiida-diff"):
+        record = fetch_metadata.complete_plugin_data(dict(plugin_data))
+    assert record["fingerprint"]["wheel"] is None
+
+    fingerprint = {**record["fingerprint"]}
+    del fingerprint["wheel"]
+    assert not fetch_metadata.is_unchanged(fingerprint, record)
+
+
+def test_mirror_failed_quiet(monkeypatch, capsys):
+    """Test that a failure to mirror the repository is reported (and can be silenced)."""
+
+    def get_commits_count(_):
+        raise RuntimeError("repository not found")
+
+    monkeypatch.setattr(fetch_metadata, "GITHUB_TOKEN", None)
+    monkeypatch.setattr(
+        fetch_metadata.git_mirror, "get_commits_count", get_commits_count
+    )
+    monkeypatch.setattr(REPORTER, "quiet", True)
+    record = {"code_home": "https://github.com/aiidateam/aiida-diff"}
+    links = {record["code_home"]: LinkStatus(record["code_home"], status=200)}
+
+    fetch_metadata.update_live_data(record, links=links)
+
+    assert record["commits_count"] == -1
+    assert not capsys.readouterr().out
+
+
+def test_incremental_live_data(monkeypatch):
+    """Test that the live data of a reused record is updated, and its checks not carried."""
+    monkeypatch.setattr(fetch_metadata, "GITHUB_TOKEN", "token")
+    plugin_data = {
+        "name": "aiida-diff",
+        "code_home": "https://github.com/aiidateam/aiida-diff",
+        "documentation_url": "https://aiida-diff.readthedocs.io",
+    }
+    links = {
+        plugin_data["code_home"]: LinkStatus(plugin_data["code_home"], status=200),
+        plugin_data["documentation_url"]: LinkStatus(
+            plugin_data["documentation_url"], status=404
+        ),
+    }
+    fingerprint = {
+        "entry": hashlib.sha256(
+            json.dumps(plugin_data, sort_keys=True).encode("utf8")
+        ).hexdigest(),
+        "version": [fetch_metadata.RECORD_VERSION, PARSER_VERSION],
+    }
+    previous = {
+        **plugin_data,
+        "hosted_on": "gitlab.com",
+        "commits_count": 1,
+        "warnings": ["W003: Missing classifier", "W008: Unable to reach documentation"],
+        "fingerprint": {**fingerprint, "checks": [0, 1]},
+    }
+
+    with REPORTER.plugin("aiida-diff") as report:
+        record = fetch_metadata.complete_plugin_data(
+            dict(plugin_data), fetch_pypi=False, previous=previous, links=links
+        )
+        fetch_metadata.update_live_data(record, commits_count=42, links=links)
+
+    assert record["hosted_on"] == "github.com"
+    assert record["commits_count"] == 42
+    assert record["warnings"] == ["W003: Missing classifier"]
+    assert len(report.warnings) == 1
+    assert "W008" in report.warnings[0]
+
+    # records of another version of the code are not reused
+    outdated = {**fingerprint, "version": [0, PARSER_VERSION]}
+    assert not fetch_metadata.is_unchanged(fingerprint, {"fingerprint": outdated})
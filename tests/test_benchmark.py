@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Tests of the benchmarks of the build-file parsers."""
+
+from aiida_registry.benchmark import (
+    benchmark_parsers,
+    compare_to_baseline,
+    load_build_files,
+    median_scores,
+    scale_build_files,
+)
+from aiida_registry.parse_build_file import identify_build_tool
+
+
+def test_scale_build_files():
+    """Test that the synthetic build files keep the build tool of the real-world ones."""
+    files = load_build_files()
+    scaled = scale_build_files(files, 3 * len(files))
+
+    assert len(scaled) == 3 * len(files)
+    for name, content in scaled:
+        original = name.split("-", 1)[1]
+        assert identify_build_tool(name, content) == identify_build_tool(
+            original, files[original]
+        )
+        assert identify_build_tool(name, content) is not None
+
+
+def test_benchmark_parsers():
+    """Test the results of the benchmark and the comparison to a baseline."""
+    results = benchmark_parsers(scale_build_files(load_build_files(), 30), repeat=1)
+
+    assert {
+        "identify_build_tool",
+        "parse_pep_621",
+        "parse_poetry",
+        "parse_flit_old",
+        "parse_setup_cfg",
+        "parse_setup_json",
+        "get_aiida_version_list",
+        "get_aiida_version_poetry",
+    } == set(results)
+    assert results["identify_build_tool"]["files"] == 30
+    assert all(result["parses_per_second"] > 0 for result in results.values())
+
+    score = results["parse_pep_621"]["score"]
+    baseline = {"parse_pep_621": score * 2, "parse_poetry": 0, "unknown": 1}
+    assert compare_to_baseline(results, baseline, tolerance=0.3) == [
+        ("parse_pep_621", score, score * 2)
+    ]
+    assert not compare_to_baseline(results, baseline, tolerance=0.6)
+
+
+def test_median_scores():
+    """Test that the median score of several runs is kept."""
+    runs = [{"parse_poetry": {"score": score}} for score in (3.0, 1.0, 2.0)]
+
+    assert median_scores(runs) == {"parse_poetry": {"score": 2.0}}
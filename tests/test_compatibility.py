@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Tests of the compatibility matrix with the releases of aiida-core."""
+
+import json
+
+from click.testing import CliRunner
+
+from aiida_registry.cli import cli
+from aiida_registry.compatibility import (
+    compile_constraint,
+    get_release_versions,
+    make_matrix,
+)
+
+PYPI_DATA = {
+    "releases": {
+        version: []
+        for version in ("1.6.9", "2.0.0b1", "2.0.0", "2.1.2", "2.10.0", "3.0.0")
+    }
+}
+
+
+def test_get_release_versions():
+    """Test that the final releases are sorted by version."""
+    assert get_release_versions(PYPI_DATA) == [
+        "1.6.9",
+        "2.0.0",
+        "2.1.2",
+        "2.10.0",
+        "3.0.0",
+    ]
+    assert not get_release_versions(None)
+
+
+def test_compile_constraint():
+    """Test the constraints of PEP 440 and Poetry."""
+    assert len(compile_constraint(">=1.6,<2.0 || >=2.1,<3.0")) == 2
+    assert compile_constraint("*")[0].contains("2.0.0")
+    assert compile_constraint("2.1.2")[0].contains("2.1.2")
+    assert compile_constraint("not a constraint") is None
+
+
+def test_make_matrix(tmp_path):
+    """Test the bitsets of the plugins, the reverse index and its lookup in the CLI."""
+    plugins = {
+        "aiida-diff": {"aiida_version": ">=2.0,<3"},
+        "aiida-old": {"aiida_version": ">=1.6,<2.0 || >=2.10,<3.0.0"},
+        "aiida-any": {"aiida_version": "*"},
+        "aiida-unknown": {"aiida_version": None},
+    }
+    matrix = make_matrix(plugins, get_release_versions(PYPI_DATA))
+
+    assert plugins["aiida-diff"]["aiida_compatibility"] == "e"
+    assert plugins["aiida-old"]["aiida_compatibility"] == "9"
+    assert plugins["aiida-any"]["aiida_compatibility"] == "1f"
+    assert plugins["aiida-unknown"]["aiida_compatibility"] is None
+    assert matrix["plugins"]["2.10.0"] == ["aiida-any", "aiida-diff", "aiida-old"]
+    assert matrix["plugins"]["3.0.0"] == ["aiida-any"]
+
+    metadata_file = tmp_path / "plugins_metadata.json"
+    metadata_file.write_text(json.dumps({"aiida_compatibility": matrix}))
+    runner = CliRunner()
+    result = runner.invoke(cli, ["compatible", "2.1.2", "--metadata", metadata_file])
+    assert result.exit_code == 0, result.output
+    assert result.output.split() == ["aiida-any", "aiida-diff"]
+    result = runner.invoke(cli, ["compatible", "2.10", "--metadata", metadata_file])
+    assert result.exit_code == 0, result.output
+    assert result.output.split() == ["aiida-any", "aiida-diff", "aiida-old"]
+    result = runner.invoke(cli, ["compatible", "9.9", "--metadata", metadata_file])
+    assert result.exit_code == 1
+
+
+def test_make_matrix_no_releases():
+    """Test that the compatibility is unknown without the releases of aiida-core."""
+    plugins = {"aiida-diff": {"aiida_version": ">=2.0,<3"}}
+
+    assert make_matrix(plugins, get_release_versions(None)) is None
+    assert plugins["aiida-diff"]["aiida_compatibility"] is None
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Tests of the registry-wide index of entry points."""
+
+import yaml
+
+from aiida_registry import REPORTER, fetch_metadata
+from aiida_registry.entry_point_index import (
+    PrefixTrie,
+    build_index,
+    check_entry_points,
+)
+
+PLUGINS = {
+    "aiida-quantumespresso": {
+        "entry_point_prefix": "quantumespresso",
+        "entry_points": {
+            "aiida.calculations": {
+                "quantumespresso.pw": "aiida_quantumespresso.calculations.pw:PwCalculation",
+                "quantumespresso.hp.main": "aiida_quantumespresso.calculations:Hp",
+            },
+            "console_scripts": {"aiida-quantumespresso": "aiida_quantumespresso:cmd"},
+        },
+    },
+    "aiida-hubbard": {
+        "entry_point_prefix": "quantumespresso.hp",
+        "entry_points": {
+            "aiida.calculations": {"quantumespresso.hp.main": "aiida_hubbard:Hp"},
+        },
+    },
+    "aiida-gaussian": {
+        "entry_point_prefix": "gaussian",
+        "entry_points": {"aiida.parsers": {"gaussian.base": "aiida_gaussian:Parser"}},
+    },
+    "aiida-gaussian-datatypes": {"entry_point_prefix": "gaussian"},
+}
+
+
+def test_prefix_trie():
+    """Test that the owner of an entry point is its longest prefix, by segment."""
+    trie = PrefixTrie()
+    trie.add("quantumespresso", "aiida-quantumespresso")
+    trie.add("quantumespresso.hp", "aiida-hubbard")
+
+    assert trie.get_owners("quantumespresso.pw") == (
+        "quantumespresso",
+        ["aiida-quantumespresso"],
+    )
+    assert trie.get_owners("quantumespresso.hp.main") == (
+        "quantumespresso.hp",
+        ["aiida-hubbard"],
+    )
+    assert trie.get_owners("quantumespressoplus") == ("", [])
+
+
+def test_check_entry_points():
+    """Test the index and the warnings of collisions and of prefixes of other plugins."""
+    for plugin_name in PLUGINS:
+        REPORTER.plugin(plugin_name)
+    index = check_entry_points(PLUGINS)
+
+    assert index == build_index(PLUGINS)
+    assert "console_scripts" not in index
+    assert index["aiida.calculations"]["quantumespresso.hp.main"] == [
+        "aiida-hubbard",
+        "aiida-quantumespresso",
+    ]
+    warnings = REPORTER.plugins_warnings
+    assert len(warnings["aiida-quantumespresso"]) == 2
+    assert "W021" in warnings["aiida-quantumespresso"][0]
+    assert "W022" in warnings["aiida-quantumespresso"][1]
+    assert len(warnings["aiida-hubbard"]) == 1
+    assert "W021" in warnings["aiida-hubbard"][0]
+    assert len(warnings["aiida-gaussian"]) == 1
+    assert "aiida-gaussian-datatypes" in warnings["aiida-gaussian"][0]
+    assert "W022" in warnings["aiida-gaussian-datatypes"][0]
+
+
+def test_incremental_checks(monkeypatch, tmp_path):
+    """Test that the checks of the index are not carried over by unchanged records."""
+
+    def complete_plugin_data(plugin_data, previous=None, **_):
+        if previous is not None:
+            return fetch_metadata.get_previous_record(previous)
+        REPORTER.warn("plugin check", check_id="W002")
+        return {**plugin_data, "fingerprint": {}}
+
+    plugins_file = tmp_path / "plugins.yaml"
+    plugins_file.write_text(
+        yaml.safe_dump(
+            {
+                name: {**plugin, "code_home": f"https://example.com/{name}"}
+                for name, plugin in PLUGINS.items()
+            }
+        )
+    )
+    monkeypatch.setattr(fetch_metadata, "PLUGINS_FILE_ABS", plugins_file)
+    monkeypatch.setattr(fetch_metadata, "complete_plugin_data", complete_plugin_data)
+    monkeypatch.setattr(fetch_metadata, "update_live_data", lambda record, **_: None)
+    monkeypatch.setattr(fetch_metadata, "check_links", lambda urls: {})
+
+    previous = None
+    for _ in range(2):
+        monkeypatch.setattr(REPORTER, "plugins_warnings", {})
+        monkeypatch.setattr(REPORTER, "plugins_errors", {})
+        previous, index = fetch_metadata.fetch_metadata(previous=previous)
+        warnings = previous["aiida-hubbard"]["warnings"]
+        assert len(warnings) == 2
+        assert "W002" in warnings[0]
+        assert "W021" in warnings[1]
+        assert index == build_index(previous)
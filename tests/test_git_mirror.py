@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Tests of the mirrors of plugin repositories."""
+
+import os
+import subprocess
+from datetime import datetime, timedelta
+
+import pytest
+
+from aiida_registry import git_mirror
+
+
+@pytest.fixture
+def repository(tmp_path, monkeypatch):
+    """Return a function adding a commit to a local repository, and its URL."""
+    monkeypatch.setattr(git_mirror, "_mirror_dir", str(tmp_path / "mirrors"))
+    path = tmp_path / "aiida-diff"
+    subprocess.run(["git", "init", "-q", str(path)], check=True)
+
+    def commit(date: datetime):
+        env = {
+            **os.environ,
+            "GIT_AUTHOR_NAME": "AiiDA",
+            "GIT_AUTHOR_EMAIL": "aiida@localhost",
+            "GIT_COMMITTER_NAME": "AiiDA",
+            "GIT_COMMITTER_EMAIL": "aiida@localhost",
+            "GIT_AUTHOR_DATE": date.isoformat(),
+            "GIT_COMMITTER_DATE": date.isoformat(),
+        }
+        subprocess.run(
+            ["git", "commit", "-q", "--allow-empty", "-m", "commit"],
+            cwd=path,
+            env=env,
+            check=True,
+        )
+
+    # shallow clones are not supported for local paths
+    return commit, f"file://{path}"
+
+
+def test_commits_count(repository):
+    """Test counting commits, and updating the mirror."""
+    commit, url = repository
+    now = datetime.now()
+    commit(now - timedelta(days=800))
+    commit(now - timedelta(days=10))
+    commit(now - timedelta(days=5))
+
+    assert git_mirror.get_commits_count(url) == 2
+    assert os.path.isdir(git_mirror.get_mirror_path(url))
+
+    commit(now - timedelta(days=1))
+    assert git_mirror.get_commits_count(url) == 3
+
+
+def test_commits_count_no_recent_commit(repository):
+    """Test a repository without commits in the window."""
+    commit, url = repository
+    commit(datetime.now() - timedelta(days=800))
+
+    assert git_mirror.get_commits_count(url) == 0
+    # the mirror can be updated
+    assert git_mirror.get_commits_count(url) == 0
+
+
+def test_failed_clone(tmp_path, monkeypatch):
+    """Test that a failed clone leaves no mirror behind."""
+    monkeypatch.setattr(git_mirror, "_mirror_dir", str(tmp_path))
+
+    with pytest.raises(subprocess.CalledProcessError):
+        git_mirror.get_commits_count(f"file://{tmp_path}/missing")
+
+    assert not os.listdir(tmp_path)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Tests of collecting the commit activity of GitHub repositories."""
+
+import json
+import re
+import urllib.parse
+
+from aiida_registry.github import get_commits_counts
+
+REPOSITORIES = {
+    "https://github.com/aiidateam/aiida-diff": {
+        "defaultBranchRef": {"target": {"history": {"totalCount": 12}}}
+    },
+    # not found: null, with an error
+    "https://github.com/aiidateam/aiida-missing": None,
+    # empty repository
+    "https://github.com/aiidateam/aiida-empty": {"defaultBranchRef": None},
+}
+
+
+QUERIES = []
+
+
+def graphql(handler):
+    """Stand-in for the GitHub GraphQL API, answering commit count queries."""
+    query = json.loads(handler.rfile.read(int(handler.headers["Content-Length"])))
+    QUERIES.append(query["query"])
+    data, errors = {}, []
+    fields = re.findall(
+        r'(r\d+): repository\(owner: "(.*?)", name: "(.*?)"\)', query["query"]
+    )
+    for alias, owner, name in fields:
+        data[alias] = REPOSITORIES[f"https://github.com/{owner}/{name}"]
+        if data[alias] is None:
+            errors.append({"type": "NOT_FOUND", "path": [alias]})
+    return (
+        200,
+        {"Content-Type": "application/json"},
+        json.dumps({"data": data, "errors": errors}).encode(),
+    )
+
+
+def test_commits_counts(http_server):
+    """Test collecting commit counts in batches, with the REST API as fallback."""
+    http_server.routes["/graphql"] = (200, {}, graphql)
+    http_server.routes["/repos/aiidateam/aiida-missing/commits"] = (
+        200,
+        {"Link": '<https://api.github.com/repositories/1/commits?page=5>; rel="last"'},
+        b"[{}]",
+    )
+
+    counts = get_commits_counts(
+        REPOSITORIES,
+        "token",
+        endpoint=f"{http_server.url}/graphql",
+        rest_url=http_server.url,
+        batch_size=2,
+    )
+
+    assert counts == {
+        "https://github.com/aiidateam/aiida-diff": 12,
+        "https://github.com/aiidateam/aiida-missing": 5,
+        "https://github.com/aiidateam/aiida-empty": 0,
+    }
+    paths = [path.split("?")[0] for _, path, _ in http_server.requests]
+    assert paths.count("/graphql") == 2
+    assert paths.count("/repos/aiidateam/aiida-missing/commits") == 1
+    assert http_server.requests[0][2]["Authorization"] == "Bearer token"
+
+    # both APIs count the commits in the same window (until now)
+    rest_path = http_server.requests[-1][1]
+    params = urllib.parse.parse_qs(urllib.parse.urlparse(rest_path).query)
+    assert "until" not in params
+    assert re.findall(r'since: "(.*?)"', QUERIES[-1]) == params["since"]
+
+
+def test_commits_counts_graphql_unavailable(http_server):
+    """Test that all repositories are counted with the REST API if GraphQL fails."""
+    http_server.routes["/graphql"] = (401, {}, b"{}")
+
+    counts = get_commits_counts(
+        ["https://github.com/aiidateam/aiida-diff"],
+        None,
+        endpoint=f"{http_server.url}/graphql",
+        rest_url=http_server.url,
+    )
+
+    # the REST request fails as well
+    assert counts == {"https://github.com/aiidateam/aiida-diff": -1}
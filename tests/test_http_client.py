@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Tests of the asynchronous HTTP engine."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+
+from aiida_registry import REPORTER, fetch_metadata, http_client
+from aiida_registry import http_cache as http_cache_module
+from aiida_registry.metrics import METRICS
+from aiida_registry.utils import fetch_file, fetch_file_async
+
+
+def test_fetch_file(http_server):
+    """Test the synchronous wrapper around the engine."""
+    http_server.routes["/setup.json"] = (200, {}, b'{"name": "aiida-diff"}')
+
+    assert fetch_file(f"{http_server.url}/setup.json") == '{"name": "aiida-diff"}'
+    assert fetch_file(f"{http_server.url}/missing.json", warn=False) is None
+
+
+def test_fetch_file_error_reported(http_server, monkeypatch):
+    """Test that errors of coroutines are reported for the plugin of the calling thread."""
+    monkeypatch.setattr(REPORTER, "plugins_warnings", {})
+    monkeypatch.setattr(REPORTER, "plugins_errors", {})
+    REPORTER.set_plugin_name("aiida-test")
+
+    assert fetch_file(f"{http_server.url}/missing.json") is None
+    assert "E004" in REPORTER.plugins_errors["aiida-test"][0]
+    REPORTER.set_plugin_name(None)
+
+
+def test_concurrent(http_server):
+    """Test that requests are multiplexed on the event loop."""
+    http_server.routes["/slow"] = (200, {}, b"ok")
+    http_server.delay = 0.2
+
+    async def fetch_all():
+        return await asyncio.gather(
+            *(fetch_file_async(f"{http_server.url}/slow") for _ in range(8))
+        )
+
+    start = time.perf_counter()
+    results = http_client.run(fetch_all())
+    assert results == ["ok"] * 8
+    # with 4 connections per host, 8 requests need two round trips
+    assert time.perf_counter() - start < 8 * 0.2
+
+
+def test_other_event_loop(http_server):
+    """Test awaiting the coroutines from an event loop other than the engine's."""
+    http_server.routes["/file"] = (200, {}, b"content")
+
+    assert asyncio.run(fetch_file_async(f"{http_server.url}/file")) == "content"
+
+
+def test_retry(http_server, monkeypatch):
+    """Test that 5xx responses are retried."""
+    statuses = [503, 502, 200]
+
+    def flaky(_handler):
+        return statuses.pop(0), {}, b"ok"
+
+    http_server.routes["/flaky"] = (200, {}, flaky)
+    monkeypatch.setattr(
+        http_client.HTTP_ENGINE, "retry_policy", http_client.RetryPolicy(backoff=0.01)
+    )
+
+    assert fetch_file(f"{http_server.url}/flaky") == "ok"
+    assert not statuses
+
+
+def test_circuit_breaker(http_server, monkeypatch):
+    """Test that a dead host fails fast once its circuit breaker is open."""
+    monkeypatch.setattr(
+        http_client.HTTP_ENGINE, "retry_policy", http_client.RetryPolicy(backoff=0.01)
+    )
+    http_client.HTTP_ENGINE.reset_breakers()
+    url = f"{http_server.url}/file"
+    http_server.shutdown()
+    http_server.server_close()
+
+    with pytest.raises(aiohttp.ClientConnectionError):
+        http_client.run(http_client.get(url))
+    with pytest.raises(http_client.CircuitOpenError):
+        http_client.run(http_client.get(url))
+    http_client.HTTP_ENGINE.reset_breakers()
+
+
+def test_circuit_open_code_home():
+    """Test that an open circuit breaker is reported for the plugin, without raising."""
+    url = "https://github.com/aiidateam/aiida-diff"
+    breaker = http_client.HTTP_ENGINE.breaker(url)
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    try:
+        with REPORTER.plugin("aiida-diff") as report:
+            assert fetch_metadata.get_hosted_on(url) == "github.com"
+    finally:
+        http_client.HTTP_ENGINE.reset_breakers()
+
+    assert len(report.errors) == 1
+    assert "E005" in report.errors[0]
+    assert "CircuitOpenError" in report.errors[0]
+
+
+@pytest.fixture
+def http_cache(tmp_path):
+    """Enable the on-disk cache of the shared engine."""
+    cache = http_client.HTTP_ENGINE.enable_cache(tmp_path / "cache")
+    yield cache
+    http_client.HTTP_ENGINE.disable_cache()
+
+
+def test_cache_revalidation(http_server, http_cache, monkeypatch):
+    """Test that expired responses are revalidated with their ETag."""
+
+    def pypi_json(handler):
+        if handler.headers.get("If-None-Match") == '"v1"':
+            return 304, {}, b""
+        return 200, {"ETag": '"v1"'}, b'{"info": {}}'
+
+    http_server.routes["/pypi/aiida-diff/json"] = (200, {}, pypi_json)
+    url = f"{http_server.url}/pypi/aiida-diff/json"
+
+    assert fetch_file(url) == '{"info": {}}'
+    assert fetch_file(url) == '{"info": {}}'
+    assert (http_cache.stats.misses, http_cache.stats.hits) == (1, 1)
+    assert len(http_server.requests) == 1
+
+    # expire all entries
+    later = time.time() + 1e9
+    monkeypatch.setattr(http_cache_module, "time", SimpleNamespace(time=lambda: later))
+    METRICS.reset()
+    assert fetch_file(url) == '{"info": {}}'
+    assert http_cache.stats.revalidated == 1
+    assert http_server.requests[-1][2]["If-None-Match"] == '"v1"'
+
+    # the 304 round trip is a request, without body
+    text = METRICS.render()
+    METRICS.reset()
+    host = http_server.url.split("//")[1]
+    assert (
+        f'aiida_registry_http_requests_total{{host="{host}",method="GET",status="304"}} 1'
+        in text
+    )
+    assert (
+        f'aiida_registry_http_request_duration_seconds_count{{host="{host}"}} 1' in text
+    )
+    assert f'aiida_registry_http_downloaded_bytes_total{{host="{host}"}} 0' in text
+
+
+def test_cache_eviction(http_server, http_cache):
+    """Test that least recently used entries are evicted beyond the size limit."""
+    for name in "abc":
+        http_server.routes[f"/{name}"] = (200, {}, name.encode() * 100)
+    http_cache.max_size = 250
+
+    for name in "abca":
+        fetch_file(f"{http_server.url}/{name}")
+
+    assert http_cache.stats.evicted == 2
+    assert http_cache.size <= 250
+    assert [path for _, path, _ in http_server.requests] == ["/a", "/b", "/c", "/a"]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Test the startup cost of the CLI (see ``python -X importtime``)."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+from click.testing import CliRunner
+
+from aiida_registry.cli import cli
+
+# Dependencies that must only be imported by the commands that need them
+HEAVY_MODULES = (
+    "aiohttp",
+    "docker",
+    "jinja2",
+    "packaging",
+    "poetry",
+    "requirements",
+    "tomlkit",
+    "yaml",
+)
+# Budget of the cumulative import time of the CLI module (seconds), only checked if
+# AIIDA_REGISTRY_BENCHMARKS is set: the wall time depends on the machine and its load
+IMPORT_BUDGET = 0.2
+
+
+def get_import_times(module: str) -> dict:
+    """Return the cumulative import time (seconds) of all modules imported by ``module``."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_import_time():
+    """Test that the CLI does not import heavy dependencies."""
+    heavy = [
+        name
+        for name in get_import_times("aiida_registry.cli")
+        if name.split(".")[0] in HEAVY_MODULES
+    ]
+    assert not heavy
+
+
+@pytest.mark.skipif(
+    not os.environ.get("AIIDA_REGISTRY_BENCHMARKS"),
+    reason="timing benchmark, set AIIDA_REGISTRY_BENCHMARKS to run",
+)
+def test_import_time_budget():
+    """Test that the CLI is imported within the time budget (best of 3 runs)."""
+    runs = [get_import_times("aiida_registry.cli") for _ in range(3)]
+    assert min(times["aiida_registry.cli"] for times in runs) < IMPORT_BUDGET
+
+
+def test_help():
+    """Test that the help of all commands can be shown."""
+    runner = CliRunner()
+    for args in (
+        [],
+        ["fetch"],
+        ["benchmark"],
+        ["benchmark-parsers"],
+        ["compatible"],
+        ["shard"],
+        ["test-install"],
+        ["stores"],
+    ):
+        result = runner.invoke(cli, [*args, "--help"])
+        assert result.exit_code == 0, result.output
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Tests of checking the links of the registry."""
+
+from aiida_registry import REPORTER
+from aiida_registry.fetch_metadata import (
+    fetch_build_file,
+    get_hosted_on,
+    validate_doc_url,
+)
+from aiida_registry.link_check import check_links, collect_links
+
+
+def test_collect_links():
+    """Test that the URLs used by the fetch are gathered, without duplicates."""
+    plugins = [
+        {
+            "code_home": "https://github.com/aiidateam/aiida-diff",
+            "documentation_url": "https://aiida-diff.readthedocs.io/",
+            "plugin_info": "https://raw.github.com/aiidateam/aiida-diff/main/setup.json",
+            "pip_url": "aiida-diff",
+        },
+        {
+            "code_home": "https://github.com/aiidateam/aiida-diff",
+            "pip_url": "https://github.com/aiidateam/aiida-diff/archive/main.zip",
+        },
+    ]
+
+    assert collect_links(plugins) == [
+        "https://github.com/aiidateam/aiida-diff",
+        "https://aiida-diff.readthedocs.io/",
+        "https://raw.github.com/aiidateam/aiida-diff/main/setup.json",
+    ]
+
+
+def test_check_links(http_server):
+    """Test checking links with HEAD, and a ranged GET as fallback."""
+
+    def no_head(handler):
+        if handler.command == "HEAD":
+            return 405, {}, b""
+        return 200, {}, b"<html>" + b" " * 100_000
+
+    http_server.routes["/docs"] = (200, {}, b"<html></html>")
+    http_server.routes["/no-head"] = (200, {}, no_head)
+    urls = [f"{http_server.url}/{path}" for path in ("docs", "no-head", "missing")]
+
+    links = check_links(urls + urls)
+
+    assert [links[url].ok for url in urls] == [True, True, False]
+    # only the first byte of the page without HEAD is downloaded
+    assert http_server.bytes_sent < 100
+
+
+def test_link_diagnostics(http_server, monkeypatch):
+    """Test the diagnostics of unreachable links."""
+    monkeypatch.setattr(REPORTER, "plugins_warnings", {})
+    monkeypatch.setattr(REPORTER, "plugins_errors", {})
+    REPORTER.set_plugin_name("aiida-test")
+    url = f"{http_server.url}/missing"
+    links = check_links([url, "http://127.0.0.1:1/code"])
+
+    validate_doc_url(url, links[url])
+    assert "W008" in REPORTER.plugins_warnings["aiida-test"][0]
+
+    # an HTTP error does not prevent identifying the host, and no response is reported
+    assert get_hosted_on(url, links[url]) == "0.1"
+    assert not REPORTER.plugins_errors["aiida-test"]
+    assert (
+        get_hosted_on("http://127.0.0.1:1/code", links["http://127.0.0.1:1/code"])
+        == "0.1"
+    )
+    assert "E005" in REPORTER.plugins_errors["aiida-test"][0]
+    REPORTER.set_plugin_name(None)
+
+
+def test_dead_build_file(http_server, monkeypatch):
+    """Test that a build file known to be unreachable is not requested."""
+    monkeypatch.setattr(REPORTER, "plugins_errors", {})
+    url = f"{http_server.url}/setup.json"
+    links = check_links([url])
+    requests = len(http_server.requests)
+
+    with REPORTER.plugin("aiida-test") as report:
+        assert fetch_build_file(url, links[url]) is None
+    assert len(http_server.requests) == requests
+    assert "E004" in report.errors[0]
+    assert "HTTP status 404" in report.errors[0]
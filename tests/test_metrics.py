@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Tests of the metrics textfile."""
+
+import pytest
+
+from aiida_registry import REPORTER
+from aiida_registry.metrics import METRICS, record_run
+from aiida_registry.utils import fetch_file
+
+
+@pytest.fixture
+def metrics():
+    """Return the metrics, reset before and after the test."""
+    METRICS.reset()
+    yield METRICS
+    METRICS.reset()
+
+
+def test_http_metrics(http_server, metrics):
+    """Test that requests are counted and timed by host."""
+    http_server.routes["/setup.json"] = (200, {}, b'{"name": "aiida-diff"}')
+    host = http_server.url.split("//")[1]
+
+    fetch_file(f"{http_server.url}/setup.json")
+    fetch_file(f"{http_server.url}/setup.json")
+
+    text = metrics.render()
+    assert (
+        f'aiida_registry_http_requests_total{{host="{host}",method="GET",status="200"}} 2'
+        in text
+    )
+    assert f'aiida_registry_http_downloaded_bytes_total{{host="{host}"}} 44' in text
+    assert (
+        f'aiida_registry_http_request_duration_seconds_count{{host="{host}"}} 2' in text
+    )
+    assert (
+        f'aiida_registry_http_request_duration_seconds_bucket{{host="{host}",le="+Inf"}} 2'
+        in text
+    )
+    assert "# TYPE aiida_registry_http_request_duration_seconds histogram" in text
+
+
+def test_write(metrics, tmp_path):
+    """Test writing the metrics of a run, with the checks reported."""
+    with REPORTER.plugin("aiida-diff") as report:
+        report.warn("No wheel", check_id="W019")
+    metrics.inc("http_cache_requests_total", 3, result="hit")
+    metrics.inc("http_cache_requests_total", result="miss")
+    path = tmp_path / "aiida_registry.prom"
+
+    record_run("fetch", 12.5)
+    metrics.write(path)
+
+    text = path.read_text()
+    assert 'aiida_registry_run_duration_seconds{command="fetch"} 12.5' in text
+    assert "aiida_registry_http_cache_hit_ratio 0.75" in text
+    assert 'aiida_registry_checks_total{check_id="W019",level="warning"} 1' in text
+    assert text.endswith("\n")
+    assert not list(tmp_path.glob("*.tmp"))
+
+    with pytest.raises(KeyError):
+        metrics.inc("unknown_total")
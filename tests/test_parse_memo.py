@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Tests of the memo of the results of parsing build files."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from aiida_registry import REPORTER, parse_build_file, parse_memo
+
+TEST_PATH = Path(__file__).parent / "static"
+
+
+@pytest.fixture
+def memo(tmp_path):
+    """Enable the memo in a temporary directory."""
+    yield parse_memo.enable_memo(tmp_path)
+    parse_memo.disable_memo()
+
+
+def test_parse_once(memo, monkeypatch):
+    """Test that a build file is only parsed if its result is not in the memo."""
+    content = (TEST_PATH / "setup.json").read_text()
+    calls = []
+    load_build_file = parse_build_file.load_build_file
+    monkeypatch.setattr(
+        parse_build_file,
+        "load_build_file",
+        lambda *args: calls.append(args) or load_build_file(*args),
+    )
+
+    expected = parse_build_file.parse_build_file("setup.json", content)
+    assert expected[0] == "SETUPTOOLS_JSON"
+    result = parse_build_file.parse_build_file("setup.json", content)
+    # the memoized result is exactly the parsed one, in the same order
+    assert json.dumps(result[1].as_dict()) == json.dumps(expected[1].as_dict())
+    assert len(calls) == 1
+
+    # only the entry points, or another content, are parsed again
+    parse_build_file.parse_build_file("setup.json", content, ep_only=True)
+    parse_build_file.parse_build_file("setup.json", content + " ")
+    assert len(calls) == 3
+    assert memo.stats()["parses"] == 3
+    assert memo.stats()["hits"] == 1
+
+
+def test_replay_warnings(memo):
+    """Test that the warnings of a memoized parse are reported again."""
+    content = '[tool.other]\nname = "aiida-diff"\n'
+    for plugin in ("first", "second"):
+        with REPORTER.plugin(plugin) as reporter:
+            assert parse_build_file.parse_build_file("pyproject.toml", content) == (
+                None,
+                parse_build_file.SourceData(),
+            )
+        assert len(reporter.warnings) == 1
+        assert "W012" in reporter.warnings[0]
+    assert memo.stats() | {"size": 0} == {
+        "parses": 1,
+        "size": 0,
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5,
+    }
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Tests of pacing requests according to rate limits."""
+
+import time
+
+import pytest
+
+from aiida_registry import http_client
+from aiida_registry.rate_limit import RateLimiter
+
+
+@pytest.fixture
+def rate_limiter(monkeypatch):
+    """Use a new rate limiter, and quick retries."""
+    limiter = RateLimiter()
+    monkeypatch.setattr(http_client.HTTP_ENGINE, "rate_limiter", limiter)
+    monkeypatch.setattr(
+        http_client.HTTP_ENGINE, "retry_policy", http_client.RetryPolicy(backoff=0.01)
+    )
+    return limiter
+
+
+def responses(*statuses_headers):
+    """Return a route handler answering with the given statuses and headers in turn."""
+    remaining = list(statuses_headers)
+
+    def handler(_handler):
+        status, headers = remaining.pop(0)
+        return status, headers, b"[]"
+
+    return handler
+
+
+@pytest.mark.parametrize(
+    "status, headers",
+    [
+        (429, {"Retry-After": "1"}),
+        (403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "{reset}"}),
+    ],
+)
+def test_wait_for_reset(http_server, rate_limiter, status, headers):  # pylint: disable=unused-argument
+    """Test that a request rejected because of the rate limit is sent again after the reset."""
+    headers = {
+        key: value.format(reset=int(time.time()) + 2) for key, value in headers.items()
+    }
+    http_server.routes["/commits"] = (200, {}, responses((status, headers), (200, {})))
+
+    start = time.time()
+    response = http_client.run(http_client.get(f"{http_server.url}/commits"))
+
+    assert response.status == 200
+    assert time.time() - start > 0.5
+
+
+def test_reset_too_late(http_server, rate_limiter):
+    """Test that requests do not wait for a reset later than the maximum wait."""
+    rate_limiter.max_wait = 1
+    http_server.routes["/commits"] = (429, {"Retry-After": "3600"}, b"[]")
+
+    start = time.time()
+    response = http_client.run(http_client.get(f"{http_server.url}/commits"))
+
+    assert response.status == 429
+    assert time.time() - start < 1
+
+
+def test_pacing():
+    """Test that the remaining requests are spread until the reset, per token."""
+    limiter = RateLimiter(pacing_threshold=10)
+    key = limiter.key("https://api.github.com/graphql", {"Authorization": "Bearer 1"})
+    headers = {"X-RateLimit-Remaining": "2", "X-RateLimit-Reset": str(time.time() + 10)}
+
+    assert limiter.update(key, 200, headers) is None
+    assert limiter.delay(key) == 0
+    assert limiter.delay(key) == pytest.approx(5, abs=0.1)
+    # quota exhausted: wait for the reset
+    assert limiter.delay(key) == pytest.approx(10, abs=0.1)
+    # other tokens have their own quota
+    assert limiter.delay(limiter.key("https://api.github.com/graphql")) == 0
+    # and so do the other resources of the API
+    rest_key = limiter.key(
+        "https://api.github.com/repos/aiidateam/aiida-diff/commits",
+        {"Authorization": "Bearer 1"},
+    )
+    assert rest_key != key
+    assert limiter.delay(rest_key) == 0
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Tests of reading wheels with HTTP range requests."""
+
+import hashlib
+import io
+import os
+import zipfile
+
+import aiohttp
+import pytest
+
+from aiida_registry import http_client, remote_zip
+from aiida_registry.parse_pypi import get_pypi_metadata, read_wheel_async
+
+ENTRY_POINTS = "[aiida.calculations]\ndiff = aiida_diff.calculations:DiffCalculation\n"
+
+
+@pytest.fixture
+def wheel():
+    """Return a wheel bundling a large (incompressible) data file."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as whl:
+        whl.writestr("aiida_diff/data.bin", os.urandom(1024 * 1024))
+        whl.writestr("aiida_diff-2.0.0.dist-info/entry_points.txt", ENTRY_POINTS)
+        whl.writestr("aiida_diff-2.0.0.dist-info/METADATA", "Name: aiida-diff\n")
+    return buffer.getvalue()
+
+
+WHEEL_NAME = "aiida_diff-2.0.0-py3-none-any.whl"
+
+
+@pytest.mark.parametrize("accept_ranges", [True, False])
+def test_wheel_entry_points(http_server, wheel, accept_ranges):
+    """Test that only the end of the wheel is downloaded if ranges are supported."""
+    http_server.routes[f"/{WHEEL_NAME}"] = (200, {}, wheel)
+    http_server.accept_ranges = accept_ranges
+
+    entry_points, _ = http_client.run(
+        read_wheel_async(f"{http_server.url}/{WHEEL_NAME}", read_metadata=False)
+    )
+
+    assert entry_points == {
+        "aiida.calculations": {"diff": "aiida_diff.calculations:DiffCalculation"}
+    }
+    if accept_ranges:
+        assert http_server.bytes_sent < 100 * 1024
+    else:
+        assert http_server.bytes_sent == len(wheel)
+
+
+def test_wheel_max_size(http_server, wheel, monkeypatch):
+    """Test that a wheel larger than the maximum size is not downloaded whole."""
+    http_server.routes[f"/{WHEEL_NAME}"] = (200, {}, wheel)
+    http_server.accept_ranges = False
+    monkeypatch.setattr(remote_zip, "_max_size", 64 * 1024)
+
+    with pytest.raises(http_client.ContentTooLarge):
+        http_client.run(
+            read_wheel_async(f"{http_server.url}/{WHEEL_NAME}", read_metadata=False)
+        )
+
+
+def test_wheel_member_before_tail(http_server):
+    """Test fetching a member that is not covered by the first range request."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as whl:
+        whl.writestr("aiida_diff-2.0.0.dist-info/entry_points.txt", ENTRY_POINTS)
+        whl.writestr("aiida_diff/data.bin", os.urandom(1024 * 1024))
+    http_server.routes["/aiida_diff.whl"] = (200, {}, buffer.getvalue())
+
+    entry_points, _ = http_client.run(
+        read_wheel_async(f"{http_server.url}/aiida_diff.whl", read_metadata=False)
+    )
+
+    assert "aiida.calculations" in entry_points
+    assert len(http_server.requests) == 2
+
+
+def _pypi_data(wheel_url, **wheel_data):
+    """Return minimal PyPI JSON data of a project with a single wheel."""
+    urls = [{"packagetype": "bdist_wheel", "url": wheel_url, **wheel_data}]
+    return {
+        "info": {
+            "version": "2.0.0",
+            "classifiers": ["Framework :: AiiDA"],
+            "requires_dist": ["aiida-core>=1.0"],
+        },
+        "releases": {"2.0.0": [{"upload_time": "2023-01-01T00:00:00"}]},
+        "urls": urls,
+    }
+
+
+@pytest.mark.parametrize("valid_hash", [True, False])
+def test_core_metadata(http_server, wheel, valid_hash):
+    """Test that the core metadata file is preferred over the project JSON."""
+    core_metadata = (
+        b"Metadata-Version: 2.1\nName: aiida-diff\nVersion: 2.0.0\n"
+        b"Classifier: Framework :: AiiDA\nClassifier: Topic :: Scientific/Engineering\n"
+        b"Requires-Dist: aiida-core (>=2.0,<3)\n"
+    )
+    http_server.routes["/aiida_diff.whl"] = (200, {}, wheel)
+    http_server.routes["/aiida_diff.whl.metadata"] = (200, {}, core_metadata)
+    digest = hashlib.sha256(core_metadata if valid_hash else b"").hexdigest()
+    pypi_data = _pypi_data(
+        f"{http_server.url}/aiida_diff.whl", **{"core-metadata": {"sha256": digest}}
+    )
+
+    pypi_metadata = get_pypi_metadata("aiida-diff", pypi_data=pypi_data)
+
+    assert "aiida.calculations" in pypi_metadata.entry_points
+    if valid_hash:
+        assert pypi_metadata.aiida_version == ">=2.0,<3"
+        assert len(pypi_metadata.metadata["classifiers"]) == 2
+    else:
+        assert pypi_metadata.aiida_version == ">=1.0"
+        assert len(pypi_metadata.metadata["classifiers"]) == 1
+
+
+def test_core_metadata_not_advertised(http_server, wheel):
+    """Test that no core metadata is requested if PyPI says it is not available."""
+    http_server.routes["/aiida_diff.whl"] = (200, {}, wheel)
+    pypi_data = _pypi_data(
+        f"{http_server.url}/aiida_diff.whl", **{"core-metadata": False}
+    )
+
+    pypi_metadata = get_pypi_metadata(
+        "aiida-diff", pypi_data=pypi_data, parse_wheel=False
+    )
+
+    assert pypi_metadata.aiida_version == ">=1.0"
+    assert pypi_metadata.entry_points is None
+    assert not http_server.requests
+
+
+def test_core_metadata_disconnected(http_server, wheel, monkeypatch):
+    """Test that a dropped connection on the core metadata falls back to the wheel."""
+    http_server.routes["/aiida_diff.whl"] = (200, {}, wheel)
+    get = http_client.get
+
+    async def disconnected_get(url, **kwargs):
+        if url.endswith(".metadata"):
+            raise aiohttp.ServerDisconnectedError()
+        return await get(url, **kwargs)
+
+    monkeypatch.setattr(http_client, "get", disconnected_get)
+    pypi_data = _pypi_data(f"{http_server.url}/aiida_diff.whl")
+
+    pypi_metadata = get_pypi_metadata("aiida-diff", pypi_data=pypi_data)
+
+    assert pypi_metadata.aiida_version == ">=1.0"
+    assert "aiida.calculations" in pypi_metadata.entry_points
+    # the data may be complete next time
+    assert not pypi_metadata.complete
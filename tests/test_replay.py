@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Tests of the record and replay of HTTP responses."""
+
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from aiida_registry import PLUGINS_METADATA, git_mirror, http_client
+from aiida_registry import make_pages as make_pages_module
+from aiida_registry.benchmark import benchmark_fetch, recording, replaying
+from aiida_registry.cli import cli
+from aiida_registry.replay import original_url, wire_url
+
+
+def test_wire_url():
+    """Test the URLs of the requests sent to the replay server."""
+    url = "https://pypi.org/pypi/aiida-diff/json?a=1"
+    wire = wire_url(url, ("127.0.0.1", 8000))
+    assert wire == "http://pypi.org:8000/https/pypi.org/pypi/aiida-diff/json?a=1"
+    assert original_url(wire.split(":8000")[1]) == url
+
+
+def test_record_replay(http_server, tmp_path):
+    """Test that recorded responses are replayed without the original server."""
+    http_server.routes["/setup.json"] = (
+        200,
+        {"X-Test": "1"},
+        b'{"name": "aiida-diff"}',
+    )
+    http_server.routes["/wheel"] = (200, {}, b"0123456789")
+    http_server.routes["/graphql"] = (200, {}, b'{"data": {}}')
+
+    def run():
+        return [
+            http_client.run(http_client.get(f"{http_server.url}/setup.json")),
+            http_client.run(
+                http_client.get(
+                    f"{http_server.url}/wheel", headers={"Range": "bytes=2-4"}
+                )
+            ),
+            http_client.run(http_client.post(f"{http_server.url}/graphql", data=b"{}")),
+        ]
+
+    with recording(tmp_path):
+        recorded = run()
+    http_server.routes.clear()
+
+    with replaying(tmp_path) as server:
+        replayed = run()
+        missing = http_client.run(http_client.get(f"{http_server.url}/other"))
+
+    for expected, response in zip(recorded, replayed):
+        assert response.status == expected.status
+        assert response.content == expected.content
+        assert response.url == expected.url
+    assert replayed[0].headers["X-Test"] == "1"
+    assert replayed[1].content == b"234"
+    assert missing.status == 404
+    assert server.requests == 4
+    assert server.missing == [f"{http_server.url}/other"]
+
+
+def test_benchmark(http_server, tmp_path):
+    """Test timing runs replayed with latency."""
+    http_server.routes["/setup.json"] = (200, {}, b'{"name": "aiida-diff"}')
+
+    def run():
+        http_client.run(http_client.get(f"{http_server.url}/setup.json"))
+
+    with recording(tmp_path):
+        run()
+    results = benchmark_fetch(tmp_path, run, repeat=2, latency=0.2)
+
+    assert len(results["wall_time"]) == 2
+    assert min(results["wall_time"]) >= 0.2
+    assert results["requests"] == [1, 1]
+    assert not results["missing"]
+    assert results["peak_rss"] > 0
+
+
+def test_offline_mirror(tmp_path):
+    """Test that missing mirrors are not cloned in offline mode."""
+    git_mirror.set_mirror_dir(tmp_path)
+    git_mirror.set_offline(True)
+    try:
+        start = time.time()
+        with pytest.raises(FileNotFoundError):
+            git_mirror.get_commits_count("https://github.com/aiidateam/aiida-diff")
+        assert time.time() - start < 1
+    finally:
+        git_mirror.set_offline(False)
+        git_mirror.set_mirror_dir(git_mirror.MIRROR_DIR)
+
+
+def test_benchmark_output(tmp_path, monkeypatch):
+    """Test that the benchmark command does not overwrite the metadata of the plugins."""
+    outputs = []
+
+    def make_pages(package=None, jobs=1, output=PLUGINS_METADATA):
+        with open(output, "w", encoding="utf8") as handle:
+            handle.write("{}")
+        outputs.append(output)
+
+    monkeypatch.setattr(make_pages_module, "make_pages", make_pages)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "corpus").mkdir()
+
+    result = CliRunner().invoke(cli, ["benchmark", "corpus", "--repeat", "2"])
+
+    assert result.exit_code == 0, result.output
+    assert len(outputs) == 2
+    assert not (tmp_path / PLUGINS_METADATA).exists()
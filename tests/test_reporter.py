@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Tests of the reporter of warnings and errors."""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from aiida_registry import Reporter
+
+
+@pytest.fixture
+def reporter():
+    """Return a new reporter."""
+    reporter = Reporter()
+    yield reporter
+    reporter.close()
+
+
+def test_plugin_handle(reporter):
+    """Test reporting through a handle, and through the current context."""
+    handle = reporter.plugin("aiida-diff")
+    handle.warn("explicit", check_id="W002")
+    with reporter.plugin("aiida-other"):
+        reporter.error("current context")
+        handle.warn("still explicit")
+    reporter.warn("no plugin")
+
+    assert len(reporter.plugins_warnings["aiida-diff"]) == 2
+    assert "W002" in reporter.plugins_warnings["aiida-diff"][0]
+    assert reporter.plugins_errors["aiida-other"] == ["current context"]
+    assert reporter.plugin_name is None
+    assert reporter.warnings == ["no plugin"]
+
+
+def test_concurrent_plugins(reporter):
+    """Test that messages of plugins processed in threads are not mixed."""
+
+    def process(name):
+        with reporter.plugin(name) as report:
+            for index in range(100):
+                reporter.warn(f"{name} {index}")
+        return report.warnings
+
+    names = [f"aiida-{index}" for index in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(process, names))
+
+    for name, warnings in zip(names, results):
+        assert len(warnings) == 100
+        assert all(message.startswith(f"{name} ") for message in warnings)
+        assert all(
+            message.startswith(f"{name} ")
+            for message in reporter.plugins_warnings[name]
+        )
+
+
+def test_log_file_and_quiet(reporter, tmp_path, capsys):
+    """Test the JSON-lines log file, and that quiet mode prints nothing."""
+    log_file = tmp_path / "registry.jsonl"
+    reporter.configure(quiet=True, log_file=log_file)
+
+    with reporter.plugin("aiida-diff"):
+        reporter.debug("details")
+        reporter.warn("missing", check_id="W002")
+    reporter.close()
+
+    assert capsys.readouterr().out == ""
+    records = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [record["level"] for record in records] == ["debug", "warning"]
+    assert records[1]["plugin"] == "aiida-diff"
+    assert records[1]["check_id"] == "W002"
+    assert records[1]["message"] == "missing"
+
+
+def test_level(reporter, capsys):
+    """Test that only messages of at least the configured level are printed."""
+    reporter.configure(level="warning")
+
+    reporter.info("progress")
+    reporter.warn("problem")
+
+    assert capsys.readouterr().out == "problem\n"
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Tests of the sharded output."""
+
+import json
+
+from click.testing import CliRunner
+
+from aiida_registry.cli import cli
+
+ALL_DATA = {
+    "plugins": {
+        "aiida-diff": {
+            "name": "aiida-diff",
+            "development_status": "stable",
+            "aiida_version": ">=2.0,<3",
+            "summaryinfo": [{"colorclass": "blue", "text": "Calculations", "count": 1}],
+            "metadata": {
+                "description": "Compare two files",
+                "release_date": "2024-01-01",
+                "author": "The AiiDA team",
+            },
+            "entry_points": {"aiida.calculations": {"diff": {"class": "DiffCalc"}}},
+            "warnings": ["W003: Missing classifier"],
+        },
+    },
+    "globalsummary": [],
+    "entry_point_index": {"aiida.calculations": {"diff": ["aiida-diff"]}},
+}
+
+
+def test_shard(tmp_path):
+    """Test the index, the detail files and their update."""
+    metadata_file = tmp_path / "plugins_metadata.json"
+    shard_dir = tmp_path / "shards"
+    runner = CliRunner()
+
+    details = []
+    (shard_dir / "plugins").mkdir(parents=True)
+    (shard_dir / "plugins" / "aiida-diff-0.json.tmp").write_text("{")
+    for description in ("Compare two files", "Compare files", "Compare"):
+        ALL_DATA["plugins"]["aiida-diff"]["metadata"]["description"] = description
+        metadata_file.write_text(json.dumps(ALL_DATA))
+        result = runner.invoke(
+            cli, ["shard", str(shard_dir), "--metadata", str(metadata_file)]
+        )
+        assert result.exit_code == 0, result.output
+
+        index = json.loads((shard_dir / "index.json").read_text())
+        plugin = index["plugins"]["aiida-diff"]
+        assert "entry_points" not in plugin
+        assert "warnings" not in plugin
+        assert plugin["metadata"] == {
+            "description": description,
+            "release_date": "2024-01-01",
+        }
+        assert index["globalsummary"] == []
+        assert "entry_point_index" not in index
+        assert (
+            json.loads((shard_dir / plugin["detail"]).read_text())
+            == (ALL_DATA["plugins"]["aiida-diff"])
+        )
+        details.append(plugin["detail"].split("/")[1])
+
+    # the detail file changed with its content; the one of the previous index is kept,
+    # older ones (and any partial file of an interrupted run) are removed
+    assert len(set(details)) == 3
+    assert sorted(path.name for path in (shard_dir / "plugins").iterdir()) == sorted(
+        details[1:]
+    )
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Tests of the timing trace."""
+
+import json
+
+from aiida_registry import REPORTER
+from aiida_registry.trace import TRACER
+from aiida_registry.utils import fetch_file
+
+
+def test_trace(http_server, tmp_path):
+    """Test that stages and requests are recorded on the tracks of plugins and hosts."""
+    http_server.routes["/setup.json"] = (200, {}, b'{"name": "aiida-diff"}')
+    trace_file = tmp_path / "trace.json"
+
+    TRACER.start(trace_file)
+    try:
+        with REPORTER.plugin("aiida-diff"), TRACER.span("fetch_build_file") as span:
+            fetch_file(f"{http_server.url}/setup.json")
+            span["custom"] = 1
+    finally:
+        TRACER.stop()
+
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    tracks = {
+        event["args"]["name"]: event["tid"] for event in events if event["ph"] == "M"
+    }
+    (stage,) = [event for event in events if event["ph"] == "X"]
+    assert stage["name"] == "fetch_build_file"
+    assert stage["tid"] == tracks["aiida-diff"]
+    assert stage["args"] == {"plugin": "aiida-diff", "custom": 1}
+
+    begin, end = [event for event in events if event.get("cat") == "http"]
+    host = http_server.url.split("//")[1]
+    assert begin["tid"] == end["tid"] == tracks[host]
+    assert begin["args"]["plugin"] == "aiida-diff"
+    assert begin["args"]["status"] == 200
+    assert begin["args"]["bytes"] == 22
+    assert begin["ts"] <= end["ts"] <= stage["ts"] + stage["dur"]
+
+
+def test_disabled():
+    """Test that spans are not recorded when tracing is disabled."""
+    with TRACER.span("stage") as span:
+        span["custom"] = 1
+
+    assert not TRACER.enabled
+    assert not TRACER._events  # pylint: disable=protected-access
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Tests of the store of the data read from wheels."""
+
+import io
+import json
+import os
+import zipfile
+
+import pytest
+from click.testing import CliRunner
+
+from aiida_registry import wheel_store
+from aiida_registry.cli import cli
+from aiida_registry.parse_memo import ParseMemo
+from aiida_registry.parse_pypi import get_pypi_metadata
+
+ENTRY_POINTS = "[aiida.calculations]\ndiff = aiida_diff.calculations:DiffCalculation\n"
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Enable the wheel store in a temporary directory."""
+    yield wheel_store.enable_store(tmp_path)
+    wheel_store.disable_store()
+
+
+def test_wheel_read_once(http_server, store):
+    """Test that a wheel is only read if its data is not in the store."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as whl:
+        whl.writestr("aiida_diff-2.0.0.dist-info/entry_points.txt", ENTRY_POINTS)
+        whl.writestr(
+            "aiida_diff-2.0.0.dist-info/METADATA",
+            "Name: aiida-diff\nVersion: 2.0.0\nRequires-Dist: aiida-core>=2.0\n",
+        )
+    http_server.routes["/aiida_diff.whl"] = (200, {}, buffer.getvalue())
+    pypi_data = {
+        "info": {"version": "2.0.0"},
+        "releases": {"2.0.0": [{"upload_time": "2023-01-01T00:00:00"}]},
+        "urls": [
+            {
+                "packagetype": "bdist_wheel",
+                "url": f"{http_server.url}/aiida_diff.whl",
+                "filename": "aiida_diff-2.0.0-py3-none-any.whl",
+                "digests": {"sha256": "0" * 64},
+            }
+        ],
+    }
+
+    for _ in range(2):
+        pypi_metadata = get_pypi_metadata("aiida-diff", pypi_data=pypi_data)
+        assert pypi_metadata.aiida_version == ">=2.0"
+        assert "aiida.calculations" in pypi_metadata.entry_points
+
+    # metadata file (404) and the wheel are only requested once
+    assert len(http_server.requests) == 2
+    assert store.stats()["wheels"] == 1
+    assert store.stats()["hits"] == 1
+
+
+def test_wheel_order(http_server, store):
+    """Test that the data of a stored wheel keeps the order read from the wheel."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as whl:
+        whl.writestr(
+            "aiida_diff-2.0.0.dist-info/entry_points.txt",
+            "[aiida.workflows]\nz.work = aiida_diff.workflows:Z\n"
+            "[aiida.calculations]\nz.calc = aiida_diff.calculations:Z\n"
+            "a.calc = aiida_diff.calculations:A\n",
+        )
+        whl.writestr(
+            "aiida_diff-2.0.0.dist-info/METADATA",
+            "Name: aiida-diff\nVersion: 2.0.0\nClassifier: Framework :: AiiDA\n",
+        )
+    http_server.routes["/aiida_diff.whl"] = (200, {}, buffer.getvalue())
+    pypi_data = {
+        "info": {"version": "2.0.0"},
+        "releases": {"2.0.0": [{"upload_time": "2023-01-01T00:00:00"}]},
+        "urls": [
+            {
+                "packagetype": "bdist_wheel",
+                "url": f"{http_server.url}/aiida_diff.whl",
+                "filename": "aiida_diff-2.0.0-py3-none-any.whl",
+                "digests": {"sha256": "1" * 64},
+            }
+        ],
+    }
+
+    miss, hit = (get_pypi_metadata("aiida-diff", pypi_data=pypi_data) for _ in range(2))
+
+    assert store.stats()["hits"] == 1
+    assert list(miss.entry_points) == ["aiida.workflows", "aiida.calculations"]
+    assert json.dumps(hit.entry_points) == json.dumps(miss.entry_points)
+    assert json.dumps(hit.metadata) == json.dumps(miss.metadata)
+
+
+def test_compact(store):
+    """Test removing the wheels that have not been used recently."""
+    store.put("0" * 64, "aiida_diff-2.0.0-py3-none-any.whl", {"entry_points": {}})
+
+    assert store.compact(max_age=1) == 0
+    assert store.compact(max_age=0) == 1
+    assert store.get("0" * 64) is None
+
+
+def test_cli_stats(store):
+    """Test the command showing the statistics of the stores."""
+    store.get("0" * 64)
+
+    result = CliRunner().invoke(
+        cli, ["stores", "--cache-dir", os.path.dirname(store.path), "stats"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "Wheels: 0" in result.output
+    assert "misses: 1" in result.output
+    assert "Parses: 0" in result.output
+
+
+def test_cli_compact(store):
+    """Test that the command compacts the wheel store and the parse memo."""
+    store.put("0" * 64, "aiida_diff-2.0.0-py3-none-any.whl", {"entry_points": {}})
+    memo = ParseMemo(os.path.dirname(store.path))
+    memo.put(("setup.json", 0, "0" * 64, 1), {"build_tool": None})
+    memo.close()
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "stores",
+            "--cache-dir",
+            os.path.dirname(store.path),
+            "compact",
+            "--max-age",
+            "0",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "Removed 1 wheels" in result.output
+    assert "Removed 1 parses" in result.output